@@ -13,12 +13,12 @@ class APILogAdmin(admin.ModelAdmin):
     list_filter = [
         'method', 'response_status', 'created_at', 'user'
     ]
-    search_fields = ['path', 'ip_address', 'user__username', 'error_message']
+    search_fields = ['path', 'ip_address', 'user__username', 'error_message', 'profile_id']
     readonly_fields = [
         'method', 'path', 'query_params', 'request_body', 
         'response_status', 'response_body', 'user', 'ip_address', 
         'user_agent', 'created_at', 'duration_ms', 'error_message', 
-        'error_traceback'
+        'error_traceback', 'profile_id', 'profile_stats', 'profile_queries'
     ]
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
@@ -34,6 +34,10 @@ class APILogAdmin(admin.ModelAdmin):
             'fields': ('error_message', 'error_traceback'),
             'classes': ('collapse',)
         }),
+        ('Profile', {
+            'fields': ('profile_id', 'profile_stats', 'profile_queries'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created_at',)
         }),
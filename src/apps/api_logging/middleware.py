@@ -1,18 +1,55 @@
+import cProfile
+import io
 import json
+import pstats
 import time
 import traceback
-from django.utils.deprecation import MiddlewareMixin
+import uuid
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
 from django.http import JsonResponse
-from django.db import transaction
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 
 from apps.api_logging.models import APILog
 
 
-class APILoggingMiddleware(MiddlewareMixin):
+class APILoggingMiddleware:
     """
     Middleware for logging all API requests and responses
+    
+    Sync and async capable: under ASGI the rest of the chain is awaited and
+    the log row is written with the async ORM, so async views keep running
+    concurrently instead of being funnelled through one sync thread.
     """
     
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+    
+    async def __acall__(self, request):
+        self.process_request(request)
+        response = await self.get_response(request)
+        if not request.path.startswith('/api/'):
+            return response
+        try:
+            await APILog.objects.acreate(user=await self.aget_user(request), **self.log_entry(request, response))
+        except Exception:
+            # Don't break the request if logging fails
+            pass
+        return response
+    
     def process_request(self, request):
         """Store request start time"""
         request._api_log_start_time = time.time()
@@ -25,65 +62,11 @@ class APILoggingMiddleware(MiddlewareMixin):
             return response
         
         try:
-            # Calculate duration
-            duration_ms = None
-            if hasattr(request, '_api_log_start_time'):
-                duration_ms = (time.time() - request._api_log_start_time) * 1000
-            
-            # Get request body
-            request_body = None
-            if request.body:
-                try:
-                    # Try to parse as JSON
-                    body_str = request.body.decode('utf-8')
-                    if body_str:
-                        json.loads(body_str)  # Validate JSON
-                        request_body = body_str
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    # If not JSON, store as string (truncated)
-                    request_body = request.body.decode('utf-8', errors='ignore')[:1000]
-            
-            # Get response body
-            response_body = None
-            if hasattr(response, 'content'):
-                try:
-                    content_str = response.content.decode('utf-8')
-                    if content_str:
-                        # Try to parse as JSON for better formatting
-                        try:
-                            json.loads(content_str)
-                            response_body = content_str[:5000]  # Limit size
-                        except json.JSONDecodeError:
-                            response_body = content_str[:1000]  # Limit size
-                except UnicodeDecodeError:
-                    response_body = None
-            
-            # Get user
-            user = request.user if hasattr(request, 'user') and request.user.is_authenticated else None
-            
-            # Get IP address
-            ip_address = self.get_client_ip(request)
-            
-            # Get user agent
-            user_agent = request.META.get('HTTP_USER_AGENT', '')[:500]
-            
-            # Get query parameters
-            query_params = dict(request.GET)
+            entry = self.log_entry(request, response)
             
             # Create log entry (use atomic transaction to avoid blocking)
             with transaction.atomic():
-                APILog.objects.create(
-                    method=request.method,
-                    path=request.path,
-                    query_params=query_params,
-                    request_body=request_body,
-                    response_status=response.status_code,
-                    response_body=response_body,
-                    user=user,
-                    ip_address=ip_address,
-                    user_agent=user_agent,
-                    duration_ms=duration_ms,
-                )
+                APILog.objects.create(user=self.get_user(request), **entry)
         
         except Exception as e:
             # Don't break the request if logging fails
@@ -92,6 +75,70 @@ class APILoggingMiddleware(MiddlewareMixin):
         
         return response
     
+    def log_entry(self, request, response):
+        """APILog fields of a finished request except user, no database access"""
+        # Calculate duration
+        duration_ms = None
+        if hasattr(request, '_api_log_start_time'):
+            duration_ms = (time.time() - request._api_log_start_time) * 1000
+        
+        return {
+            'method': request.method,
+            'path': request.path,
+            'query_params': dict(request.GET),
+            'request_body': self.get_request_body(request),
+            'response_status': response.status_code,
+            'response_body': self.get_response_body(response),
+            'ip_address': self.get_client_ip(request),
+            'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+            'duration_ms': duration_ms,
+            **getattr(request, '_api_profile', {}),
+        }
+    
+    def get_request_body(self, request):
+        """Request body, JSON as is, anything else truncated"""
+        request_body = None
+        if request.body:
+            try:
+                # Try to parse as JSON
+                body_str = request.body.decode('utf-8')
+                if body_str:
+                    json.loads(body_str)  # Validate JSON
+                    request_body = body_str
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                # If not JSON, store as string (truncated)
+                request_body = request.body.decode('utf-8', errors='ignore')[:1000]
+        return request_body
+    
+    def get_response_body(self, response):
+        """Response body, JSON up to 5000 and anything else up to 1000 characters"""
+        response_body = None
+        if hasattr(response, 'content'):
+            try:
+                content_str = response.content.decode('utf-8')
+                if content_str:
+                    # Try to parse as JSON for better formatting
+                    try:
+                        json.loads(content_str)
+                        response_body = content_str[:5000]  # Limit size
+                    except json.JSONDecodeError:
+                        response_body = content_str[:1000]  # Limit size
+            except UnicodeDecodeError:
+                response_body = None
+        return response_body
+    
+    def get_user(self, request):
+        """Authenticated user of the request or None"""
+        return request.user if hasattr(request, 'user') and request.user.is_authenticated else None
+    
+    async def aget_user(self, request):
+        """get_user() without lazy session lookups in the event loop"""
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            # not set by a view's authentication, resolve the session user with the async ORM
+            user = await request.auser()
+        return user if user is not None and user.is_authenticated else None
+    
     def process_exception(self, request, exception):
         """Log exceptions"""
         # Only log API requests
@@ -146,6 +193,7 @@ class APILoggingMiddleware(MiddlewareMixin):
                     duration_ms=duration_ms,
                     error_message=error_message,
                     error_traceback=error_traceback,
+                    **getattr(request, '_api_profile', {}),
                 )
         
         except Exception:
@@ -162,3 +210,107 @@ class APILoggingMiddleware(MiddlewareMixin):
         else:
             ip = request.META.get('REMOTE_ADDR')
         return ip
+
+
+class ProfilingMiddleware:
+    """
+    Middleware profiling a single API request on demand
+
+    A superuser sends the X-Profile header (or ?profile=1) and the rest of
+    the request runs under cProfile with SQL queries captured. The top
+    API_PROFILE_TOP_N functions by cumulative time and the queries are
+    stored on the request's APILog row, whose profile_id is returned in
+    the X-Profile-Id header.
+
+    Requests without the header or flag only pay for one dict lookup, so
+    it can stay enabled in production. Must come after APILoggingMiddleware
+    in MIDDLEWARE so the log entry is created with the profile attached.
+    
+    Under ASGI unprofiled requests are awaited as is. A profiled request
+    runs in a worker thread that calls the rest of the chain through
+    async_to_sync, so the sync parts of the view (ORM, rendering) run in
+    that thread and are profiled; time spent awaiting in the event loop
+    is not.
+    """
+    
+    HEADER = 'HTTP_X_PROFILE'
+    QUERY_PARAM = 'profile'
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_flagged(request):
+            return self.get_response(request)
+        if not self.is_requested(request) or not self.is_allowed(request):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+    
+    async def __acall__(self, request):
+        if not self.is_flagged(request):
+            return await self.get_response(request)
+        if not self.is_requested(request) or not await sync_to_async(self.is_allowed)(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+    
+    def is_flagged(self, request):
+        """Cheap check whether the request may ask for profiling at all"""
+        return self.HEADER in request.META or self.QUERY_PARAM in request.META.get('QUERY_STRING', '')
+    
+    def profile(self, request, get_response):
+        """Run the rest of the chain under cProfile and attach the results to the request"""
+        profile_id = uuid.uuid4()
+        profiler = cProfile.Profile()
+        with CaptureQueriesContext(connection) as queries:
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        
+        request._api_profile = {
+            'profile_id': profile_id,
+            'profile_stats': self.format_stats(profiler),
+            'profile_queries': [
+                {'sql': query['sql'], 'time': query['time']}
+                for query in queries.captured_queries[:getattr(settings, 'API_PROFILE_MAX_QUERIES', 500)]
+            ],
+        }
+        response['X-Profile-Id'] = str(profile_id)
+        return response
+    
+    def is_requested(self, request):
+        """Check header or query flag"""
+        if request.META.get(self.HEADER, '').lower() in ('1', 'true', 'yes'):
+            return True
+        return request.GET.get(self.QUERY_PARAM, '').lower() in ('1', 'true', 'yes')
+    
+    def is_allowed(self, request):
+        """Only superusers may profile, authenticated by session or JWT"""
+        if not request.path.startswith('/api/'):
+            return False
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            # JWT is normally checked later by DRF views; only profiled requests pay for it here
+            from rest_framework_simplejwt.authentication import JWTAuthentication
+            from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+            try:
+                authenticated = JWTAuthentication().authenticate(request)
+            except (InvalidToken, AuthenticationFailed):
+                return False
+            user = authenticated[0] if authenticated else None
+        return user is not None and user.is_active and user.is_superuser
+    
+    def format_stats(self, profiler):
+        """Top functions by cumulative time as printed by pstats"""
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(getattr(settings, 'API_PROFILE_TOP_N', 30))
+        return stream.getvalue()
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_logging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apilog',
+            name='profile_id',
+            field=models.UUIDField(blank=True, null=True, unique=True, verbose_name='Profile ID'),
+        ),
+        migrations.AddField(
+            model_name='apilog',
+            name='profile_queries',
+            field=models.JSONField(blank=True, null=True, verbose_name='Profile SQL Queries'),
+        ),
+        migrations.AddField(
+            model_name='apilog',
+            name='profile_stats',
+            field=models.TextField(blank=True, null=True, verbose_name='Profile Stats'),
+        ),
+    ]
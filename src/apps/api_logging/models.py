@@ -28,6 +28,11 @@ class APILog(models.Model):
     error_message = models.TextField(blank=True, null=True, verbose_name='Error Message')
     error_traceback = models.TextField(blank=True, null=True, verbose_name='Error Traceback')
     
+    # filled only for requests profiled on demand (see ProfilingMiddleware)
+    profile_id = models.UUIDField(null=True, blank=True, unique=True, verbose_name='Profile ID')
+    profile_stats = models.TextField(blank=True, null=True, verbose_name='Profile Stats')
+    profile_queries = models.JSONField(blank=True, null=True, verbose_name='Profile SQL Queries')
+    
     class Meta:
         verbose_name = 'API Log'
         verbose_name_plural = 'API Logs'
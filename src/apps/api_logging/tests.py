@@ -1,3 +1,65 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from apps.api_logging.models import APILog
+
+
+class ProfilingMiddlewareTestCase(TestCase):
+    """Tests for on-demand request profiling"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+
+    def authorize(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_superuser_request_is_profiled(self):
+        """Test that X-Profile stores stats and SQL on the APILog row and returns its id"""
+        self.authorize(self.superuser)
+
+        response = self.client.get('/api/notifications/rate-limits/', HTTP_X_PROFILE='1')
+
+        self.assertEqual(response.status_code, 200)
+        log = APILog.objects.get(profile_id=response['X-Profile-Id'])
+        self.assertIn('cumulative', log.profile_stats)
+        self.assertTrue(any('auth_user' in query['sql'] for query in log.profile_queries))
+
+    def test_query_flag_triggers_profiling(self):
+        """Test that ?profile=1 works like the header"""
+        self.authorize(self.superuser)
+
+        response = self.client.get('/api/notifications/rate-limits/?profile=1')
+
+        self.assertIn('X-Profile-Id', response)
+
+    def test_regular_user_is_not_profiled(self):
+        """Test that the flag is ignored for non-superusers and unflagged requests"""
+        self.authorize(self.user)
+        response = self.client.get('/api/notifications/rate-limits/', HTTP_X_PROFILE='1')
+
+        self.assertNotIn('X-Profile-Id', response)
+
+        self.authorize(self.superuser)
+        response = self.client.get('/api/notifications/rate-limits/')
+
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(APILog.objects.filter(profile_id__isnull=False).exists())
+
+    def test_superuser_request_is_profiled_under_asgi(self):
+        """Test that profiling through the ASGI handler still captures the view's queries"""
+        token = RefreshToken.for_user(self.superuser).access_token
+
+        response = async_to_sync(AsyncClient().get)(
+            '/api/notifications/rate-limits/',
+            headers={'Authorization': f'Bearer {token}', 'X-Profile': '1'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        log = APILog.objects.get(profile_id=response['X-Profile-Id'])
+        self.assertEqual(log.user, self.superuser)
+        self.assertTrue(any('auth_user' in query['sql'] for query in log.profile_queries))
@@ -0,0 +1,236 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}' if pairs else ''
+
+
+class CounterValue:
+    """Monotonic counter of one label combination"""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class HistogramValue:
+    """Bucketed observations of one label combination"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # per bucket, not cumulative; the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> 'Timer':
+        """Context manager observing time spent in the block"""
+        return Timer(self)
+
+    def cumulative(self) -> Tuple[List[Tuple[float, int]], float, int]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        result = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            running += bucket_count
+            result.append((bound, running))
+        return result, total, count
+
+
+class Timer:
+    def __init__(self, histogram: HistogramValue):
+        self.histogram = histogram
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Metric:
+    """
+    Named metric with a fixed set of label names
+
+    Values of every label combination are created on first use and kept
+    for the lifetime of the process, so label values must come from a
+    bounded set (routes, channel titles, notification type titles).
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._aliases = {}  # label values as passed in -> holder
+        self._lock = threading.Lock()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Return value holder of label combination (positional or by name)"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        holder = self._aliases.get(values)
+        if holder is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Metric '{self.name}' expects labels {self.labelnames}")
+            key = tuple(str(value) for value in values)
+            with self._lock:
+                holder = self._values.setdefault(key, self._new_value())
+                # later lookups with e.g. an int status code skip the conversion
+                self._aliases[values] = holder
+        return holder
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f'# HELP {self.name} {_escape(self.documentation)}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_value(self):
+        return CounterValue()
+
+    def inc(self, amount: float = 1):
+        """Increment counter without labels"""
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(holder.value)}'
+            for values, holder in self.items()
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+
+    def _new_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Observe value without labels"""
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        bucket_labels = self.labelnames + ('le',)
+        for values, holder in self.items():
+            buckets, total, count = holder.cumulative()
+            for bound, bucket_count in buckets:
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(bucket_labels, values + (_format_value(bound),))} {bucket_count}'
+                )
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """
+    In-process collection of metrics rendered in Prometheus text format
+
+    Every process (runserver, each worker) keeps its own values, like the
+    other per-process state in this project (rate limiters, breakers).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames, **kwargs) -> Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric '{name}' is already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, tuple(labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Optional[Iterable[float]] = None
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram, name, documentation, tuple(labelnames), buckets=buckets or DEFAULT_BUCKETS
+        )
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return ''.join(metric.render() + '\n' for metric in metrics)
+
+
+registry = Registry()
@@ -0,0 +1,73 @@
+from django.test import SimpleTestCase, override_settings
+
+from apps.metrics.registry import Registry
+
+
+class RegistryTestCase(SimpleTestCase):
+    """Tests for counters, histograms and Prometheus text rendering"""
+    
+    def test_counter_rendering(self):
+        """Test that counters render one sample per label combination"""
+        registry = Registry()
+        counter = registry.counter('sends_total', 'Sends', ['channel'])
+        counter.labels('email').inc()
+        counter.labels(channel='email').inc(2)
+        counter.labels('say "hi"').inc()
+        
+        output = registry.render()
+        
+        self.assertIn('# TYPE sends_total counter', output)
+        self.assertIn('sends_total{channel="email"} 3.0', output)
+        self.assertIn('sends_total{channel="say \\"hi\\""} 1.0', output)
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that bucket counts are cumulative and include +Inf, sum and count"""
+        registry = Registry()
+        histogram = registry.histogram('stage_seconds', 'Stage time', ['stage'], buckets=[0.1, 1])
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.labels('render').observe(value)
+        
+        output = registry.render()
+        
+        self.assertIn('stage_seconds_bucket{stage="render",le="0.1"} 2', output)
+        self.assertIn('stage_seconds_bucket{stage="render",le="1.0"} 3', output)
+        self.assertIn('stage_seconds_bucket{stage="render",le="+Inf"} 4', output)
+        self.assertIn('stage_seconds_sum{stage="render"} 3.65', output)
+        self.assertIn('stage_seconds_count{stage="render"} 4', output)
+    
+    def test_conflicting_registration_is_rejected(self):
+        """Test that a name can't be reused with another type or label set"""
+        registry = Registry()
+        counter = registry.counter('sends_total', 'Sends', ['channel'])
+        
+        self.assertIs(registry.counter('sends_total', 'Sends', ['channel']), counter)
+        with self.assertRaises(ValueError):
+            registry.histogram('sends_total', 'Sends', ['channel'])
+        with self.assertRaises(ValueError):
+            counter.labels('email', 'extra')
+
+
+class MetricsEndpointTestCase(SimpleTestCase):
+    """Tests for the /metrics endpoint and request metrics middleware"""
+    
+    def test_requests_are_recorded_per_route(self):
+        """Test that requests are labelled with the URL pattern, not the raw path"""
+        self.client.get('/api/notifications/outbox/00000000-0000-0000-0000-000000000000/')
+        
+        response = self.client.get('/metrics')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn(
+            'http_requests_total{method="GET",route="api/notifications/outbox/<uuid:message_id>/",status="401"}',
+            body
+        )
+        self.assertNotIn('00000000-0000', body)
+    
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_remote_scrape_is_forbidden(self):
+        """Test that addresses outside METRICS_ALLOWED_IPS get 403"""
+        response = self.client.get('/metrics')
+        
+        self.assertEqual(response.status_code, 403)
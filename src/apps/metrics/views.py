@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from apps.metrics.registry import CONTENT_TYPE, registry
+
+
+def metrics_view(request):
+    """
+    Metrics of this process in Prometheus text format
+
+    Only served to addresses in METRICS_ALLOWED_IPS, i.e. a scraper running
+    next to the app, not through the public API.
+    """
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
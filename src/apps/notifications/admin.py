@@ -5,6 +5,7 @@ from apps.notifications.models.gradus_models import (
     NotificationType,
     NotificationTemplate
 )
+from apps.notifications.models.delivery_models import Outbox, IdempotencyKey, ScheduledNotification
 
 
 @admin.register(Variable)
@@ -25,8 +26,8 @@ class ChannelAdmin(admin.ModelAdmin):
 
 @admin.register(NotificationType)
 class NotificationTypeAdmin(admin.ModelAdmin):
-    list_display = ['id', 'title', 'is_custom', 'is_active', 'created_at', 'updated_at']
-    list_filter = ['is_custom', 'is_active', 'created_at']
+    list_display = ['id', 'title', 'is_custom', 'priority', 'is_active', 'created_at', 'updated_at']
+    list_filter = ['is_custom', 'priority', 'is_active', 'created_at']
     search_fields = ['title']
     filter_horizontal = ['variables', 'channels']
     readonly_fields = ['created_at', 'updated_at']
@@ -35,6 +36,9 @@ class NotificationTypeAdmin(admin.ModelAdmin):
         ('Basic Information', {
             'fields': ('title', 'is_custom', 'is_active')
         }),
+        ('Delivery', {
+            'fields': ('priority', 'digest_window_seconds')
+        }),
         ('Relations', {
             'fields': ('variables', 'channels')
         }),
@@ -47,10 +51,13 @@ class NotificationTypeAdmin(admin.ModelAdmin):
 
 @admin.register(NotificationTemplate)
 class NotificationTemplateAdmin(admin.ModelAdmin):
-    list_display = ['id', 'notification_type', 'channel', 'name', 'title', 'is_active', 'created_at']
-    list_filter = ['notification_type', 'channel', 'is_active', 'created_at']
+    list_display = ['id', 'notification_type', 'channel', 'name', 'title', 'is_active', 'is_valid', 'created_at']
+    list_filter = ['notification_type', 'channel', 'is_active', 'is_valid', 'created_at']
     search_fields = ['name', 'title', 'notification_type__title', 'channel__title']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = [
+        'content_hash', 'variables', 'is_simple', 'size_bytes', 'is_valid', 'validation_error', 'needs_revalidation',
+        'created_at', 'updated_at'
+    ]
     
     fieldsets = (
         ('Basic Information', {
@@ -59,8 +66,39 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
         ('Template Content', {
             'fields': ('html',)
         }),
+        ('Metadata', {
+            'fields': ('content_hash', 'variables', 'is_simple', 'size_bytes'),
+            'classes': ('collapse',)
+        }),
+        ('Validation', {
+            'fields': ('is_valid', 'validation_error', 'needs_revalidation')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(Outbox)
+class OutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'message_id', 'notification_type', 'recipient', 'status', 'priority', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['status', 'priority', 'notification_type', 'created_at']
+    search_fields = ['message_id', 'recipient', 'notification_type']
+    readonly_fields = ['message_id', 'digest_key', 'claimed_by', 'claimed_at', 'sent_at', 'created_at', 'updated_at']
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['id', 'key', 'user', 'status', 'response_status', 'created_at', 'expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['key', 'user__username']
+    readonly_fields = ['request_hash', 'response_status', 'response_body', 'created_at']
+
+
+@admin.register(ScheduledNotification)
+class ScheduledNotificationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'message_id', 'notification_type', 'recipient', 'status', 'send_at']
+    list_filter = ['status', 'notification_type']
+    search_fields = ['message_id', 'recipient', 'notification_type']
+    readonly_fields = ['message_id', 'claimed_by', 'created_at']
@@ -0,0 +1,146 @@
+import asyncio
+import time
+import weakref
+
+import aiosmtplib
+from django.conf import settings
+from django.core.mail.message import sanitize_address
+
+
+SMTP_BACKENDS = {
+    'django.core.mail.backends.smtp.EmailBackend',
+    'apps.notifications.backends.smtp_pool.PooledEmailBackend',
+}
+
+
+class AsyncSMTPPool:
+    """
+    Pool of persistent aiosmtplib connections bound to one event loop
+
+    Up to ``size`` messages are in flight at a time, further senders wait
+    on the pool without holding a thread.
+    """
+
+    def __init__(self, size: int = 20, max_idle: float = 60, max_lifetime: float = 600, **client_kwargs):
+        self.size = size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.client_kwargs = client_kwargs
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            now = time.monotonic()
+            while self._idle:
+                client, created_at, last_used = self._idle.pop()
+                if (
+                    client.is_connected
+                    and now - last_used <= self.max_idle
+                    and now - created_at <= self.max_lifetime
+                ):
+                    return client, created_at
+                await self._close(client)
+            client = aiosmtplib.SMTP(**self.client_kwargs)
+            await client.connect()
+            return client, time.monotonic()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, client, created_at, broken: bool = False):
+        try:
+            if broken or not client.is_connected:
+                await self._close(client)
+            else:
+                self._idle.append((client, created_at, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    async def close_all(self):
+        idle, self._idle = self._idle, []
+        for client, _, _ in idle:
+            await self._close(client)
+
+    @staticmethod
+    async def _close(client):
+        try:
+            if client.is_connected:
+                await client.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            client.close()
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_pool() -> AsyncSMTPPool:
+    """
+    Return the pool for the running event loop and current SMTP settings
+
+    Connections are only reused within one loop. Under ASGI that is the
+    server's loop, under WSGI Django runs every async view in a loop of its
+    own, so the caller has to close_pools() before the loop goes away.
+    """
+    loop = asyncio.get_running_loop()
+    client_kwargs = {
+        'hostname': settings.EMAIL_HOST,
+        'port': settings.EMAIL_PORT,
+        'username': settings.EMAIL_HOST_USER or None,
+        'password': settings.EMAIL_HOST_PASSWORD or None,
+        'start_tls': bool(settings.EMAIL_USE_TLS),
+        'use_tls': bool(settings.EMAIL_USE_SSL),
+        'timeout': settings.EMAIL_TIMEOUT,
+        'client_cert': settings.EMAIL_SSL_CERTFILE,
+        'client_key': settings.EMAIL_SSL_KEYFILE,
+    }
+    key = tuple(sorted(client_kwargs.items()))
+    loop_pools = _pools.setdefault(loop, {})
+    pool = loop_pools.get(key)
+    if pool is None:
+        pool = loop_pools[key] = AsyncSMTPPool(
+            size=getattr(settings, 'EMAIL_ASYNC_POOL_SIZE', 20),
+            max_idle=getattr(settings, 'EMAIL_POOL_MAX_IDLE', 60),
+            max_lifetime=getattr(settings, 'EMAIL_POOL_MAX_LIFETIME', 600),
+            **client_kwargs
+        )
+    return pool
+
+
+async def close_pools():
+    """Close idle connections of the running event loop's pools and forget them"""
+    for pool in list(_pools.pop(asyncio.get_running_loop(), {}).values()):
+        await pool.close_all()
+
+
+async def send_message(email_message) -> bool:
+    """
+    Send Django EmailMessage without blocking the event loop
+
+    Uses a pooled aiosmtplib connection when EMAIL_BACKEND is an SMTP backend.
+    Other backends (locmem, console, dummy) don't do network I/O and are
+    called directly.
+    """
+    if settings.EMAIL_BACKEND not in SMTP_BACKENDS:
+        return bool(email_message.send(fail_silently=False))
+
+    if not email_message.recipients():
+        return False
+    encoding = email_message.encoding or settings.DEFAULT_CHARSET
+    from_email = sanitize_address(email_message.from_email, encoding)
+    recipients = [sanitize_address(addr, encoding) for addr in email_message.recipients()]
+    message = email_message.message().as_bytes(linesep='\r\n')
+
+    pool = get_pool()
+    client, created_at = await pool.acquire()
+    broken = False
+    try:
+        await client.sendmail(from_email, recipients, message)
+    except Exception:
+        # connection state after a failed transaction is unknown, don't reuse it
+        broken = True
+        raise
+    finally:
+        await pool.release(client, created_at, broken=broken)
+    return True
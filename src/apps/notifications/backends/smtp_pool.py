@@ -0,0 +1,265 @@
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
+
+from apps.notifications.services import deadline
+
+
+class PoolExhausted(Exception):
+    """No pooled SMTP connection became available in time"""
+
+
+class PooledConnection:
+    """Open, authenticated Django SMTP backend plus its bookkeeping"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.created_at = self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Per-process pool of persistent SMTP connections
+
+    At most ``size`` connections are open at a time. Idle connections are
+    reused most-recently-used first; before reuse a connection is dropped if
+    it has been idle longer than ``max_idle`` or alive longer than
+    ``max_lifetime``, and checked with NOOP if it has been idle longer than
+    ``health_check_after`` seconds.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        max_idle: float = 60,
+        max_lifetime: float = 600,
+        health_check_after: float = 5,
+        acquire_timeout: float = 10,
+        **backend_kwargs
+    ):
+        self.size = size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self.backend_kwargs = backend_kwargs
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def acquire(self) -> PooledConnection:
+        timeout = deadline.remaining(self.acquire_timeout)
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolExhausted(f'No SMTP connection available within {timeout:.1f}s')
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if self._usable(conn):
+                    with self._lock:
+                        self.reused += 1
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: PooledConnection, broken: bool = False):
+        try:
+            if broken:
+                self._discard(conn)
+                return
+            conn.last_used = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+                expired = [c for c in self._idle if conn.last_used - c.last_used > self.max_idle]
+                for c in expired:
+                    self._idle.remove(c)
+            for c in expired:
+                self._discard(c)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled,
+            }
+
+    def _connect(self) -> PooledConnection:
+        kwargs = dict(self.backend_kwargs)
+        kwargs['timeout'] = deadline.remaining(kwargs.get('timeout'))
+        backend = SMTPEmailBackend(fail_silently=False, **kwargs)
+        backend.open()
+        # connect is bounded by the send deadline, later sends set their own
+        backend.connection.sock.settimeout(self.backend_kwargs.get('timeout'))
+        backend.timeout = self.backend_kwargs.get('timeout')
+        with self._lock:
+            self.created += 1
+        return PooledConnection(backend)
+
+    def _usable(self, conn: PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - conn.last_used > self.max_idle or now - conn.created_at > self.max_lifetime:
+            return False
+        if now - conn.last_used > self.health_check_after:
+            try:
+                return conn.backend.connection.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                return False
+        return True
+
+    def _discard(self, conn: PooledConnection):
+        with self._lock:
+            self.recycled += 1
+        try:
+            conn.backend.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(**backend_kwargs) -> SMTPConnectionPool:
+    """Return the pool for the given SMTP settings, creating it on first use"""
+    global _pools_pid
+    key = tuple(sorted(backend_kwargs.items()))
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # sockets must not be shared with the parent after fork
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = SMTPConnectionPool(
+                size=getattr(settings, 'EMAIL_POOL_SIZE', 4),
+                max_idle=getattr(settings, 'EMAIL_POOL_MAX_IDLE', 60),
+                max_lifetime=getattr(settings, 'EMAIL_POOL_MAX_LIFETIME', 600),
+                health_check_after=getattr(settings, 'EMAIL_POOL_HEALTH_CHECK_AFTER', 5),
+                acquire_timeout=getattr(settings, 'EMAIL_POOL_ACQUIRE_TIMEOUT', 10),
+                **backend_kwargs
+            )
+        return pool
+
+
+def close_pools():
+    """Close idle connections of every pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+class PooledEmailBackend(BaseEmailBackend):
+    """
+    Email backend that borrows persistent SMTP connections from a pool
+
+    Accepts the same options as django.core.mail.backends.smtp.EmailBackend.
+    open()/close() borrow and return a pooled connection instead of dialing
+    and hanging up, so send_mail() and get_connection().send_messages() both
+    reuse already authenticated connections. Waiting for a connection and
+    socket operations are bounded by the current send deadline.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        username=None,
+        password=None,
+        use_tls=None,
+        fail_silently=False,
+        use_ssl=None,
+        timeout=None,
+        ssl_keyfile=None,
+        ssl_certfile=None,
+        **kwargs
+    ):
+        super().__init__(fail_silently=fail_silently)
+        self.pool = get_pool(
+            host=host or settings.EMAIL_HOST,
+            port=port or settings.EMAIL_PORT,
+            username=settings.EMAIL_HOST_USER if username is None else username,
+            password=settings.EMAIL_HOST_PASSWORD if password is None else password,
+            use_tls=settings.EMAIL_USE_TLS if use_tls is None else use_tls,
+            use_ssl=settings.EMAIL_USE_SSL if use_ssl is None else use_ssl,
+            timeout=settings.EMAIL_TIMEOUT if timeout is None else timeout,
+            ssl_keyfile=settings.EMAIL_SSL_KEYFILE if ssl_keyfile is None else ssl_keyfile,
+            ssl_certfile=settings.EMAIL_SSL_CERTFILE if ssl_certfile is None else ssl_certfile,
+        )
+        self._conn = None
+
+    def open(self):
+        if self._conn is not None:
+            return False
+        try:
+            self._conn = self.pool.acquire()
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return None
+        return True
+
+    def close(self, broken: bool = False):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self.pool.release(conn, broken=broken)
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        deadline.check('SMTP send')
+        new_conn_created = self.open()
+        if self._conn is None or new_conn_created is None:
+            return 0
+
+        broken = False
+        sock = self._conn.backend.connection.sock
+        limit = deadline.remaining()
+        try:
+            if limit is not None:
+                sock.settimeout(limit)
+            return self._conn.backend.send_messages(email_messages)
+        except Exception as e:
+            broken = _is_connection_error(e)
+            if broken and not new_conn_created:
+                self.close(broken=True)
+            if not self.fail_silently:
+                raise
+            return 0
+        finally:
+            if limit is not None and not broken:
+                sock.settimeout(self.pool.backend_kwargs.get('timeout'))
+            if new_conn_created:
+                self.close(broken=broken)
+
+
+def _is_connection_error(error: Exception) -> bool:
+    # SMTPException subclasses OSError, only plain socket errors and disconnects mean a dead connection
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
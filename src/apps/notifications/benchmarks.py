@@ -0,0 +1,111 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+from django.db import connection
+
+from apps.notifications.models.gradus_models import (
+    Channel,
+    Variable,
+    NotificationType,
+    NotificationTemplate
+)
+
+
+@contextmanager
+def benchmark_database(verbosity: int = 0):
+    """Run the block against a throwaway test database"""
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def seed_notification_type(
+    title: str = 'new survey',
+    html: str = '<p>Hello! New survey: {{ title }}</p>',
+    subject: str = 'New Survey Available'
+) -> NotificationTemplate:
+    """Create email channel, 'title' variable, a type and its email template"""
+    channel, _ = Channel.objects.get_or_create(
+        title='email',
+        defaults={'allowed_tags': ['p', 'b', 'i', 'a', 'br']}
+    )
+    variable, _ = Variable.objects.get_or_create(title='title')
+    notification_type = NotificationType.objects.create(title=title, is_custom=False)
+    notification_type.channels.add(channel)
+    notification_type.variables.add(variable)
+    return NotificationTemplate.objects.create(
+        notification_type=notification_type,
+        channel=channel,
+        title=subject,
+        html=html
+    )
+
+
+def seed_dataset(types: int = 50, variables_per_type: int = 3) -> List[NotificationTemplate]:
+    """
+    Create a synthetic catalogue: email and telegram channels, a shared
+    pool of variables and `types` notification types, each using
+    `variables_per_type` of them with one email template
+
+    Existing rows with the same titles are reused, so seeding twice is safe.
+    """
+    email, _ = Channel.objects.get_or_create(
+        title='email',
+        defaults={'allowed_tags': ['p', 'b', 'i', 'a', 'br']}
+    )
+    telegram, _ = Channel.objects.get_or_create(
+        title='telegram',
+        defaults={'allowed_tags': ['b', 'i', 'a']}
+    )
+    pool = [
+        Variable.objects.get_or_create(title=f'var_{i}')[0]
+        for i in range(max(variables_per_type * 2, 1))
+    ]
+    templates = []
+    for i in range(types):
+        variables = [pool[(i + j) % len(pool)] for j in range(variables_per_type)]
+        notification_type, _ = NotificationType.objects.get_or_create(
+            title=f'bench type {i}',
+            defaults={'is_custom': False}
+        )
+        notification_type.channels.add(email, telegram)
+        notification_type.variables.add(*variables)
+        body = ''.join(f'<p>{variable.title}: <b>{{{{ {variable.title} }}}}</b></p>' for variable in variables)
+        templates.append(NotificationTemplate.objects.update_or_create(
+            notification_type=notification_type,
+            channel=email,
+            defaults={'title': f'Bench notification {i}', 'html': f'<p>Hello!</p>{body}'}
+        )[0])
+    return templates
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    """Throughput and latency percentiles (ms) of a benchmark run"""
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'ops_per_sec': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Call func, return (result, seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
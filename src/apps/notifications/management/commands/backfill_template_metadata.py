@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+
+from apps.notifications.models.gradus_models import NotificationTemplate
+
+
+class Command(BaseCommand):
+    help = 'Compute stored metadata (content hash, variables, simple flag, size) of notification templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows updated per query')
+        parser.add_argument('--all', action='store_true', help='Recompute rows that already have metadata')
+
+    def handle(self, *args, **options):
+        queryset = NotificationTemplate.objects.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(variables__isnull=True)
+
+        fields = ['content_hash', 'variables', 'is_simple', 'size_bytes']
+        batch = []
+        updated = failed = 0
+        for template in queryset.only('pk', 'title', 'html', *fields).iterator(chunk_size=options['batch_size']):
+            if options['all']:
+                template.variables = None
+            try:
+                changed = template.refresh_metadata()
+            except ValidationError as e:
+                failed += 1
+                self.stderr.write(f'  ✗ Template {template.pk}: {"; ".join(e.messages)}')
+                continue
+            if changed:
+                batch.append(template)
+            if len(batch) >= options['batch_size']:
+                # bulk_update doesn't touch updated_at, backfill isn't an edit
+                NotificationTemplate.objects.bulk_update(batch, fields)
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            NotificationTemplate.objects.bulk_update(batch, fields)
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated {updated} templates, {failed} failed to parse'))
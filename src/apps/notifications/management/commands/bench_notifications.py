@@ -0,0 +1,193 @@
+import json
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.notifications.benchmarks import benchmark_database, seed_dataset, summarize
+from apps.notifications.models.gradus_models import NotificationType, NotificationTemplate
+from apps.notifications.serializers import NotificationTemplateReadSerializer, NotificationTypeReadSerializer
+from apps.notifications.services.notification_sender import NotificationSender
+from apps.notifications.validators import extract_vars, parse_template, validate_template, validation_cache
+from apps.notifications.views import NotificationTemplateViewSet, NotificationTypeViewSet
+
+
+BENCHMARKS = [
+    'send',
+    'render',
+    'validate_template',
+    'validate_template_uncached',
+    'extract_vars',
+    'serialize_notification_types',
+    'serialize_notification_templates',
+    'list_notification_types',
+    'list_notification_templates',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmarks of the notification hot paths (send, render, validation, list endpoints) '
+        'on a synthetic dataset in a throwaway database; optionally compared against a saved baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', type=int, default=50, help='Notification types (one email template each) to seed')
+        parser.add_argument('--variables-per-type', type=int, default=3, help='Variables used by every type')
+        parser.add_argument('--iterations', type=int, default=500, help='Calls per benchmark')
+        parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='Run only these benchmarks')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for picking types')
+        parser.add_argument('--output', help='Write results as JSON to this file (e.g. to use as a baseline later)')
+        parser.add_argument('--baseline', help='Compare with results saved by an earlier --output')
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Allowed ops/sec drop against the baseline, in percent'
+        )
+
+    def handle(self, *args, **options):
+        names = options['only'] or BENCHMARKS
+        self.random = random.Random(options['seed'])
+        with benchmark_database(), override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            NOTIFICATION_RATE_LIMITS={},
+            ALLOWED_HOSTS=['testserver'],
+        ):
+            self.templates = seed_dataset(options['types'], options['variables_per_type'])
+            self.user = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+            results = {
+                'dataset': {'types': options['types'], 'variables_per_type': options['variables_per_type']},
+                'benchmarks': {name: getattr(self, f'bench_{name}')(options['iterations']) for name in names},
+            }
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            results['regressions'] = self.compare(results['benchmarks'], baseline['benchmarks'], options['threshold'])
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if results.get('regressions'):
+            raise CommandError(f"{len(results['regressions'])} benchmark(s) regressed: {', '.join(results['regressions'])}")
+
+    def run(self, func, iterations):
+        """Time func() iterations times, count queries of one extra warm call"""
+        func()  # warm caches, the first call is not what we want to measure
+        reset_queries()  # with DEBUG on the query log is capped, a full one would read as 0 queries
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - t)
+        result = summarize(latencies, time.perf_counter() - start)
+        result['queries'] = len(queries)
+        return result
+
+    def context_of(self, template):
+        return {variable: f'value of {variable}' for variable in template.variables}
+
+    def bench_send(self, iterations):
+        sender = NotificationSender()
+
+        def send():
+            template = self.random.choice(self.templates)
+            if not sender.send(template.notification_type.title, self.context_of(template), 'bench@example.com'):
+                raise CommandError(f"Send of '{template.notification_type.title}' failed")
+            mail.outbox.clear()
+
+        return self.run(send, iterations)
+
+    def bench_render(self, iterations):
+        sender = NotificationSender()
+
+        def render():
+            template = self.random.choice(self.templates)
+            sender.render(template, self.context_of(template))
+
+        return self.run(render, iterations)
+
+    def validation_cases(self):
+        return [
+            (template.html, template.channel, template.variables)
+            for template in self.templates
+        ]
+
+    def bench_validate_template(self, iterations):
+        cases = self.validation_cases()
+        validation_cache.clear()
+        result = self.run(lambda: validate_template(*self.random.choice(cases)), iterations)
+        result['cache'] = validation_cache.stats()
+        return result
+
+    def bench_validate_template_uncached(self, iterations):
+        cases = self.validation_cases()
+
+        def validate():
+            validation_cache.clear()
+            validate_template(*self.random.choice(cases))
+
+        return self.run(validate, iterations)
+
+    def bench_extract_vars(self, iterations):
+        parsed = [parse_template(template.html) for template in self.templates]
+        return self.run(lambda: extract_vars(self.random.choice(parsed)), iterations)
+
+    def bench_serialize_notification_types(self, iterations):
+        return self.run(
+            lambda: NotificationTypeReadSerializer(NotificationType.objects.all(), many=True).data,
+            iterations
+        )
+
+    def bench_serialize_notification_templates(self, iterations):
+        return self.run(
+            lambda: NotificationTemplateReadSerializer(NotificationTemplate.objects.all(), many=True).data,
+            iterations
+        )
+
+    def bench_list_notification_types(self, iterations):
+        return self.bench_list(NotificationTypeViewSet, '/api/notifications/notification-types/', iterations)
+
+    def bench_list_notification_templates(self, iterations):
+        return self.bench_list(NotificationTemplateViewSet, '/api/notifications/notification-templates/', iterations)
+
+    def bench_list(self, viewset, path, iterations):
+        view = viewset.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        def get():
+            request = factory.get(path)
+            force_authenticate(request, user=self.user)
+            response = view(request)
+            response.render()
+            if response.status_code != 200:
+                raise CommandError(f'GET {path} returned {response.status_code}')
+
+        return self.run(get, iterations)
+
+    @staticmethod
+    def compare(current, baseline, threshold):
+        """Benchmarks slower than baseline by more than threshold percent, or doing more queries"""
+        regressions = {}
+        for name, result in current.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            problems = []
+            if result['ops_per_sec'] < before['ops_per_sec'] * (1 - threshold / 100):
+                problems.append(f"ops/sec {before['ops_per_sec']} -> {result['ops_per_sec']}")
+            if result['queries'] > before['queries']:
+                problems.append(f"queries {before['queries']} -> {result['queries']}")
+            if problems:
+                regressions[name] = problems
+        return regressions
@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+
+from apps.notifications.benchmarks import summarize
+from apps.notifications.services.fast_renderer import FastTemplate
+
+
+TEMPLATES = {
+    'short': '<p>Hello! New survey: {{ title }}</p>',
+    'several_vars': '<p>Hi {{ username }},</p><p>Confirm: <a href="https://example.com/{{ confirmation_token }}">link</a></p>',
+    'long_text': '<p>' + 'Lorem ipsum dolor sit amet. ' * 40 + '{{ title }}</p>' * 5,
+}
+
+CONTEXT = {
+    'title': 'Customer <satisfaction> & "NPS" survey',
+    'username': 'olena',
+    'confirmation_token': 'a1b2c3d4e5',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare render speed of the Django template engine and the fast path for simple templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='Renders per template and renderer')
+
+    def handle(self, *args, **options):
+        engine = Engine()
+        iterations = options['iterations']
+        results = {}
+        for name, html in TEMPLATES.items():
+            template = engine.from_string(html)
+            fast = FastTemplate.from_template(template)
+            if template.render(Context(CONTEXT)) != fast.render(CONTEXT):
+                raise AssertionError(f"Fast render of '{name}' differs from the engine output")
+
+            engine_stats = self.bench(lambda: template.render(Context(CONTEXT)), iterations)
+            fast_stats = self.bench(lambda: fast.render(CONTEXT), iterations)
+            results[name] = {
+                'engine': engine_stats,
+                'fast': fast_stats,
+                'speedup': round(fast_stats['ops_per_sec'] / engine_stats['ops_per_sec'], 2),
+            }
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    def bench(render, iterations):
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            t = time.perf_counter()
+            render()
+            latencies.append(time.perf_counter() - t)
+        return summarize(latencies, time.perf_counter() - start)
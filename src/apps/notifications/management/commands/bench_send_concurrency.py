@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from apps.notifications.backends import async_smtp, smtp_pool
+from apps.notifications.benchmarks import benchmark_database, seed_notification_type, summarize
+from apps.notifications.services.notification_sender import NotificationSender
+from apps.notifications.smtp_stub import SMTPStubServer
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent throughput of NotificationSender.send (threads) and asend (asyncio) against a local SMTP stub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help='Messages sent per path')
+        parser.add_argument('--concurrency', type=int, default=100, help='Threads (sync) / tasks (async) in flight')
+        parser.add_argument('--connections', type=int, default=10, help='SMTP connections per pool')
+        parser.add_argument('--smtp-delay', type=float, default=0.02, help='Seconds the stub waits before accepting a message')
+
+    def handle(self, *args, **options):
+        with SMTPStubServer(delay=options['smtp_delay']) as server, benchmark_database():
+            with override_settings(
+                EMAIL_BACKEND='apps.notifications.backends.smtp_pool.PooledEmailBackend',
+                EMAIL_HOST=server.host,
+                EMAIL_PORT=server.port,
+                EMAIL_USE_TLS=False,
+                EMAIL_USE_SSL=False,
+                EMAIL_HOST_USER='',
+                EMAIL_HOST_PASSWORD='',
+                DEFAULT_FROM_EMAIL='bench@example.com',
+                EMAIL_POOL_SIZE=options['connections'],
+                EMAIL_POOL_ACQUIRE_TIMEOUT=60,
+                EMAIL_ASYNC_POOL_SIZE=options['connections'],
+                NOTIFICATION_RATE_LIMITS={},
+            ):
+                seed_notification_type()
+                results = {
+                    'sync': self.bench_sync(options['messages'], options['concurrency']),
+                    'async': self.bench_async(options['messages'], options['concurrency']),
+                    'smtp_messages_received': len(server.messages),
+                }
+                smtp_pool.close_pools()
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def bench_sync(self, messages, concurrency):
+        sender = NotificationSender()
+
+        def send_one(i):
+            start = time.perf_counter()
+            try:
+                sender.deliver('new survey', {'title': f'Survey {i}'}, f'user{i}@example.com')
+                return time.perf_counter() - start, None
+            except Exception as e:
+                return time.perf_counter() - start, e
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(send_one, range(messages)))
+        return self._summary(outcomes, time.perf_counter() - start)
+
+    def bench_async(self, messages, concurrency):
+        sender = NotificationSender()
+
+        async def run():
+            slots = asyncio.Semaphore(concurrency)
+
+            async def send_one(i):
+                async with slots:
+                    start = time.perf_counter()
+                    try:
+                        await sender.adeliver('new survey', {'title': f'Survey {i}'}, f'user{i}@example.com')
+                        return time.perf_counter() - start, None
+                    except Exception as e:
+                        return time.perf_counter() - start, e
+
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(send_one(i) for i in range(messages)))
+            elapsed = time.perf_counter() - start
+            await async_smtp.close_pools()
+            return outcomes, elapsed
+
+        outcomes, elapsed = asyncio.run(run())
+        return self._summary(outcomes, elapsed)
+
+    def _summary(self, outcomes, elapsed):
+        errors = [error for _, error in outcomes if error is not None]
+        for error in errors[:3]:
+            self.stderr.write(f'Error: {error}')
+        return summarize([latency for latency, error in outcomes if error is None], elapsed, errors=len(errors))
@@ -0,0 +1,293 @@
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.notifications.benchmarks import seed_dataset, summarize
+from apps.notifications.smtp_stub import SMTPStubServer
+
+
+ENDPOINTS = {
+    'send': ('POST', '/api/notifications/send/'),
+    'notification-types': ('GET', '/api/notifications/notification-types/'),
+    'notification-templates': ('GET', '/api/notifications/notification-templates/'),
+}
+
+
+def parse_mix(value: str):
+    """'send=60,notification-types=40' -> {'send': 60, 'notification-types': 40}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint '{name}' in --mix, expected one of: {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    process.wait(timeout=10)
+
+
+class Command(BaseCommand):
+    help = (
+        'HTTP load test of the API: logs in via /api/users/login/ and drives a weighted mix of send/, '
+        'notification-types/ and notification-templates/ requests at a fixed concurrency or request rate, '
+        'then reports throughput, latency percentiles and error rates per endpoint as JSON. '
+        'Outgoing mail goes to a local SMTP stub, so no network is needed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of a running server')
+        parser.add_argument('--username', default='loadtest', help='Superuser to log in as')
+        parser.add_argument('--password', default='loadtest', help='Password of --username')
+        parser.add_argument(
+            '--mix', default='send=60,notification-types=20,notification-templates=20',
+            help=f"Weighted endpoint mix, endpoints: {', '.join(ENDPOINTS)}"
+        )
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent client threads')
+        parser.add_argument('--rps', type=float, default=None, help='Target requests per second (default: as fast as possible)')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--requests', type=int, default=None, help='Stop after this many requests instead')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout, seconds')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the mix and payloads')
+        parser.add_argument(
+            '--smtp-port', type=int, default=0,
+            help='Port of the local SMTP stub (0 picks a free one); point EMAIL_HOST/EMAIL_PORT of the server here'
+        )
+        parser.add_argument(
+            '--spawn', action='store_true',
+            help='Start the server and an outbox worker on a throwaway database wired to the SMTP stub'
+        )
+        parser.add_argument(
+            '--server-command',
+            default=f'{sys.executable} manage.py runserver --noreload 127.0.0.1:{{port}}',
+            help="Server started by --spawn, '{port}' is replaced (e.g. 'uvicorn core.asgi:application --port {port}')"
+        )
+        parser.add_argument('--types', type=int, default=20, help='Notification types seeded by --spawn/--prepare')
+        parser.add_argument(
+            '--prepare', action='store_true',
+            help='Only seed synthetic types/templates and the --username superuser into the configured database'
+        )
+
+    def handle(self, *args, **options):
+        if options['prepare']:
+            self.prepare(options)
+            return
+
+        mix = parse_mix(options['mix'])
+        with SMTPStubServer(port=options['smtp_port']) as stub:
+            self.stderr.write(f'SMTP stub listening on {stub.host}:{stub.port}')
+            with ExitStack() as cleanup:
+                if options['spawn']:
+                    options['url'] = self.spawn(options, stub, cleanup)
+                result = self.run_load(options, mix)
+            result['smtp_messages_received'] = len(stub.messages)
+
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def prepare(self, options):
+        user, _ = User.objects.get_or_create(username=options['username'])
+        user.is_staff = user.is_superuser = True
+        user.set_password(options['password'])
+        user.save()
+        if options['types']:
+            seed_dataset(options['types'])
+
+    def spawn(self, options, stub, cleanup: ExitStack):
+        """
+        Start server and worker on a fresh SQLite database, return server url
+
+        Processes are stopped and their log files closed when cleanup exits.
+        """
+        workdir = tempfile.mkdtemp(prefix='load-test-')
+        database = os.path.join(workdir, 'db.sqlite3')
+        env = dict(
+            os.environ,
+            SQLITE_PATH=database,
+            EMAIL_HOST=stub.host,
+            EMAIL_PORT=str(stub.port),
+            EMAIL_USE_TLS='False',
+            EMAIL_HOST_USER='loadtest@example.com',
+            EMAIL_HOST_PASSWORD='loadtest',
+        )
+        manage = [sys.executable, 'manage.py']
+        cwd = str(settings.BASE_DIR)
+        subprocess.run(manage + ['migrate', '--verbosity', '0'], cwd=cwd, env=env, check=True)
+        subprocess.run(
+            manage + ['load_test_api', '--prepare', '--types', str(options['types']),
+                      '--username', options['username'], '--password', options['password']],
+            cwd=cwd, env=env, check=True
+        )
+
+        port = free_port()
+        # access logs would drown the report, keep them next to the database
+        server_log = cleanup.enter_context(open(os.path.join(workdir, 'server.log'), 'w'))
+        worker_log = cleanup.enter_context(open(os.path.join(workdir, 'worker.log'), 'w'))
+        server = subprocess.Popen(
+            options['server_command'].format(port=port).split(),
+            cwd=cwd, env=env, stdout=server_log, stderr=subprocess.STDOUT
+        )
+        # registered after the logs, so processes are stopped before their logs are closed
+        cleanup.callback(stop, server)
+        worker = subprocess.Popen(
+            manage + ['run_notification_worker', '--poll-interval', '0.2'],
+            cwd=cwd, env=env, stdout=worker_log, stderr=subprocess.STDOUT
+        )
+        cleanup.callback(stop, worker)
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                requests.get(f'{url}/api/notifications/live-check/', timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise CommandError(f"Server did not start, see {server_log.name}")
+                time.sleep(0.2)
+        self.stderr.write(f'Spawned server at {url}, database and logs in {workdir}')
+        return url
+
+    def login(self, url, options):
+        response = requests.post(
+            f'{url}/api/users/login/',
+            json={'username': options['username'], 'password': options['password']},
+            timeout=options['timeout']
+        )
+        if response.status_code != 200:
+            raise CommandError(f'Login failed ({response.status_code}): {response.text[:200]}')
+        return response.json()['access']
+
+    def send_targets(self, session, url, options):
+        """(type title, variable names) of active non-custom types to send"""
+        targets = []
+        next_page = f'{url}/api/notifications/notification-types/'
+        while next_page and len(targets) < 100:
+            page = session.get(next_page, timeout=options['timeout']).json()
+            targets.extend(
+                (item['title'], item['variable_names'])
+                for item in page['results']
+                if item['is_active'] and not item['is_custom']
+                and any(channel['title'] == 'email' for channel in item['channels'])
+            )
+            next_page = page.get('next')
+        if not targets:
+            raise CommandError('No active non-custom notification types with an email channel to send')
+        return targets
+
+    def run_load(self, options, mix):
+        url = options['url'].rstrip('/')
+        token = self.login(url, options)
+        headers = {'Authorization': f'Bearer {token}'}
+        setup = requests.Session()
+        setup.headers.update(headers)
+        targets = self.send_targets(setup, url, options) if 'send' in mix else []
+
+        run = LoadRun(url, headers, mix, targets, options)
+        threads = [threading.Thread(target=run.client, daemon=True) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return run.report(time.perf_counter() - run.started)
+
+
+class LoadRun:
+    """Schedule and results of one load run, shared by its client threads"""
+
+    def __init__(self, url, headers, mix, targets, options):
+        self.url = url
+        self.headers = headers
+        self.names, self.weights = list(mix), list(mix.values())
+        self.targets = targets
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.issued = 0
+        self.started = time.perf_counter()
+        self.stop_at = self.started + options['duration']
+        self.interval = 1 / options['rps'] if options['rps'] else None
+
+    def next_request(self):
+        """Pick next endpoint and when to issue it, None when the run is over"""
+        with self.lock:
+            if self.options['requests'] is not None and self.issued >= self.options['requests']:
+                return None
+            at = self.started + self.issued * self.interval if self.interval else time.perf_counter()
+            if at >= self.stop_at and self.options['requests'] is None:
+                return None
+            self.issued += 1
+            name = self.rng.choices(self.names, self.weights)[0]
+            payload = None
+            if name == 'send':
+                title, variables = self.rng.choice(self.targets)
+                payload = {
+                    'notification_type': title,
+                    'context': {variable: f'load {variable}' for variable in variables},
+                    'recipient': f'load{self.issued}@example.com',
+                }
+            return name, at, payload
+
+    def client(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        while True:
+            planned = self.next_request()
+            if planned is None:
+                return
+            name, at, payload = planned
+            delay = at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            method, path = ENDPOINTS[name]
+            start = time.perf_counter()
+            try:
+                response = session.request(method, self.url + path, json=payload, timeout=self.options['timeout'])
+                status = response.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[name].append(elapsed)
+                self.statuses[name][status] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name in self.names:
+            latencies, statuses = self.latencies[name], self.statuses[name]
+            errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+            summary = summarize(latencies, elapsed, errors)
+            summary['error_rate'] = round(errors / len(latencies), 4) if latencies else 0.0
+            summary['status_codes'] = {str(status): count for status, count in sorted(statuses.items(), key=str)}
+            endpoints[name] = summary
+        all_latencies = [latency for name in self.names for latency in self.latencies[name]]
+        total_errors = sum(endpoint['errors'] for endpoint in endpoints.values())
+        return {
+            'url': self.url,
+            'concurrency': self.options['concurrency'],
+            'target_rps': self.options['rps'],
+            'total': summarize(all_latencies, elapsed, total_errors),
+            'endpoints': endpoints,
+        }
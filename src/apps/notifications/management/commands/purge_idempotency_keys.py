@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.services.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys of the send endpoint'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} expired idempotency keys'))
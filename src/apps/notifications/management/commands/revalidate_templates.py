@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.models.gradus_models import NotificationTemplate
+from apps.notifications.services.revalidation import TemplateRevalidator, mark_stale
+
+
+class Command(BaseCommand):
+    help = (
+        'Revalidate notification templates flagged after channel allowed tags or notification type '
+        'variables changed, in a pool of worker processes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Templates claimed per batch')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when nothing is flagged')
+        parser.add_argument('--once', action='store_true', help='Revalidate flagged templates and exit')
+        parser.add_argument('--all', action='store_true', help='Flag every template first (implies --once)')
+
+    def handle(self, *args, **options):
+        with TemplateRevalidator(workers=options['workers'], batch_size=options['batch_size']) as revalidator:
+            if options['all']:
+                mark_stale(NotificationTemplate.objects.all())
+
+            if options['once'] or options['all']:
+                checked = revalidator.run_once()
+                invalid = NotificationTemplate.objects.filter(is_valid=False).count()
+                self.stdout.write(self.style.SUCCESS(f'✓ Revalidated {checked} templates, {invalid} invalid in total'))
+                return
+
+            self.stdout.write(f'Revalidating flagged templates with {revalidator.workers} workers...')
+            try:
+                revalidator.run(poll_interval=options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.SUCCESS('\n✓ Revalidator stopped'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.services.scheduler import NotificationScheduler
+
+
+class Command(BaseCommand):
+    help = 'Move scheduled notifications to the outbox when their send_at comes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=None, help='Seconds ahead kept in memory')
+        parser.add_argument('--refresh', type=int, default=None, help='Seconds between window reloads')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--scheduler-id', default=None, help='Scheduler identifier (default: hostname-pid)')
+        parser.add_argument('--once', action='store_true', help='Move rows that are due now and exit')
+
+    def handle(self, *args, **options):
+        scheduler = NotificationScheduler(
+            scheduler_id=options['scheduler_id'],
+            window=options['window'],
+            refresh=options['refresh'],
+            batch_size=options['batch_size'],
+        )
+
+        if options['once']:
+            moved = scheduler.run_once()
+            self.stdout.write(self.style.SUCCESS(f'✓ Moved {moved} notifications to the outbox'))
+            return
+
+        self.stdout.write(f'Scheduler {scheduler.scheduler_id} started...')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('\n✓ Scheduler stopped'))
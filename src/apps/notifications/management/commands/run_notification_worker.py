@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.notifications.models.gradus_models import NotificationType
+from apps.notifications.services.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notifications from the outbox (safe to run several processes in parallel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Rows claimed per batch')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when queue is empty')
+        parser.add_argument('--worker-id', default=None, help='Worker identifier (default: hostname-pid)')
+        parser.add_argument('--once', action='store_true', help='Process a single batch and exit')
+        parser.add_argument(
+            '--lanes',
+            default=None,
+            help='Comma separated priority lanes to serve (transactional,normal,bulk), default all'
+        )
+
+    def handle(self, *args, **options):
+        lanes = [lane.strip() for lane in options['lanes'].split(',')] if options['lanes'] else None
+        unknown = set(lanes or []) - set(NotificationType.LANES)
+        if unknown:
+            raise CommandError(f"Unknown lanes: {', '.join(sorted(unknown))}")
+
+        worker = OutboxWorker(
+            worker_id=options['worker_id'],
+            batch_size=options['batch_size'],
+            lanes=lanes,
+        )
+
+        if options['once']:
+            processed = worker.run_once()
+            self.stdout.write(self.style.SUCCESS(f'✓ Processed {processed} notifications'))
+            return
+
+        self.stdout.write(
+            f"Worker {worker.worker_id} started ({', '.join(lanes or NotificationType.LANES)}), waiting for notifications..."
+        )
+        try:
+            worker.run(poll_interval=options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('\n✓ Worker stopped'))
@@ -52,10 +52,11 @@ class Command(BaseCommand):
                 # new survey
                 new_survey, created = NotificationType.objects.get_or_create(
                     title='new survey',
-                    defaults={'is_custom': False}
+                    defaults={'is_custom': False, 'priority': NotificationType.PRIORITY_BULK}
                 )
                 if not created:
                     new_survey.is_custom = False
+                    new_survey.priority = NotificationType.PRIORITY_BULK
                     new_survey.save()
                 new_survey.channels.set([
                     channels['email'],
@@ -71,10 +72,11 @@ class Command(BaseCommand):
                 # confirm email
                 confirm_email, created = NotificationType.objects.get_or_create(
                     title='confirm email',
-                    defaults={'is_custom': False}
+                    defaults={'is_custom': False, 'priority': NotificationType.PRIORITY_TRANSACTIONAL}
                 )
                 if not created:
                     confirm_email.is_custom = False
+                    confirm_email.priority = NotificationType.PRIORITY_TRANSACTIONAL
                     confirm_email.save()
                 confirm_email.channels.set([channels['email']])
                 confirm_email.variables.set([variables['confirmation_token']])
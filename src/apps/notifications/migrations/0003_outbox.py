@@ -0,0 +1,41 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:25
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_channel_allowed_tags_notificationtemplate_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Outbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='ID повідомлення')),
+                ('notification_type', models.CharField(max_length=100, verbose_name='Тип нотифікації')),
+                ('template_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='Назва шаблону')),
+                ('recipient', models.CharField(max_length=254, verbose_name='Отримувач')),
+                ('context', models.JSONField(blank=True, default=dict, verbose_name='Контекст')),
+                ('status', models.CharField(choices=[('pending', 'Очікує'), ('processing', 'Обробляється'), ('sent', 'Відправлено'), ('failed', 'Помилка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Кількість спроб')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='Остання помилка')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Доступно для відправки з')),
+                ('claimed_by', models.CharField(blank=True, max_length=64, null=True, verbose_name='Захоплено воркером')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата захоплення')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата відправки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата оновлення')),
+            ],
+            options={
+                'verbose_name': 'Повідомлення у черзі',
+                'verbose_name_plural': 'Черга повідомлень',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='notificatio_status_9b3b3f_idx'), models.Index(fields=['claimed_by'], name='notificatio_claimed_06952b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='Ключ')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='Хеш запиту')),
+                ('status', models.CharField(choices=[('in_progress', 'Виконується'), ('completed', 'Завершено')], default='in_progress', max_length=20, verbose_name='Статус')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Код відповіді')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='Тіло відповіді')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Діє до')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='Користувач')),
+            ],
+            options={
+                'verbose_name': 'Ключ ідемпотентності',
+                'verbose_name_plural': 'Ключі ідемпотентності',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='unique_idempotency_key_per_user'),
+        ),
+    ]
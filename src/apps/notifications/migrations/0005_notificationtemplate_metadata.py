@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='sha256 заголовка та HTML', max_length=64, verbose_name='Хеш вмісту'),
+        ),
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='is_simple',
+            field=models.BooleanField(default=False, editable=False, help_text='Шаблон містить лише текст та прості {{ змінні }}', verbose_name='Проста підстановка'),
+        ),
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='size_bytes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Розмір HTML (байт)'),
+        ),
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='variables',
+            field=models.JSONField(blank=True, editable=False, help_text='Змінні, використані в HTML шаблоні', null=True, verbose_name='Використані змінні'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notificationtemplate_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationtype',
+            name='digest_window_seconds',
+            field=models.PositiveIntegerField(default=0, help_text='Нотифікації одному отримувачу протягом вікна відправляються одним листом (0 - вимкнено)', verbose_name='Вікно дайджесту (секунд)'),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='digest_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Повідомлення з однаковим ключем відправляються одним дайджестом', max_length=64, null=True, verbose_name='Ключ дайджесту'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:42
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_digest_window'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Стає message_id повідомлення в черзі', unique=True, verbose_name='ID повідомлення')),
+                ('notification_type', models.CharField(max_length=100, verbose_name='Тип нотифікації')),
+                ('template_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='Назва шаблону')),
+                ('recipient', models.CharField(max_length=254, verbose_name='Отримувач')),
+                ('context', models.JSONField(blank=True, default=dict, verbose_name='Контекст')),
+                ('send_at', models.DateTimeField(verbose_name='Відправити о')),
+                ('status', models.CharField(choices=[('scheduled', 'Заплановано'), ('enqueued', 'Передано в чергу')], default='scheduled', max_length=20, verbose_name='Статус')),
+                ('claimed_by', models.CharField(blank=True, max_length=64, null=True, verbose_name='Захоплено планувальником')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')),
+            ],
+            options={
+                'verbose_name': 'Запланована нотифікація',
+                'verbose_name_plural': 'Заплановані нотифікації',
+                'ordering': ['send_at'],
+                'indexes': [models.Index(fields=['status', 'send_at'], name='notificatio_status_48f713_idx'), models.Index(fields=['claimed_by'], name='notificatio_claimed_8132ae_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_schedulednotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationtype',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Транзакційна'), (1, 'Звичайна'), (2, 'Масова розсилка')], default=1, help_text='Черга доставки: транзакційні нотифікації не чекають за масовими', verbose_name='Пріоритет'),
+        ),
+        migrations.AddField(
+            model_name='outbox',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Транзакційна'), (1, 'Звичайна'), (2, 'Масова розсилка')], default=1, verbose_name='Пріоритет'),
+        ),
+        migrations.AddIndex(
+            model_name='outbox',
+            index=models.Index(fields=['status', 'priority', 'available_at'], name='notificatio_status_b59af7_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:25
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def copy_is_custom(apps, schema_editor):
+    NotificationTemplate = apps.get_model('notifications', 'NotificationTemplate')
+    NotificationTemplate.objects.filter(notification_type__is_custom=True).update(is_custom=True)
+
+
+def find_duplicates(apps, schema_editor):
+    """Refuse to add the constraints while existing rows violate them"""
+    NotificationTemplate = apps.get_model('notifications', 'NotificationTemplate')
+    groups = [
+        NotificationTemplate.objects.filter(is_custom=False)
+        .values('notification_type__title', 'channel__title')
+        .annotate(count=Count('id')).filter(count__gt=1),
+        NotificationTemplate.objects.filter(is_custom=True)
+        .values('notification_type__title', 'channel__title', 'name')
+        .annotate(count=Count('id')).filter(count__gt=1),
+    ]
+    duplicates = [group for queryset in groups for group in queryset.order_by()]
+    if duplicates:
+        lines = '\n'.join(
+            f"  type '{group['notification_type__title']}', channel '{group['channel__title']}'"
+            + (f", name '{group['name']}'" if 'name' in group else '')
+            + f": {group['count']} templates"
+            for group in duplicates
+        )
+        raise RuntimeError(
+            f'Duplicate notification templates, delete or rename them before migrating:\n{lines}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_priority_lanes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='is_custom',
+            field=models.BooleanField(default=False, editable=False, help_text='Копія NotificationType.is_custom для обмежень унікальності', verbose_name='Кастомний тип'),
+        ),
+        migrations.RunPython(copy_is_custom, migrations.RunPython.noop),
+        migrations.RunPython(find_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notificationtemplate',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_custom', False)), fields=('notification_type', 'channel'), name='unique_template_per_type_channel'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationtemplate',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_custom', True)), fields=('notification_type', 'channel', 'name'), name='unique_custom_template_name'),
+        ),
+    ]
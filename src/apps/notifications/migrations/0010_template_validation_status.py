@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:32
+
+from django.db import migrations, models
+
+
+def flag_existing(apps, schema_editor):
+    """Existing templates were never checked against later channel and type changes"""
+    NotificationTemplate = apps.get_model('notifications', 'NotificationTemplate')
+    NotificationTemplate.objects.update(needs_revalidation=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0009_template_uniqueness_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='is_valid',
+            field=models.BooleanField(default=True, editable=False, help_text='Результат останньої перевірки шаблону', verbose_name='Валідний'),
+        ),
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='needs_revalidation',
+            field=models.BooleanField(db_index=True, default=False, editable=False, help_text='Канал або змінні типу змінились після останньої перевірки', verbose_name='Потребує перевірки'),
+        ),
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='validation_error',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Помилка валідації'),
+        ),
+        migrations.RunPython(flag_existing, migrations.RunPython.noop),
+    ]
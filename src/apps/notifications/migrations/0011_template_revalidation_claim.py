@@ -0,0 +1,23 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0010_template_validation_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='revalidation_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата захоплення для перевірки'),
+        ),
+        migrations.AddField(
+            model_name='notificationtemplate',
+            name='revalidation_claimed_by',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, verbose_name='Захоплено для перевірки'),
+        ),
+    ]
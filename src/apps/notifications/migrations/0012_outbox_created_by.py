@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-16 23:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_template_revalidation_claim'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outbox',
+            name='created_by',
+            field=models.ForeignKey(blank=True, help_text='Користувач, який поставив нотифікацію, лише він бачить її статус', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Створено користувачем'),
+        ),
+        migrations.AddField(
+            model_name='schedulednotification',
+            name='created_by',
+            field=models.ForeignKey(blank=True, help_text='Користувач, який поставив нотифікацію, лише він бачить її статус', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Створено користувачем'),
+        ),
+    ]
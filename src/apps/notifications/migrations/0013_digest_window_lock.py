@@ -0,0 +1,25 @@
+# Generated by Django 5.0.7 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0012_outbox_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest_key', models.CharField(help_text='Рядок блокується під час постановки в чергу, тож вікно відкривається лише раз', max_length=64, unique=True, verbose_name='Ключ дайджесту')),
+                ('closes_at', models.DateTimeField(verbose_name='Закривається о')),
+            ],
+            options={
+                'verbose_name': 'Вікно дайджесту',
+                'verbose_name_plural': 'Вікна дайджестів',
+            },
+        ),
+    ]
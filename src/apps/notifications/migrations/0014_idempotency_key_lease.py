@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-17 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0013_digest_window_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, help_text='Поки запит виконується, ключ утримується NOTIFICATION_IDEMPOTENCY_LEASE секунд від цієї дати', null=True, verbose_name='Дата захоплення'),
+        ),
+    ]
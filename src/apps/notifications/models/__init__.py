@@ -1,3 +1,4 @@
 from ._base import *
 from .models import *
-from .gradus_models import *
\ No newline at end of file
+from .gradus_models import *
+from .delivery_models import *
\ No newline at end of file
@@ -0,0 +1,292 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from apps.notifications.models.gradus_models import NotificationType
+
+
+class Outbox(models.Model):
+    """Notification waiting for (or done with) background delivery"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Очікує'),
+        (STATUS_PROCESSING, 'Обробляється'),
+        (STATUS_SENT, 'Відправлено'),
+        (STATUS_FAILED, 'Помилка'),
+    ]
+
+    message_id = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name='ID повідомлення'
+    )
+    notification_type = models.CharField(
+        max_length=100,
+        verbose_name='Тип нотифікації'
+    )
+    template_name = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='Назва шаблону'
+    )
+    recipient = models.CharField(
+        max_length=254,
+        verbose_name='Отримувач'
+    )
+    context = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Контекст'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Кількість спроб'
+    )
+    last_error = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name='Остання помилка'
+    )
+    available_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Доступно для відправки з'
+    )
+    priority = models.PositiveSmallIntegerField(
+        choices=NotificationType.PRIORITY_CHOICES,
+        default=NotificationType.PRIORITY_NORMAL,
+        verbose_name='Пріоритет'
+    )
+    digest_key = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        db_index=True,
+        help_text='Повідомлення з однаковим ключем відправляються одним дайджестом',
+        verbose_name='Ключ дайджесту'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        help_text='Користувач, який поставив нотифікацію, лише він бачить її статус',
+        verbose_name='Створено користувачем'
+    )
+    claimed_by = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        verbose_name='Захоплено воркером'
+    )
+    claimed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Дата захоплення'
+    )
+    sent_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Дата відправки'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата створення'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата оновлення'
+    )
+
+    class Meta:
+        verbose_name = 'Повідомлення у черзі'
+        verbose_name_plural = 'Черга повідомлень'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'priority', 'available_at']),
+            models.Index(fields=['claimed_by']),
+        ]
+
+    def __str__(self):
+        return f'{self.notification_type} -> {self.recipient} ({self.status})'
+
+
+class DigestWindow(models.Model):
+    """Open digest window of a recipient, one row per digest key"""
+
+    digest_key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text='Рядок блокується під час постановки в чергу, тож вікно відкривається лише раз',
+        verbose_name='Ключ дайджесту'
+    )
+    closes_at = models.DateTimeField(
+        verbose_name='Закривається о'
+    )
+
+    class Meta:
+        verbose_name = 'Вікно дайджесту'
+        verbose_name_plural = 'Вікна дайджестів'
+
+    def __str__(self):
+        return f'{self.digest_key} (до {self.closes_at})'
+
+
+class IdempotencyKey(models.Model):
+    """Result of a request made with an Idempotency-Key, replayed for retries"""
+
+    STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (STATUS_IN_PROGRESS, 'Виконується'),
+        (STATUS_COMPLETED, 'Завершено'),
+    ]
+
+    key = models.CharField(
+        max_length=255,
+        verbose_name='Ключ'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_idempotency_keys',
+        verbose_name='Користувач'
+    )
+    request_hash = models.CharField(
+        max_length=64,
+        verbose_name='Хеш запиту'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_IN_PROGRESS,
+        verbose_name='Статус'
+    )
+    response_status = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        verbose_name='Код відповіді'
+    )
+    response_body = models.JSONField(
+        blank=True,
+        null=True,
+        verbose_name='Тіло відповіді'
+    )
+    locked_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Дата захоплення',
+        help_text='Поки запит виконується, ключ утримується NOTIFICATION_IDEMPOTENCY_LEASE секунд від цієї дати'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата створення'
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name='Діє до'
+    )
+
+    class Meta:
+        verbose_name = 'Ключ ідемпотентності'
+        verbose_name_plural = 'Ключі ідемпотентності'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} ({self.status})'
+
+
+class ScheduledNotification(models.Model):
+    """Notification to be moved to the outbox at send_at"""
+
+    STATUS_SCHEDULED = 'scheduled'
+    STATUS_ENQUEUED = 'enqueued'
+    STATUS_CHOICES = [
+        (STATUS_SCHEDULED, 'Заплановано'),
+        (STATUS_ENQUEUED, 'Передано в чергу'),
+    ]
+
+    message_id = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        help_text='Стає message_id повідомлення в черзі',
+        verbose_name='ID повідомлення'
+    )
+    notification_type = models.CharField(
+        max_length=100,
+        verbose_name='Тип нотифікації'
+    )
+    template_name = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        verbose_name='Назва шаблону'
+    )
+    recipient = models.CharField(
+        max_length=254,
+        verbose_name='Отримувач'
+    )
+    context = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Контекст'
+    )
+    send_at = models.DateTimeField(
+        verbose_name='Відправити о'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_SCHEDULED,
+        verbose_name='Статус'
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+',
+        help_text='Користувач, який поставив нотифікацію, лише він бачить її статус',
+        verbose_name='Створено користувачем'
+    )
+    claimed_by = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        verbose_name='Захоплено планувальником'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата створення'
+    )
+
+    class Meta:
+        verbose_name = 'Запланована нотифікація'
+        verbose_name_plural = 'Заплановані нотифікації'
+        ordering = ['send_at']
+        indexes = [
+            models.Index(fields=['status', 'send_at']),
+            models.Index(fields=['claimed_by']),
+        ]
+
+    def __str__(self):
+        return f'{self.notification_type} -> {self.recipient} at {self.send_at}'
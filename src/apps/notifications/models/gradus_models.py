@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.core.exceptions import ValidationError
 
 from apps.notifications.models._base import BaseUniqueNameModel
 
+from apps.notifications.template_metadata import content_hash, template_metadata
 from apps.notifications.validators import (
     validate_template, 
     validate_template_uniqueness
@@ -10,6 +11,13 @@ from apps.notifications.validators import (
 
 
 class Variable(BaseUniqueNameModel):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # compared by the revalidation signal, see services/revalidation.py
+        instance._saved_state = (instance.__dict__.get('title'), instance.__dict__.get('is_active'))
+        return instance
+
     class Meta:
         verbose_name = 'Змінна'
         verbose_name_plural = 'Змінні'
@@ -21,6 +29,13 @@ class Channel(BaseUniqueNameModel):
         default=list,
         verbose_name='Дозволені HTML теги'
     )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # compared by the revalidation signal, see services/revalidation.py
+        instance._saved_allowed_tags = instance.__dict__.get('allowed_tags')
+        return instance
     
     class Meta:
         verbose_name = 'Канал'
@@ -29,6 +44,20 @@ class Channel(BaseUniqueNameModel):
 
 
 class NotificationType(BaseUniqueNameModel):
+    PRIORITY_TRANSACTIONAL = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_BULK = 2
+    PRIORITY_CHOICES = [
+        (PRIORITY_TRANSACTIONAL, 'Транзакційна'),
+        (PRIORITY_NORMAL, 'Звичайна'),
+        (PRIORITY_BULK, 'Масова розсилка'),
+    ]
+    LANES = {
+        'transactional': PRIORITY_TRANSACTIONAL,
+        'normal': PRIORITY_NORMAL,
+        'bulk': PRIORITY_BULK,
+    }
+
     title = models.CharField(
         max_length=100,
         unique=True,
@@ -52,10 +81,23 @@ class NotificationType(BaseUniqueNameModel):
         default=True,
         verbose_name='Кастомний тип'
     )
+    priority = models.PositiveSmallIntegerField(
+        choices=PRIORITY_CHOICES,
+        default=PRIORITY_NORMAL,
+        help_text='Черга доставки: транзакційні нотифікації не чекають за масовими',
+        verbose_name='Пріоритет'
+    )
+    digest_window_seconds = models.PositiveIntegerField(
+        default=0,
+        help_text='Нотифікації одному отримувачу протягом вікна відправляються одним листом (0 - вимкнено)',
+        verbose_name='Вікно дайджесту (секунд)'
+    )
     
     @property
     def variable_names(self):
         "Return list of active variable names"
+        if 'variables' in getattr(self, '_prefetched_objects_cache', {}):
+            return [variable.title for variable in self.variables.all() if variable.is_active]
         return list(self.variables.filter(is_active=True).values_list('title', flat=True))
 
     def clean(self):
@@ -66,9 +108,27 @@ class NotificationType(BaseUniqueNameModel):
                 'channels': 'At least one channel is required'
             })
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_is_custom = instance.__dict__.get('is_custom')
+        return instance
+
     def save(self, *args, **kwargs):
         self.full_clean()
-        super().save(*args, **kwargs)
+        if self._state.adding or getattr(self, '_saved_is_custom', None) == self.is_custom:
+            super().save(*args, **kwargs)
+        else:
+            # NotificationTemplate.is_custom backs the template uniqueness constraints
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                    self.templates.exclude(is_custom=self.is_custom).update(is_custom=self.is_custom)
+            except IntegrityError:
+                raise ValidationError({
+                    'is_custom': 'Type has several templates for one channel, only custom types can have them'
+                })
+        self._saved_is_custom = self.is_custom
 
     class Meta:
         verbose_name = 'Тип нотифікації'
@@ -106,11 +166,88 @@ class NotificationTemplate(BaseUniqueNameModel):
         help_text='HTML шаблон',
         verbose_name='HTML шаблон'
     )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False,
+        help_text='sha256 заголовка та HTML',
+        verbose_name='Хеш вмісту'
+    )
+    variables = models.JSONField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Змінні, використані в HTML шаблоні',
+        verbose_name='Використані змінні'
+    )
+    is_simple = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text='Шаблон містить лише текст та прості {{ змінні }}',
+        verbose_name='Проста підстановка'
+    )
+    size_bytes = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Розмір HTML (байт)'
+    )
+
+    is_custom = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text='Копія NotificationType.is_custom для обмежень унікальності',
+        verbose_name='Кастомний тип'
+    )
+    is_valid = models.BooleanField(
+        default=True,
+        editable=False,
+        help_text='Результат останньої перевірки шаблону',
+        verbose_name='Валідний'
+    )
+    validation_error = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Помилка валідації'
+    )
+    needs_revalidation = models.BooleanField(
+        default=False,
+        editable=False,
+        db_index=True,
+        help_text='Канал або змінні типу змінились після останньої перевірки',
+        verbose_name='Потребує перевірки'
+    )
+    revalidation_claimed_by = models.CharField(
+        max_length=64,
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Захоплено для перевірки'
+    )
+    revalidation_claimed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Дата захоплення для перевірки'
+    )
 
     class Meta:
         verbose_name = 'Шаблон нотифікації'
         verbose_name_plural = 'Шаблони нотифікацій'
         ordering = ['notification_type', 'channel']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['notification_type', 'channel'],
+                condition=models.Q(is_custom=False),
+                name='unique_template_per_type_channel'
+            ),
+            models.UniqueConstraint(
+                fields=['notification_type', 'channel', 'name'],
+                condition=models.Q(is_custom=True),
+                name='unique_custom_template_name'
+            ),
+        ]
 
     def __str__(self):
         name = self.name or self.notification_type.title
@@ -127,15 +264,50 @@ class NotificationTemplate(BaseUniqueNameModel):
                 'title': 'Title is not allowed for telegram and viber channels'
             })
         
+        self.refresh_metadata()
+        
         validate_template(
             self.html, 
             self.channel, 
             self.notification_type.variable_names,
-            is_custom=self.notification_type.is_custom
+            is_custom=self.notification_type.is_custom,
+            used_vars=self.variables
         )
-        
+
+    def validate_constraints(self, exclude=None):
+        """
+        Check uniqueness with one query and the messages save() reports
+
+        Used by model forms (admin); save() skips it and relies on the
+        database constraints instead.
+        """
+        if exclude and {'notification_type', 'channel'} & set(exclude):
+            return
         validate_template_uniqueness(self)
 
+    def refresh_metadata(self) -> bool:
+        """
+        Recompute derived columns if title or html changed
+        
+        Returns:
+            True if the template had to be parsed
+        """
+        if self.variables is not None and self.content_hash == content_hash(self.title, self.html):
+            return False
+        for field, value in template_metadata(self.title, self.html).items():
+            setattr(self, field, value)
+        return True
+
     def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        self.full_clean(validate_constraints=False)
+        self.is_custom = self.notification_type.is_custom
+        # just validated against the current channel and type
+        self.is_valid, self.validation_error, self.needs_revalidation = True, '', False
+        self.revalidation_claimed_by = self.revalidation_claimed_at = None
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            # raises ValidationError with the usual message if it was a duplicate
+            validate_template_uniqueness(self)
+            raise
\ No newline at end of file
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 from apps.notifications.models.gradus_models import (
     NotificationType,
@@ -5,6 +7,7 @@ from apps.notifications.models.gradus_models import (
     Channel,
     NotificationTemplate
 )
+from apps.notifications.models.delivery_models import Outbox, ScheduledNotification
 
 
 class VariableSerializer(serializers.ModelSerializer):
@@ -30,7 +33,7 @@ class NotificationTypeReadSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = NotificationType
-        fields = ['id', 'title', 'variables', 'channels', 'is_custom', 
+        fields = ['id', 'title', 'variables', 'channels', 'is_custom', 'priority', 'digest_window_seconds',
                  'variable_names', 'created_at', 'updated_at', 'is_active']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
@@ -51,7 +54,7 @@ class NotificationTypeWriteSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = NotificationType
-        fields = ['id', 'title', 'variables', 'channels', 'is_custom', 
+        fields = ['id', 'title', 'variables', 'channels', 'is_custom', 'priority', 'digest_window_seconds',
                  'created_at', 'updated_at', 'is_active']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
@@ -93,13 +96,13 @@ class NotificationTypeWriteSerializer(serializers.ModelSerializer):
         variable_objs = Variable.objects.filter(title__in=variable_names, is_active=True) if variable_names else []
 
         notification_type = NotificationType(**validated_data)
-        notification_type.save()
+        self.save_type(notification_type)
         
         notification_type.channels.set(channel_objs)
         if variable_objs:
             notification_type.variables.set(variable_objs)
         
-        notification_type.save()
+        self.save_type(notification_type)
         
         notification_type.refresh_from_db()
         return notification_type
@@ -111,12 +114,12 @@ class NotificationTypeWriteSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        instance.save()
+        self.save_type(instance)
         
         if channel_names is not None:
             channel_objs = Channel.objects.filter(title__in=channel_names, is_active=True)
             instance.channels.set(channel_objs)
-            instance.save()
+            self.save_type(instance)
         
         if variable_names is not None:
             if variable_names:
@@ -126,6 +129,14 @@ class NotificationTypeWriteSerializer(serializers.ModelSerializer):
                 instance.variables.clear()
         
         return instance
+    
+    @staticmethod
+    def save_type(notification_type):
+        # model validation (channels, is_custom switch) runs in save()
+        try:
+            notification_type.save()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
 
 
 class NotificationTypeMinimalSerializer(serializers.ModelSerializer):
@@ -143,8 +154,10 @@ class NotificationTemplateReadSerializer(serializers.ModelSerializer):
     class Meta:
         model = NotificationTemplate
         fields = ['id', 'notification_type', 'channel', 'name', 'title', 
-                 'html', 'created_at', 'updated_at', 'is_active']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+                 'html', 'content_hash', 'variables', 'is_simple', 'size_bytes',
+                 'is_valid', 'validation_error', 'created_at', 'updated_at', 'is_active']
+        read_only_fields = ['id', 'content_hash', 'variables', 'is_simple', 'size_bytes',
+                            'is_valid', 'validation_error', 'created_at', 'updated_at']
 
 
 class NotificationTemplateWriteSerializer(serializers.ModelSerializer):
@@ -154,8 +167,12 @@ class NotificationTemplateWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = NotificationTemplate
         fields = ['id', 'notification_type', 'channel', 'name', 'title', 
-                 'html', 'created_at', 'updated_at', 'is_active']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+                 'html', 'content_hash', 'variables', 'is_simple', 'size_bytes',
+                 'is_valid', 'validation_error', 'created_at', 'updated_at', 'is_active']
+        read_only_fields = ['id', 'content_hash', 'variables', 'is_simple', 'size_bytes',
+                            'is_valid', 'validation_error', 'created_at', 'updated_at']
+        # uniqueness is enforced by the database constraints, see save_template
+        validators = []
     
     def validate_notification_type(self, value):
         try:
@@ -190,14 +207,45 @@ class NotificationTemplateWriteSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         template = NotificationTemplate(**validated_data)
-        template.save()
+        self.save_template(template)
         return template
     
     def update(self, instance, validated_data):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        self.save_template(instance)
         return instance
+    
+    @staticmethod
+    def save_template(template):
+        # duplicates are only detected by the database constraints on save
+        try:
+            template.save()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+
+class NotificationTemplateImportItemSerializer(serializers.Serializer):
+    """Single template of a bulk import, types and channels are resolved for the whole batch"""
+    notification_type = serializers.CharField(help_text='Notification type title')
+    channel = serializers.CharField(help_text='Channel title')
+    name = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    title = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    html = serializers.CharField()
+    is_active = serializers.BooleanField(required=False, default=True)
+
+
+class NotificationTemplateImportSerializer(serializers.Serializer):
+    """Serializer for importing many templates at once"""
+    templates = NotificationTemplateImportItemSerializer(many=True, allow_empty=False)
+
+    def validate_templates(self, value):
+        max_size = getattr(settings, 'NOTIFICATION_TEMPLATE_IMPORT_MAX_SIZE', 5000)
+        if len(value) > max_size:
+            raise serializers.ValidationError(
+                f"Too many templates: {len(value)}. Maximum per request: {max_size}"
+            )
+        return value
 
 
 class SendNotificationSerializer(serializers.Serializer):
@@ -206,3 +254,101 @@ class SendNotificationSerializer(serializers.Serializer):
     context = serializers.DictField(required=True, help_text="Variables for template rendering")
     recipient = serializers.EmailField(required=True, help_text="Email address of recipient")
     template_name = serializers.CharField(required=False, allow_null=True, help_text="Template name (only for custom types)")
+    send_at = serializers.DateTimeField(
+        required=False,
+        allow_null=True,
+        help_text="Deliver at this time instead of right away"
+    )
+    idempotency_key = serializers.CharField(
+        required=False,
+        max_length=255,
+        help_text="Repeated requests with the same key return the original result (same as Idempotency-Key header)"
+    )
+
+
+class AsyncSendNotificationSerializer(SendNotificationSerializer):
+    """Serializer for sending right away, scheduling and idempotency are only supported by send/"""
+    send_at = None
+    idempotency_key = None
+
+    def validate(self, attrs):
+        unsupported = {
+            field: ['Not supported by send-async/, use send/ instead']
+            for field in ('send_at', 'idempotency_key') if field in self.initial_data
+        }
+        if unsupported:
+            raise serializers.ValidationError(unsupported)
+        return attrs
+
+
+class SendFanoutNotificationSerializer(serializers.Serializer):
+    """Serializer for sending one notification to several channels"""
+    notification_type = serializers.CharField(required=True, help_text="Notification type title")
+    context = serializers.DictField(required=True, help_text="Variables for template rendering")
+    recipients = serializers.DictField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        help_text="Channel title -> recipient address on that channel"
+    )
+    template_name = serializers.CharField(required=False, allow_null=True, help_text="Template name (only for custom types)")
+
+
+class BulkRecipientSerializer(serializers.Serializer):
+    """Single recipient of a bulk send"""
+    recipient = serializers.EmailField(required=True, help_text="Email address of recipient")
+    context = serializers.DictField(required=False, default=dict, help_text="Variables for template rendering")
+
+
+class SendBulkNotificationSerializer(serializers.Serializer):
+    """Serializer for sending one notification type to many recipients"""
+    notification_type = serializers.CharField(required=True, help_text="Notification type title")
+    template_name = serializers.CharField(required=False, allow_null=True, help_text="Template name (only for custom types)")
+    recipients = BulkRecipientSerializer(many=True, allow_empty=False)
+
+    def validate_recipients(self, value):
+        max_batch_size = getattr(settings, 'NOTIFICATION_BULK_MAX_BATCH_SIZE', 1000)
+        if len(value) > max_batch_size:
+            raise serializers.ValidationError(
+                f"Too many recipients: {len(value)}. Maximum per request: {max_batch_size}"
+            )
+        return value
+
+
+class RenderNotificationSerializer(serializers.Serializer):
+    """Serializer for rendering a template with many contexts"""
+    notification_type = serializers.CharField(required=True, help_text="Notification type title")
+    channel = serializers.CharField(required=False, default='email', help_text="Channel title")
+    template_name = serializers.CharField(required=False, allow_null=True, help_text="Template name (only for custom types)")
+    contexts = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        help_text="Variables for template rendering, one dict per rendered result"
+    )
+
+    def validate_contexts(self, value):
+        max_contexts = getattr(settings, 'NOTIFICATION_RENDER_MAX_CONTEXTS', 1000)
+        if len(value) > max_contexts:
+            raise serializers.ValidationError(
+                f"Too many contexts: {len(value)}. Maximum per request: {max_contexts}"
+            )
+        return value
+
+
+class OutboxSerializer(serializers.ModelSerializer):
+    """Delivery status of a queued notification"""
+
+    class Meta:
+        model = Outbox
+        fields = ['message_id', 'notification_type', 'template_name', 'recipient', 'status',
+                  'attempts', 'last_error', 'created_at', 'sent_at']
+        read_only_fields = fields
+
+
+class ScheduledNotificationSerializer(serializers.ModelSerializer):
+    """Status of a notification waiting for its send_at"""
+
+    class Meta:
+        model = ScheduledNotification
+        fields = ['message_id', 'notification_type', 'template_name', 'recipient', 'status',
+                  'send_at', 'created_at']
+        read_only_fields = fields
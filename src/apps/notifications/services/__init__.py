@@ -1,5 +1,13 @@
+from apps.notifications.services.channels import ChannelTransport, get_transport
 from apps.notifications.services.notification_sender import NotificationSender
+from apps.notifications.services.outbox import OutboxWorker, enqueue
+from apps.notifications.services.template_cache import template_cache
 
 __all__ = [
+    'ChannelTransport',
+    'get_transport',
     'NotificationSender',
+    'OutboxWorker',
+    'enqueue',
+    'template_cache',
 ]
@@ -0,0 +1,62 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils.module_loading import import_string
+
+from apps.notifications.services import deadline
+
+
+class ChannelTransport:
+    """
+    Delivers an already rendered notification to one channel
+
+    Subclasses are registered per Channel.title in
+    settings.NOTIFICATION_CHANNEL_TRANSPORTS.
+    """
+
+    def send(self, recipient: str, rendered_title: str, rendered_html: str):
+        """
+        Deliver unless the send deadline has already passed
+
+        Last point a send can be abandoned safely, once deliver() starts the
+        message may reach the recipient even if the caller gives up on it.
+        """
+        deadline.check('delivery')
+        self.deliver(recipient, rendered_title, rendered_html)
+
+    def deliver(self, recipient: str, rendered_title: str, rendered_html: str):
+        raise NotImplementedError
+
+
+class EmailTransport(ChannelTransport):
+    """Sends notification as HTML email through the configured EMAIL_BACKEND"""
+
+    def deliver(self, recipient: str, rendered_title: str, rendered_html: str):
+        send_mail(
+            subject=rendered_title or 'Notification',
+            message='',
+            html_message=rendered_html,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[recipient],
+            fail_silently=False,
+        )
+
+
+@lru_cache(maxsize=None)
+def _load_transport(path: str) -> ChannelTransport:
+    return import_string(path)()
+
+
+def get_transport(channel: str) -> ChannelTransport:
+    """
+    Return transport registered for channel title
+
+    Raises:
+        ValueError: if no transport is configured for the channel
+    """
+    transports = getattr(settings, 'NOTIFICATION_CHANNEL_TRANSPORTS', {})
+    path = transports.get(channel)
+    if not path:
+        raise ValueError(f"No transport configured for channel '{channel}'")
+    return _load_transport(path)
@@ -0,0 +1,165 @@
+import logging
+import smtplib
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Channel backend is considered down, the call was not attempted"""
+
+    def __init__(self, channel: str, retry_after: float):
+        super().__init__(f"Channel '{channel}' is unavailable, retry in {retry_after:.0f}s")
+        self.channel = channel
+        self.retry_after = retry_after
+
+
+def is_backend_failure(error: Exception) -> bool:
+    """
+    True if error means the backend itself is unhealthy
+
+    Connection errors, timeouts and failed authentication count; replies
+    about a single message (refused recipient, 4xx throttling, 5xx
+    rejection) and template errors don't.
+    """
+    if isinstance(error, (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, smtplib.SMTPAuthenticationError)):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker of one channel
+
+    After ``failure_threshold`` consecutive backend failures the circuit
+    opens and calls fail immediately with CircuitOpenError. Once
+    ``recovery_timeout`` seconds have passed, up to ``half_open_max_calls``
+    probe calls are let through: a success closes the circuit, a failure
+    opens it again for another recovery_timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        name: str = '',
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        half_open_max_calls: int = 1,
+        clock=time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self.config_key = None
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.rejected = 0
+        self.transitions = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str, reason: str):
+        previous, self.state = self.state, state
+        self.transitions += 1
+        log = logger.warning if state == self.OPEN else logger.info
+        log("Circuit of channel '%s' %s -> %s (%s)", self.name, previous, state, reason)
+
+    def before_call(self):
+        """
+        Raises:
+            CircuitOpenError: if the call must not be attempted now
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = self.clock() - self.opened_at
+                if waited < self.recovery_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout - waited)
+                self._transition(self.HALF_OPEN, f'{waited:.1f}s since opening, probing')
+                self.probes = 0
+            if self.state == self.HALF_OPEN:
+                if self.probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self.probes += 1
+
+    def record(self, error: Optional[Exception] = None):
+        """Record outcome of a call let through by before_call()"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.probes = max(self.probes - 1, 0)
+            if error is None:
+                self.failures = 0
+                if self.state == self.HALF_OPEN:
+                    self._transition(self.CLOSED, 'probe succeeded')
+                return
+            if not is_backend_failure(error):
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.opened_at = self.clock()
+                self._transition(self.OPEN, f'probe failed: {error}')
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                self._transition(self.OPEN, f'{self.failures} consecutive failures, last: {error}')
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'seconds_open': round(self.clock() - self.opened_at, 3) if self.state != self.CLOSED else None,
+                'rejected_calls': self.rejected,
+                'transitions': self.transitions,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _config() -> Dict[str, Any]:
+    return {
+        'failure_threshold': getattr(settings, 'NOTIFICATION_BREAKER_FAILURE_THRESHOLD', 5),
+        'recovery_timeout': getattr(settings, 'NOTIFICATION_BREAKER_RECOVERY_TIMEOUT', 30),
+    }
+
+
+def get_breaker(channel: str) -> CircuitBreaker:
+    """Return circuit breaker of channel (Channel.title)"""
+    config = _config()
+    key = tuple(sorted(config.items()))
+    with _breakers_lock:
+        breaker = _breakers.get(channel)
+        if breaker is None or breaker.config_key != key:
+            breaker = _breakers[channel] = CircuitBreaker(name=channel, **config)
+            breaker.config_key = key
+        return breaker
+
+
+def reset():
+    """Forget all breaker state"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """State of every channel breaker used in this process"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
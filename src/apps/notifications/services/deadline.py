@@ -0,0 +1,68 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+_current = contextvars.ContextVar('notification_send_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Send did not finish within NOTIFICATION_SEND_DEADLINE
+
+    Not an OSError on purpose: running out of the caller's time budget says
+    nothing about the backend, the circuit breaker mustn't count it.
+    """
+
+
+class Deadline:
+    """Point in (monotonic) time a send has to be finished by"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def check(self, stage: str):
+        if time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded(f'Send deadline of {self.seconds}s exceeded during {stage}')
+
+
+@contextmanager
+def scope(seconds: Optional[float]):
+    """
+    Run the block under a deadline of ``seconds`` (None or 0 - no deadline)
+
+    Nested scopes never extend an enclosing deadline.
+    """
+    outer = _current.get()
+    deadline = Deadline(seconds) if seconds else None
+    if outer is not None and (deadline is None or outer.expires_at < deadline.expires_at):
+        deadline = outer
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left of the current deadline, capped by default if both are set"""
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    return deadline.remaining() if default is None else min(default, deadline.remaining())
+
+
+def check(stage: str):
+    """Raise DeadlineExceeded if the current deadline has passed"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
@@ -0,0 +1,81 @@
+from typing import Dict, Any, List, Optional, Tuple
+
+from django.template.base import TextNode
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.timezone import template_localtime
+
+from apps.notifications.template_metadata import is_simple_node
+
+
+class NeedsEngine(Exception):
+    """Context value the fast path can't render exactly like the Django engine"""
+
+
+class FastTemplate:
+    """
+    Precompiled text/variable segments of a simple template
+
+    Only templates made of text and plain ``{{ var }}`` nodes are accepted
+    (see is_simple_node). Rendering concatenates static text with
+    escaped values, doing the same conversion as Django's
+    render_value_in_context with autoescape on. Context values the engine
+    would resolve differently (missing keys, callables) raise NeedsEngine so
+    the caller can fall back to the full engine.
+
+    Example:
+        fast = FastTemplate.from_template(Engine().from_string('<p>{{ title }}</p>'))
+        fast.render({'title': 'Survey'})  # '<p>Survey</p>'
+    """
+
+    def __init__(self, segments: List[Tuple[bool, str]]):
+        # (is_variable, text or variable name)
+        self.segments = segments
+
+    @classmethod
+    def from_template(cls, template, is_simple: Optional[bool] = None) -> Optional['FastTemplate']:
+        """
+        Build segments from parsed template, None if it isn't simple
+
+        ``is_simple`` is the stored NotificationTemplate.is_simple flag when
+        known: False skips the nodes, True or None still checks every node
+        while building segments, since the flag goes stale if html is changed
+        without save() (e.g. by queryset.update()).
+        """
+        if template.engine.debug or not template.engine.autoescape or is_simple is False:
+            return None
+        segments = []
+        for node in template.nodelist:
+            if not is_simple_node(node):
+                return None
+            if isinstance(node, TextNode):
+                if segments and not segments[-1][0]:
+                    segments[-1] = (False, segments[-1][1] + node.s)
+                else:
+                    segments.append((False, node.s))
+            else:
+                segments.append((True, node.filter_expression.var.lookups[0]))
+        return cls(segments)
+
+    def render(self, context: Dict[str, Any]) -> str:
+        """
+        Raises:
+            NeedsEngine: if a value must be resolved by the template engine
+        """
+        parts = []
+        for is_variable, value in self.segments:
+            if not is_variable:
+                parts.append(value)
+                continue
+            try:
+                current = context[value]
+            except (KeyError, TypeError):
+                # engine falls back to Context attributes and builtins (True/False/None)
+                raise NeedsEngine(value)
+            if callable(current):
+                raise NeedsEngine(value)
+            current = localize(template_localtime(current), use_l10n=None)
+            if not issubclass(type(current), str):
+                current = str(current)
+            parts.append(conditional_escape(current))
+        return ''.join(parts)
@@ -0,0 +1,128 @@
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.notifications.models.delivery_models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def request_hash(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def begin(user, key: str, payload_hash: str):
+    """
+    Reserve key for user
+
+    An in-progress key whose holder hasn't finished within
+    NOTIFICATION_IDEMPOTENCY_LEASE (e.g. the process was killed) is taken
+    over by the next request with the same payload.
+
+    Returns:
+        (IdempotencyKey, created) - created is False if the key is already
+        taken by an earlier (possibly still running) request
+    """
+    now = timezone.now()
+    ttl = getattr(settings, 'NOTIFICATION_IDEMPOTENCY_TTL', 86400)
+    IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_hash=payload_hash,
+                locked_at=now,
+                expires_at=now + timedelta(seconds=ttl),
+            )
+        return record, True
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            # holder failed and released the key in the meantime
+            return begin(user, key, payload_hash)
+        if _take_over(record, payload_hash, now):
+            return record, True
+        return record, False
+
+
+def _take_over(record: IdempotencyKey, payload_hash: str, now) -> bool:
+    """Claim an in-progress key whose lease expired, only one concurrent retry wins"""
+    lease = getattr(settings, 'NOTIFICATION_IDEMPOTENCY_LEASE', 120)
+    if record.status != IdempotencyKey.STATUS_IN_PROGRESS or record.request_hash != payload_hash:
+        return False
+    claimed = IdempotencyKey.objects.filter(
+        Q(locked_at__lt=now - timedelta(seconds=lease)) | Q(locked_at__isnull=True),
+        pk=record.pk,
+        status=IdempotencyKey.STATUS_IN_PROGRESS,
+    ).update(locked_at=now)
+    if claimed:
+        record.locked_at = now
+    return bool(claimed)
+
+
+def complete(record: IdempotencyKey, response: Response):
+    # guarded by locked_at: a holder that outlived its lease doesn't overwrite the new holder's key
+    IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at).update(
+        status=IdempotencyKey.STATUS_COMPLETED,
+        response_status=response.status_code,
+        response_body=response.data,
+    )
+
+
+def release(record: IdempotencyKey):
+    IdempotencyKey.objects.filter(pk=record.pk, locked_at=record.locked_at).delete()
+
+
+def purge_expired() -> int:
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def idempotent_response(request, key: str, payload: Dict[str, Any], handler: Callable[[], Response]) -> Response:
+    """
+    Run handler at most once per (user, key)
+
+    A repeated key with the same payload replays the stored response without
+    calling handler. A request arriving while the first one is still running
+    gets 409 instead of being executed a second time, until its lease expires.
+    Reusing a key with a different payload is rejected with 422.
+    """
+    payload_hash = request_hash(payload)
+    record, created = begin(request.user, key, payload_hash)
+
+    if not created:
+        if record.request_hash != payload_hash:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record.status == IdempotencyKey.STATUS_IN_PROGRESS:
+            return Response(
+                {'error': 'A request with this idempotency key is still being processed'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Retry-After': '1'}
+            )
+        return Response(
+            record.response_body,
+            status=record.response_status,
+            headers={'Idempotent-Replayed': 'true'}
+        )
+
+    try:
+        response = handler()
+    except BaseException:
+        # let the client retry with the same key
+        release(record)
+        raise
+    complete(record, response)
+    return response
@@ -1,13 +1,40 @@
-from typing import Dict, Any, Optional
-from django.template import Engine, Context
-from django.core.mail import send_mail
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
+from django.db.models import F, Q
 
+from apps.notifications.backends import async_smtp
 from apps.notifications.models.gradus_models import (
     NotificationType,
     NotificationTemplate,
     Channel
 )
+from apps.notifications.services import circuit_breaker, deadline, rate_limit, send_metrics
+from apps.notifications.services.channels import get_transport
+from apps.notifications.services.template_cache import template_cache
+
+
+_fanout_executor = None
+_fanout_executor_lock = threading.Lock()
+
+
+def _get_fanout_executor() -> ThreadPoolExecutor:
+    global _fanout_executor
+    with _fanout_executor_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'NOTIFICATION_FANOUT_WORKERS', 8),
+                thread_name_prefix='notification-fanout'
+            )
+        return _fanout_executor
+
+
+def _send_deadline() -> float:
+    return getattr(settings, 'NOTIFICATION_SEND_DEADLINE', 30)
 
 
 class NotificationSender:
@@ -23,6 +50,19 @@ class NotificationSender:
             context={'title': 'New Survey'},
             recipient='user@example.com'
         )
+        
+        # Send the same notification to many recipients
+        sender.send_many(
+            notification_type='new survey',
+            items=[('a@example.com', {'title': 'A'}), ('b@example.com', {'title': 'B'})]
+        )
+        
+        # Deliver to every channel of the type at once
+        sender.send_fanout(
+            notification_type='new survey',
+            context={'title': 'New Survey'},
+            recipients={'email': 'user@example.com', 'telegram': '123456789'}
+        )
     """
     
     def send(
@@ -45,71 +85,583 @@ class NotificationSender:
             True if sent successfully, False if error
         """
         try:
-            notification_type_obj = NotificationType.objects.filter(
-                title=notification_type,
-                is_active=True
-            ).first()
-            
-            if not notification_type_obj:
-                raise ValueError(f"Тип нотифікації '{notification_type}' не знайдено")
-            
-            channel_obj = Channel.objects.filter(
-                title='email',
-                is_active=True
-            ).first()
-            
-            if not channel_obj:
-                raise ValueError("Channel 'email' not found")
-            
-            if channel_obj not in notification_type_obj.channels.all():
-                raise ValueError(
-                    f"Channel 'email' is not allowed for type '{notification_type}'"
-                )
+            self.deliver(notification_type, context, recipient, template_name)
+            return True
             
-            if notification_type_obj.is_custom:
-                if not template_name:
-                    raise ValueError(f"For custom type '{notification_type}' a template name is required")
-                
-                template = NotificationTemplate.objects.filter(
-                    notification_type=notification_type_obj,
-                    channel=channel_obj,
-                    name=template_name,
-                    is_active=True
-                ).first()
+        except Exception as e:
+            self._report_error(e)
+            return False
+
+    def deliver(
+        self,
+        notification_type: str,
+        context: Dict[str, Any],
+        recipient: str,
+        template_name: Optional[str] = None
+    ):
+        """
+        Same as send(), but raises instead of returning False
+
+        Lookup, render and delivery together must finish within
+        NOTIFICATION_SEND_DEADLINE seconds.
+
+        Raises:
+            ValueError: if type, channel or template can't be used
+            CircuitOpenError: if the channel backend is down
+            DeadlineExceeded: if the send deadline has passed
+            Exception: any error raised by the mail backend
+        """
+        timer = send_metrics.StageTimer(notification_type, 'email')
+        try:
+            with deadline.scope(_send_deadline()):
+                template = self.get_template(notification_type, template_name, timer=timer)
+                deadline.check('template lookup')
+                rendered_title, rendered_html = self.render(template, context)
+                timer.lap('render')
+                deadline.check('render')
+                self.dispatch('email', recipient, rendered_title, rendered_html)
+                timer.lap('delivery')
+        except Exception as e:
+            timer.finish(e)
+            raise
+        timer.finish()
+
+    def deliver_digest(
+        self,
+        notification_type: str,
+        contexts: List[Dict[str, Any]],
+        recipient: str,
+        template_name: Optional[str] = None
+    ):
+        """
+        Deliver several notifications of one type as a single message
+
+        Every context is rendered with the type's template, bodies are
+        joined in order and the first title is used as subject with the
+        number of coalesced notifications appended.
+
+        Raises:
+            ValueError: if type, channel or template can't be used
+            Exception: any error raised by the mail backend
+        """
+        timer = send_metrics.StageTimer(notification_type, 'email')
+        try:
+            with deadline.scope(_send_deadline()):
+                template = self.get_template(notification_type, template_name, timer=timer)
+                deadline.check('template lookup')
+                rendered = [self.render(template, context) for context in contexts]
+                timer.lap('render')
+                deadline.check('render')
+                rendered_title = rendered[0][0]
+                if len(rendered) > 1:
+                    rendered_title = f'{rendered_title or "Notification"} (+{len(rendered) - 1})'
+                rendered_html = '\n'.join(html for _, html in rendered)
+                self.dispatch('email', recipient, rendered_title, rendered_html)
+                timer.lap('delivery')
+        except Exception as e:
+            timer.finish(e)
+            raise
+        timer.finish()
+
+    async def asend(
+        self,
+        notification_type: str,
+        context: Dict[str, Any],
+        recipient: str,
+        template_name: Optional[str] = None
+    ) -> bool:
+        """
+        Coroutine version of send()
+
+        Lookups use the async ORM and delivery goes through a pooled async
+        SMTP client, so no thread is held while waiting on the mail server.
+
+        Returns:
+            True if sent successfully, False if error
+        """
+        try:
+            await self.adeliver(notification_type, context, recipient, template_name)
+            return True
+
+        except Exception as e:
+            self._report_error(e)
+            return False
+
+    async def adeliver(
+        self,
+        notification_type: str,
+        context: Dict[str, Any],
+        recipient: str,
+        template_name: Optional[str] = None
+    ):
+        """Coroutine version of deliver()"""
+        timer = send_metrics.StageTimer(notification_type, 'email')
+        try:
+            with deadline.scope(_send_deadline()) as send_deadline:
+                try:
+                    await asyncio.wait_for(
+                        self._adeliver(notification_type, context, recipient, template_name, timer),
+                        timeout=send_deadline.remaining() if send_deadline else None
+                    )
+                except asyncio.TimeoutError:
+                    raise deadline.DeadlineExceeded(f'Send deadline of {send_deadline.seconds}s exceeded')
+        except Exception as e:
+            timer.finish(e)
+            raise
+        timer.finish()
+
+    async def _adeliver(self, notification_type, context, recipient, template_name, timer):
+        template = await self.aget_template(notification_type, template_name, timer=timer)
+        rendered_title, rendered_html = self.render(template, context)
+        timer.lap('render')
+        breaker = circuit_breaker.get_breaker('email')
+        breaker.before_call()
+        try:
+            await rate_limit.acall(
+                'email',
+                async_smtp.send_message,
+                self.build_message(rendered_title, rendered_html, recipient)
+            )
+        except BaseException as e:
+            # cancellation by the deadline isn't a backend failure, only frees a half-open probe
+            breaker.record(e)
+            raise
+        breaker.record()
+        timer.lap('delivery')
+
+    def send_many(
+        self,
+        notification_type: str,
+        items: Iterable[Tuple[str, Dict[str, Any]]],
+        template_name: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Send one notification type to many recipients
+
+        Type, channel and template are resolved once, every item is rendered
+        with its own context and messages are pushed over a single backend
+        connection, reopened every NOTIFICATION_BULK_CHUNK_SIZE messages.
+
+        Args:
+            notification_type: Name of notification type
+            items: Iterable of (recipient, context) pairs
+            template_name: Name of template (only for custom types)
+
+        Returns:
+            List of {'recipient', 'success', 'error'} dicts in input order
+        """
+        items = list(items)
+        timer = send_metrics.StageTimer(notification_type, 'email')
+        try:
+            template = self.get_template(notification_type, template_name, timer=timer)
+        except Exception as e:
+            self._report_error(e)
+            send_metrics.SENDS.labels(timer.type, 'email', send_metrics.outcome(e)).inc(len(items))
+            return [self._result(recipient, error=e) for recipient, _ in items]
+
+        results = []
+        messages = []
+        for recipient, context in items:
+            try:
+                rendered_title, rendered_html = self.render(template, context or {})
+                timer.lap('render')
+            except Exception as e:
+                send_metrics.count(timer.type, 'email', e)
+                results.append(self._result(recipient, error=e))
+                continue
+            result = self._result(recipient)
+            results.append(result)
+            messages.append((result, self.build_message(rendered_title, rendered_html, recipient)))
+
+        chunk_size = max(getattr(settings, 'NOTIFICATION_BULK_CHUNK_SIZE', 100), 1)
+        for start in range(0, len(messages), chunk_size):
+            self._send_chunk(messages[start:start + chunk_size], timer)
+
+        return results
+
+    def send_fanout(
+        self,
+        notification_type: str,
+        context: Dict[str, Any],
+        recipients: Dict[str, str],
+        template_name: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Deliver notification to several channels concurrently
+
+        Templates of all requested channels are resolved with a fixed number
+        of queries, then every channel is rendered and delivered in a shared
+        thread pool, so total latency is that of the slowest channel. All
+        channels share one NOTIFICATION_SEND_DEADLINE: channels that had not
+        started by then are reported as failed, channels still delivering are
+        reported with success None since the message may still go out.
+
+        Args:
+            notification_type: Name of notification type
+            context: Dictionary with variables for template
+            recipients: Channel title -> recipient address on that channel
+            template_name: Name of template (only for custom types)
+
+        Returns:
+            Channel title -> {'success', 'error'}, success is True, False or
+            None (outcome unknown)
+        """
+        with deadline.scope(_send_deadline()) as send_deadline:
+            return self._send_fanout(notification_type, context, recipients, template_name, send_deadline)
+
+    def _send_fanout(self, notification_type, context, recipients, template_name, send_deadline):
+        lookup_timer = send_metrics.StageTimer(notification_type, send_metrics.ALL_CHANNELS)
+        try:
+            templates = self.get_channel_templates(notification_type, list(recipients), template_name, timer=lookup_timer)
+        except Exception as e:
+            self._report_error(e)
+            send_metrics.SENDS.labels(lookup_timer.type, send_metrics.ALL_CHANNELS, send_metrics.outcome(e)).inc(
+                len(recipients)
+            )
+            return {channel: {'success': False, 'error': str(e)} for channel in recipients}
+
+        executor = _get_fanout_executor()
+        futures = {}
+        results = {}
+        for channel in recipients:
+            template = templates.get(channel)
+            if isinstance(template, Exception):
+                # channel title comes from the caller, don't turn it into a label
+                send_metrics.count(notification_type, send_metrics.ALL_CHANNELS, template)
+                results[channel] = {'success': False, 'error': str(template)}
             else:
-                template = NotificationTemplate.objects.filter(
-                    notification_type=notification_type_obj,
-                    channel=channel_obj,
-                    is_active=True
-                ).first()
-            
-            if not template:
-                raise ValueError(
-                    f"Template not found for type '{notification_type}' and channel 'email'"
+                # pool threads don't inherit context variables, pass the deadline along
+                futures[channel] = executor.submit(
+                    contextvars.copy_context().run,
+                    self._deliver_channel, notification_type, context, channel, recipients[channel], template
                 )
-            
-            engine = Engine()
-            html_template = engine.from_string(template.html)
-            rendered_html = html_template.render(Context(context))
-            
-            rendered_title = template.title
-            if rendered_title:
-                title_template = engine.from_string(rendered_title)
-                rendered_title = title_template.render(Context(context))
-            
-            send_mail(
-                subject=rendered_title or 'Notification',
-                message='',
-                html_message=rendered_html,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recipient],
-                fail_silently=False,
+
+        results.update(self._fanout_results(futures, send_deadline))
+        return {channel: results[channel] for channel in recipients}
+
+    def _deliver_channel(self, notification_type, context, channel, recipient, template):
+        """Render and deliver one channel of a fanout, runs in the fanout pool"""
+        timer = send_metrics.StageTimer(notification_type, channel)
+        try:
+            rendered_title, rendered_html = self.render(template, context)
+            timer.lap('render')
+            deadline.check('render')
+            self.dispatch(channel, recipient, rendered_title, rendered_html)
+            timer.lap('delivery')
+        except Exception as e:
+            timer.finish(e)
+            raise
+        timer.finish()
+
+    def _fanout_results(self, futures, send_deadline) -> Dict[str, Dict[str, Any]]:
+        """Wait for channel deliveries until the shared deadline, channel title -> {'success', 'error'}"""
+        results = {}
+        for channel, future in futures.items():
+            try:
+                future.result(timeout=send_deadline.remaining() if send_deadline else None)
+                results[channel] = {'success': True, 'error': None}
+            except FutureTimeoutError:
+                if not future.cancel():
+                    # already delivering, the transport can't be stopped mid-send
+                    results[channel] = {'success': None, 'error': 'timed out, delivery may still complete'}
+                    continue
+                error = deadline.DeadlineExceeded(f'Send deadline of {send_deadline.seconds}s exceeded')
+                self._report_error(error)
+                results[channel] = {'success': False, 'error': str(error)}
+            except Exception as e:
+                self._report_error(e)
+                results[channel] = {'success': False, 'error': str(e)}
+        return results
+
+    def render_many(
+        self,
+        notification_type: str,
+        contexts: Iterable[Dict[str, Any]],
+        channel: str = 'email',
+        template_name: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Render one template with many contexts without sending anything
+
+        Raises:
+            ValueError: if type, channel or template can't be used
+
+        Returns:
+            List of {'title', 'html'} (or {'error'}) dicts in input order
+        """
+        compiled = template_cache.get(self.get_template(notification_type, template_name, channel=channel))
+
+        results = []
+        for context in contexts:
+            try:
+                rendered_title, rendered_html = compiled.render(context or {})
+                results.append({'title': rendered_title, 'html': rendered_html})
+            except Exception as e:
+                results.append({'error': str(e)})
+        return results
+
+    def get_channel_templates(
+        self,
+        notification_type: str,
+        channels: List[str],
+        template_name: Optional[str] = None,
+        timer: Optional[send_metrics.StageTimer] = None
+    ) -> Dict[str, Any]:
+        """
+        Resolve templates of notification type for several channels at once
+
+        Returns:
+            Channel title -> NotificationTemplate, or ValueError explaining
+            why that channel can't be used
+
+        Raises:
+            ValueError: if notification type can't be used at all
+        """
+        timer = timer or send_metrics.StageTimer(notification_type, send_metrics.ALL_CHANNELS)
+        notification_type_obj = NotificationType.objects.filter(
+            title=notification_type,
+            is_active=True
+        ).first()
+
+        if not notification_type_obj:
+            timer.unknown_type()
+            timer.lap('type_lookup')
+            raise ValueError(f"Тип нотифікації '{notification_type}' не знайдено")
+        timer.lap('type_lookup')
+
+        allowed = {
+            channel.title: channel
+            for channel in notification_type_obj.channels.filter(title__in=channels, is_active=True)
+        }
+        timer.lap('membership_check')
+        templates = {
+            template.channel.title: template
+            for template in self._template_queryset(notification_type_obj, None, template_name)
+            .filter(channel__in=allowed.values())
+            .select_related('channel')
+        }
+        timer.lap('template_lookup')
+
+        resolved = {}
+        for channel in channels:
+            if channel not in allowed:
+                resolved[channel] = ValueError(
+                    f"Channel '{channel}' is not allowed for type '{notification_type}'"
+                )
+            elif channel not in templates:
+                resolved[channel] = ValueError(
+                    f"Template not found for type '{notification_type}' and channel '{channel}'"
+                )
+            else:
+                resolved[channel] = templates[channel]
+        return resolved
+
+    def get_template(
+        self,
+        notification_type: str,
+        template_name: Optional[str] = None,
+        channel: str = 'email',
+        timer: Optional[send_metrics.StageTimer] = None
+    ) -> NotificationTemplate:
+        """
+        Resolve active template for notification type and channel
+
+        Raises:
+            ValueError: if type, channel or template can't be used
+        """
+        timer = timer or send_metrics.StageTimer(notification_type, channel)
+        notification_type_obj = NotificationType.objects.filter(
+            title=notification_type,
+            is_active=True
+        ).first()
+
+        if not notification_type_obj:
+            timer.unknown_type()
+            timer.lap('type_lookup')
+            raise ValueError(f"Тип нотифікації '{notification_type}' не знайдено")
+        timer.lap('type_lookup')
+
+        channel_obj = Channel.objects.filter(
+            title=channel,
+            is_active=True
+        ).first()
+
+        if not channel_obj:
+            timer.unknown_channel()
+            timer.lap('channel_lookup')
+            raise ValueError(f"Channel '{channel}' not found")
+        timer.lap('channel_lookup')
+
+        allowed = channel_obj in notification_type_obj.channels.all()
+        timer.lap('membership_check')
+        if not allowed:
+            raise ValueError(
+                f"Channel '{channel}' is not allowed for type '{notification_type}'"
             )
-            
-            return True
-            
+
+        template = self._template_queryset(notification_type_obj, channel_obj, template_name).first()
+        timer.lap('template_lookup')
+
+        if not template:
+            raise ValueError(
+                f"Template not found for type '{notification_type}' and channel '{channel}'"
+            )
+
+        return template
+
+    def check_template(self, notification_type: str, template_name: Optional[str] = None, channel: str = 'email'):
+        """
+        Raise ValueError if get_template() would
+
+        One query when a usable template exists, get_template() only runs
+        to explain why there is none.
+        """
+        usable = NotificationTemplate.objects.filter(
+            Q(is_custom=False) | Q(name=template_name),
+            notification_type__title=notification_type,
+            notification_type__is_active=True,
+            notification_type__channels=F('channel'),
+            channel__title=channel,
+            channel__is_active=True,
+            is_active=True,
+        ).exists()
+        if not usable:
+            self.get_template(notification_type, template_name, channel)
+
+    async def aget_template(
+        self,
+        notification_type: str,
+        template_name: Optional[str] = None,
+        channel: str = 'email',
+        timer: Optional[send_metrics.StageTimer] = None
+    ) -> NotificationTemplate:
+        """Coroutine version of get_template()"""
+        timer = timer or send_metrics.StageTimer(notification_type, channel)
+        notification_type_obj = await NotificationType.objects.filter(
+            title=notification_type,
+            is_active=True
+        ).afirst()
+
+        if not notification_type_obj:
+            timer.unknown_type()
+            timer.lap('type_lookup')
+            raise ValueError(f"Тип нотифікації '{notification_type}' не знайдено")
+        timer.lap('type_lookup')
+
+        channel_obj = await Channel.objects.filter(
+            title=channel,
+            is_active=True
+        ).afirst()
+
+        if not channel_obj:
+            timer.unknown_channel()
+            timer.lap('channel_lookup')
+            raise ValueError(f"Channel '{channel}' not found")
+        timer.lap('channel_lookup')
+
+        allowed = await notification_type_obj.channels.filter(pk=channel_obj.pk).aexists()
+        timer.lap('membership_check')
+        if not allowed:
+            raise ValueError(
+                f"Channel '{channel}' is not allowed for type '{notification_type}'"
+            )
+
+        template = await self._template_queryset(notification_type_obj, channel_obj, template_name).afirst()
+        timer.lap('template_lookup')
+
+        if not template:
+            raise ValueError(
+                f"Template not found for type '{notification_type}' and channel '{channel}'"
+            )
+
+        return template
+
+    def _template_queryset(self, notification_type_obj, channel_obj=None, template_name=None):
+        queryset = NotificationTemplate.objects.filter(
+            notification_type=notification_type_obj,
+            is_active=True
+        )
+        if channel_obj is not None:
+            queryset = queryset.filter(channel=channel_obj)
+        if notification_type_obj.is_custom:
+            if not template_name:
+                raise ValueError(f"For custom type '{notification_type_obj.title}' a template name is required")
+            queryset = queryset.filter(name=template_name)
+        return queryset
+
+    def render(self, template: NotificationTemplate, context: Dict[str, Any]) -> Tuple[str, str]:
+        """Render (title, html) of template with context"""
+        return template_cache.get(template).render(context)
+
+    def build_message(
+        self,
+        rendered_title: str,
+        rendered_html: str,
+        recipient: str,
+        connection=None
+    ) -> EmailMultiAlternatives:
+        """Build email message equivalent to the one send_mail() produces"""
+        message = EmailMultiAlternatives(
+            subject=rendered_title or 'Notification',
+            body='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient],
+            connection=connection,
+        )
+        message.attach_alternative(rendered_html, 'text/html')
+        return message
+
+    def dispatch(self, channel: str, recipient: str, rendered_title: str, rendered_html: str):
+        """Deliver rendered notification through channel transport behind its breaker and rate limit"""
+        self._guarded(channel, get_transport(channel).send, recipient, rendered_title, rendered_html)
+
+    def _guarded(self, channel: str, func, *args):
+        breaker = circuit_breaker.get_breaker(channel)
+        breaker.before_call()
+        try:
+            result = rate_limit.call(channel, func, *args)
         except Exception as e:
-            import sys
-            if 'test' not in sys.modules:
-                print(f"Error sending notification: {str(e)}")
-            return False
+            breaker.record(e)
+            raise
+        breaker.record()
+        return result
+
+    def _send_chunk(self, chunk, timer):
+        """Send chunk of (result, message) pairs over one connection"""
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+            timer.lap('connect')
+            for result, message in chunk:
+                try:
+                    if not self._guarded('email', connection.send_messages, [message]):
+                        raise ValueError('Backend did not accept the message')
+                    result['success'] = True
+                    timer.lap('delivery')
+                    send_metrics.count(timer.type, 'email')
+                except Exception as e:
+                    result.update(success=False, error=str(e))
+                    send_metrics.count(timer.type, 'email', e)
+                    # connection may be broken, start a fresh one for the rest
+                    connection.close()
+                    connection.open()
+                    timer.lap('connect')
+        except Exception as e:
+            for result, _ in chunk:
+                if result['success'] is None:
+                    result.update(success=False, error=str(e))
+                    send_metrics.count(timer.type, 'email', e)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _result(recipient: str, error: Optional[Exception] = None) -> Dict[str, Any]:
+        if error is not None:
+            return {'recipient': recipient, 'success': False, 'error': str(error)}
+        return {'recipient': recipient, 'success': None, 'error': None}
+
+    @staticmethod
+    def _report_error(error: Exception):
+        import sys
+        if 'test' not in sys.modules:
+            print(f"Error sending notification: {str(error)}")
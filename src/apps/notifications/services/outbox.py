@@ -0,0 +1,293 @@
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils import timezone
+
+from apps.notifications.models.delivery_models import DigestWindow, Outbox
+from apps.notifications.models.gradus_models import NotificationType
+from apps.notifications.services.circuit_breaker import CircuitOpenError
+from apps.notifications.services.notification_sender import NotificationSender
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(
+    notification_type: str,
+    context: Dict[str, Any],
+    recipient: str,
+    template_name: Optional[str] = None,
+    message_id: Optional[uuid.UUID] = None,
+    created_by_id: Optional[int] = None
+) -> Outbox:
+    """
+    Store notification in the outbox for background delivery
+
+    If the type has a digest window, the row is held until the window of
+    its recipient closes and is then delivered together with the other
+    notifications of that window as one message.
+    """
+    digest_window, priority = NotificationType.objects.filter(
+        title=notification_type,
+        is_active=True
+    ).values_list('digest_window_seconds', 'priority').first() or (0, NotificationType.PRIORITY_NORMAL)
+
+    extra = {'message_id': message_id} if message_id else {}
+    extra['priority'] = priority
+    extra['created_by_id'] = created_by_id
+    if not digest_window:
+        return Outbox.objects.create(
+            notification_type=notification_type,
+            context=context,
+            recipient=recipient,
+            template_name=template_name,
+            **extra
+        )
+
+    now = timezone.now()
+    key = digest_key(notification_type, recipient, template_name)
+    with transaction.atomic():
+        # the locked window row serialises enqueues of one recipient, so only one of them opens a window
+        window, created = DigestWindow.objects.select_for_update().get_or_create(
+            digest_key=key,
+            defaults={'closes_at': now + timedelta(seconds=digest_window)}
+        )
+        if window.closes_at <= now:
+            window.closes_at = now + timedelta(seconds=digest_window)
+            window.save(update_fields=['closes_at'])
+        return Outbox.objects.create(
+            notification_type=notification_type,
+            context=context,
+            recipient=recipient,
+            template_name=template_name,
+            digest_key=key,
+            available_at=window.closes_at,
+            **extra
+        )
+
+
+def digest_key(notification_type: str, recipient: str, template_name: Optional[str] = None) -> str:
+    """Key of rows coalesced into one digest"""
+    return hashlib.sha256(f'{notification_type}\x00{template_name or ""}\x00{recipient}'.encode()).hexdigest()
+
+
+class OutboxWorker:
+    """
+    Delivers pending outbox rows through NotificationSender
+
+    Rows are claimed with a conditional UPDATE (status and lease are
+    re-checked in the WHERE clause), so any number of workers can poll the
+    same table: a row is handed to exactly one of them. A row whose worker
+    died is reclaimed once its lease expires. Rows sharing a digest_key are
+    claimed together and delivered as one digest message.
+
+    Rows are claimed by priority lane first (transactional, normal, bulk).
+    A worker started with ``lanes`` only serves those lanes, which is how
+    capacity is reserved for transactional notifications: run at least one
+    worker with lanes=['transactional'] next to the general ones.
+
+    Example:
+        worker = OutboxWorker(batch_size=50)
+        worker.run_once()
+
+        # only confirmation-style notifications
+        OutboxWorker(lanes=['transactional'], batch_size=1).run(poll_interval=0.1)
+    """
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        batch_size: int = 50,
+        lease_seconds: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        retry_backoff: Optional[int] = None,
+        sender: Optional[NotificationSender] = None,
+        lanes: Optional[List[str]] = None
+    ):
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds or getattr(settings, 'NOTIFICATION_OUTBOX_LEASE_SECONDS', 300)
+        self.max_attempts = max_attempts or getattr(settings, 'NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5)
+        self.retry_backoff = retry_backoff or getattr(settings, 'NOTIFICATION_OUTBOX_RETRY_BACKOFF', 30)
+        self.sender = sender or NotificationSender()
+        self.priorities = [NotificationType.LANES[lane] for lane in lanes] if lanes else None
+
+    def _claimable(self, now):
+        claimable = (
+            Q(status=Outbox.STATUS_PENDING, available_at__lte=now)
+            | Q(status=Outbox.STATUS_PROCESSING, claimed_at__lt=now - timedelta(seconds=self.lease_seconds))
+        )
+        if self.priorities is not None:
+            claimable &= Q(priority__in=self.priorities)
+        return claimable
+
+    def claim(self) -> List[Outbox]:
+        """Claim up to batch_size deliverable rows for this worker"""
+        now = timezone.now()
+        claimable = self._claimable(now)
+        candidates = list(
+            Outbox.objects.filter(claimable)
+            .order_by('priority', 'available_at')
+            .values_list('pk', flat=True)[:self.batch_size]
+        )
+        if not candidates:
+            return []
+
+        token = f'{self.worker_id}:{uuid.uuid4().hex[:12]}'[-64:]
+        Outbox.objects.filter(claimable, pk__in=candidates).update(
+            status=Outbox.STATUS_PROCESSING,
+            claimed_by=token,
+            claimed_at=now,
+        )
+        # a digest is sent as a whole, take the rest of its rows even past batch_size
+        digest_keys = set(
+            Outbox.objects.filter(claimed_by=token, digest_key__isnull=False)
+            .values_list('digest_key', flat=True)
+        )
+        if digest_keys:
+            Outbox.objects.filter(claimable, digest_key__in=digest_keys).update(
+                status=Outbox.STATUS_PROCESSING,
+                claimed_by=token,
+                claimed_at=now,
+            )
+        return list(
+            Outbox.objects.filter(claimed_by=token, status=Outbox.STATUS_PROCESSING)
+            .order_by('priority', 'created_at', 'pk')
+        )
+
+    def process(self, message: Outbox) -> bool:
+        """Deliver a claimed row and record the outcome"""
+        return self._deliver([message], lambda: self.sender.deliver(
+            notification_type=message.notification_type,
+            context=message.context,
+            recipient=message.recipient,
+            template_name=message.template_name,
+        ))
+
+    def process_digest(self, messages: List[Outbox]) -> bool:
+        """Deliver claimed rows of one digest window as a single message"""
+        first = messages[0]
+        return self._deliver(messages, lambda: self.sender.deliver_digest(
+            notification_type=first.notification_type,
+            contexts=[message.context for message in messages],
+            recipient=first.recipient,
+            template_name=first.template_name,
+        ))
+
+    def _deliver(self, messages: List[Outbox], send) -> bool:
+        attempts = max(message.attempts for message in messages) + 1
+        try:
+            send()
+        except CircuitOpenError as e:
+            # backend is known to be down, nothing was attempted: wait it out without using up an attempt
+            available_at = timezone.now() + timedelta(seconds=max(e.retry_after, 1))
+            for message in messages:
+                self._finish(message, status=Outbox.STATUS_PENDING, last_error=str(e), available_at=available_at)
+            return False
+        except Exception as e:
+            # ValueError means the notification itself can't be built, retrying won't help
+            permanent = isinstance(e, ValueError) or attempts >= self.max_attempts
+            logger.warning(
+                'Outbox %s delivery attempt %s failed (%s messages): %s',
+                messages[0].message_id, attempts, len(messages), e
+            )
+            available_at = timezone.now() + timedelta(seconds=self.retry_backoff * 2 ** (attempts - 1))
+            for message in messages:
+                self._finish(
+                    message,
+                    status=Outbox.STATUS_FAILED if permanent else Outbox.STATUS_PENDING,
+                    attempts=attempts,
+                    last_error=str(e),
+                    available_at=available_at,
+                )
+            return False
+
+        sent_at = timezone.now()
+        for message in messages:
+            self._finish(
+                message,
+                status=Outbox.STATUS_SENT,
+                attempts=attempts,
+                last_error=None,
+                sent_at=sent_at,
+            )
+        return True
+
+    def _finish(self, message: Outbox, **fields):
+        # guarded by claim token: if our lease expired and another worker took the row, leave it alone
+        Outbox.objects.filter(pk=message.pk, claimed_by=message.claimed_by).update(
+            claimed_by=None,
+            claimed_at=None,
+            updated_at=timezone.now(),
+            **fields
+        )
+
+    def run_once(self) -> int:
+        """Claim and process one batch, return number of claimed rows"""
+        batch = self.claim()
+        digests = defaultdict(list)
+        for message in batch:
+            if message.digest_key:
+                digests[message.digest_key].append(message)
+            else:
+                self.process(message)
+        for messages in digests.values():
+            self.process_digest(messages)
+        return len(batch)
+
+    def run(self, poll_interval: float = 1.0, stop=None):
+        """Process batches until stop() returns True"""
+        while not (stop and stop()):
+            if not self.run_once():
+                time.sleep(poll_interval)
+
+
+def lane_stats(window: int = 300) -> Dict[str, Dict[str, Any]]:
+    """
+    Queue depth and wait times per priority lane
+
+    pending: rows ready for delivery now
+    oldest_wait_s: how long the oldest ready row has been waiting
+    sent_recent / avg_wait_s / max_wait_s: rows sent in the last ``window``
+    seconds and their time from becoming available to being sent
+    """
+    now = timezone.now()
+    wait = ExpressionWrapper(F('sent_at') - F('available_at'), output_field=DurationField())
+    pending = {
+        row['priority']: row
+        for row in Outbox.objects.filter(status=Outbox.STATUS_PENDING, available_at__lte=now)
+        .values('priority').annotate(count=Count('pk'), oldest=Min('available_at'))
+    }
+    sent = {
+        row['priority']: row
+        for row in Outbox.objects.filter(status=Outbox.STATUS_SENT, sent_at__gte=now - timedelta(seconds=window))
+        .values('priority').annotate(count=Count('pk'), avg_wait=Avg(wait), max_wait=Max(wait))
+    }
+    processing = dict(
+        Outbox.objects.filter(status=Outbox.STATUS_PROCESSING)
+        .values('priority').annotate(count=Count('pk')).values_list('priority', 'count')
+    )
+
+    stats = {}
+    for lane, priority in NotificationType.LANES.items():
+        waiting = pending.get(priority, {})
+        done = sent.get(priority, {})
+        stats[lane] = {
+            'pending': waiting.get('count', 0),
+            'processing': processing.get(priority, 0),
+            'oldest_wait_s': round((now - waiting['oldest']).total_seconds(), 3) if waiting else 0.0,
+            'sent_recent': done.get('count', 0),
+            'avg_wait_s': round(done['avg_wait'].total_seconds(), 3) if done.get('avg_wait') else 0.0,
+            'max_wait_s': round(done['max_wait'].total_seconds(), 3) if done.get('max_wait') else 0.0,
+        }
+    return stats
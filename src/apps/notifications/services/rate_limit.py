@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+
+from apps.notifications.services import deadline
+
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Send slot could not be obtained within NOTIFICATION_RATE_LIMIT_MAX_WAIT"""
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """
+    True if error is a transient (4xx) refusal of the remote server
+
+    Covers smtplib and aiosmtplib response errors, including refused
+    recipients when every recipient got a 4xx reply.
+    """
+    recipients = getattr(error, 'recipients', None)
+    if isinstance(recipients, dict) and recipients:
+        return all(400 <= reply[0] < 500 for reply in recipients.values())
+    code = getattr(error, 'smtp_code', None) or getattr(error, 'code', None)
+    return isinstance(code, int) and 400 <= code < 500
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket
+
+    Refills ``rate`` tokens per second up to ``burst``.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.clock = clock
+        self.name = ''
+        self.config_key = None
+        self.tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token if one is available, otherwise return seconds to wait for it"""
+        with self._lock:
+            self._refill(self.clock())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block until a token is taken, False if timeout runs out first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        """Coroutine version of acquire()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.reserve()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def succeeded(self):
+        pass
+
+    def throttled(self):
+        pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(self.clock())
+            return {
+                'adaptive': False,
+                'rate': round(self.rate, 3),
+                'burst': self.burst,
+                'tokens': round(self.tokens, 3),
+            }
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Token bucket that adjusts its rate to what the remote side accepts (AIMD)
+
+    Every throttle reply multiplies the rate by ``decrease`` (at most once
+    per ``cooldown`` seconds, so one burst of refusals is one cut). Healthy
+    sends add ``increase`` tokens/s for every second's worth of successes,
+    up to ``max_rate``. The rate settles just below the point where the
+    server starts refusing instead of oscillating between full speed and
+    failure.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        min_rate: float = 1.0,
+        max_rate: Optional[float] = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+        clock=time.monotonic
+    ):
+        super().__init__(rate, burst, clock=clock)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate or rate)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.cooldown = float(cooldown)
+        self.throttle_events = 0
+        self.last_throttle_at = None
+
+    def succeeded(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                # one full increase step per `rate` successes, i.e. per second at the current rate
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def throttled(self):
+        with self._lock:
+            now = self.clock()
+            self.throttle_events += 1
+            if self.last_throttle_at is not None and now - self.last_throttle_at < self.cooldown:
+                return
+            self.last_throttle_at = now
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            # drop the burst allowance too, otherwise the next second still goes out at full speed
+            self.tokens = min(self.tokens, 1.0)
+            rate = self.rate
+        logger.warning("Channel '%s' throttled by remote server, rate lowered to %.2f/s", self.name, rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        with self._lock:
+            data.update(
+                adaptive=True,
+                min_rate=self.min_rate,
+                max_rate=self.max_rate,
+                throttle_events=self.throttle_events,
+                seconds_since_throttle=(
+                    round(self.clock() - self.last_throttle_at, 3)
+                    if self.last_throttle_at is not None else None
+                ),
+            )
+        return data
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(channel: str) -> Optional[TokenBucket]:
+    """
+    Return limiter of channel configured in settings.NOTIFICATION_RATE_LIMITS
+
+    Channels without an entry are not limited (None).
+    """
+    config = getattr(settings, 'NOTIFICATION_RATE_LIMITS', {}).get(channel)
+    if not config:
+        return None
+    key = (channel, tuple(sorted(config.items())))
+    with _limiters_lock:
+        limiter = _limiters.get(channel)
+        if limiter is None or limiter.config_key != key:
+            options = dict(config)
+            if options.pop('adaptive', False):
+                limiter = AdaptiveTokenBucket(**options)
+            else:
+                limiter = TokenBucket(rate=options['rate'], burst=options.get('burst'))
+            limiter.name = channel
+            limiter.config_key = key
+            _limiters[channel] = limiter
+        return limiter
+
+
+def reset():
+    """Forget all limiter state"""
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Current rate, tokens and throttle counters of every configured channel"""
+    channels = getattr(settings, 'NOTIFICATION_RATE_LIMITS', {})
+    return {channel: get_limiter(channel).snapshot() for channel in channels if channels[channel]}
+
+
+def _max_wait() -> float:
+    # never wait for a slot past the send deadline
+    return deadline.remaining(getattr(settings, 'NOTIFICATION_RATE_LIMIT_MAX_WAIT', 30))
+
+
+def _report(limiter: TokenBucket, error: Optional[Exception]):
+    if error is None:
+        limiter.succeeded()
+    elif is_throttle_error(error):
+        limiter.throttled()
+
+
+def call(channel: str, func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) once channel's limiter allows it
+
+    Raises:
+        RateLimitExceeded: if no slot frees up within NOTIFICATION_RATE_LIMIT_MAX_WAIT
+    """
+    limiter = get_limiter(channel)
+    if limiter is None:
+        return func(*args, **kwargs)
+    if not limiter.acquire(timeout=_max_wait()):
+        raise RateLimitExceeded(f"Rate limit of channel '{channel}' exceeded")
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        _report(limiter, e)
+        raise
+    _report(limiter, None)
+    return result
+
+
+async def acall(channel: str, func, *args, **kwargs):
+    """Coroutine version of call() for an async func"""
+    limiter = get_limiter(channel)
+    if limiter is None:
+        return await func(*args, **kwargs)
+    if not await limiter.aacquire(timeout=_max_wait()):
+        raise RateLimitExceeded(f"Rate limit of channel '{channel}' exceeded")
+    try:
+        result = await func(*args, **kwargs)
+    except Exception as e:
+        _report(limiter, e)
+        raise
+    _report(limiter, None)
+    return result
@@ -0,0 +1,244 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import django
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.notifications.models.gradus_models import Channel, NotificationTemplate, NotificationType, Variable
+from apps.notifications.validators import validate_template
+
+
+logger = logging.getLogger(__name__)
+
+
+def mark_stale(queryset) -> int:
+    """
+    Flag templates for TemplateRevalidator, one UPDATE, return number flagged
+
+    Drops claims too: a result validated before this change must not be stored.
+    """
+    return queryset.filter(
+        Q(needs_revalidation=False) | Q(revalidation_claimed_by__isnull=False)
+    ).update(needs_revalidation=True, revalidation_claimed_by=None, revalidation_claimed_at=None)
+
+
+def channel_changed(channel: Channel, old_tags) -> int:
+    """
+    Flag templates that the new allowed tags of a channel can change the outcome for
+
+    A removed tag can only break templates that mention it, an added tag
+    can only fix templates that are invalid now.
+    """
+    old = {tag.lower() for tag in (old_tags or [])}
+    new = {tag.lower() for tag in (channel.allowed_tags or [])}
+    templates = NotificationTemplate.objects.filter(channel=channel)
+    flagged = 0
+    if new - old:
+        flagged += mark_stale(templates.filter(is_valid=False))
+    if old - new:
+        # '<b' also matches '<br>', flagging a few extra rows is fine
+        mentions = Q()
+        for tag in old - new:
+            mentions |= Q(html__icontains=f'<{tag}')
+        flagged += mark_stale(templates.filter(mentions))
+    return flagged
+
+
+def types_changed(type_ids: Iterable[int]) -> int:
+    """Flag templates of types whose active variables changed, custom types don't use them"""
+    return mark_stale(NotificationTemplate.objects.filter(notification_type_id__in=type_ids, is_custom=False))
+
+
+def variable_changed(variable: Variable) -> int:
+    """Flag templates of the types using a renamed or (de)activated variable"""
+    return types_changed(variable.notification_types.values('pk'))
+
+
+def check_templates(items: List[tuple]) -> List[Tuple[int, str, str]]:
+    """
+    Validate templates in a worker process
+
+    Items are (pk, content_hash, html, allowed_tags, variable_names,
+    is_custom, used_vars), returns (pk, content_hash, error) with '' for
+    valid templates. Doesn't touch the database.
+    """
+    channels = {}
+    results = []
+    for pk, hash_, html, allowed_tags, variable_names, is_custom, used_vars in items:
+        channel = channels.get(allowed_tags)
+        if channel is None:
+            channel = channels[allowed_tags] = Channel(allowed_tags=list(allowed_tags))
+        try:
+            validate_template(html, channel, variable_names, is_custom=is_custom, used_vars=used_vars)
+            results.append((pk, hash_, ''))
+        except ValidationError as e:
+            results.append((pk, hash_, '; '.join(e.messages)))
+    return results
+
+
+class TemplateRevalidator:
+    """
+    Revalidates templates flagged by channel and notification type changes
+
+    Saving a channel or changing the variables of a type only flags the
+    templates whose outcome can change (see signals.py), so the admin
+    request only pays for an UPDATE. The revalidator claims flagged rows in
+    batches of ``batch_size`` and validates them in a pool of ``workers``
+    processes while the next batch is read.
+
+    Rows are claimed with a conditional UPDATE, so several revalidators
+    can share the table, and a claim whose revalidator died expires after
+    ``lease_seconds``. The flag is only cleared together with the stored
+    result, and only if the content hash is still the validated one and
+    the row wasn't flagged again meanwhile; other rows stay flagged.
+
+    workers=1 validates in the calling process. Flagged templates keep
+    their last is_valid/validation_error until a revalidator runs, deploy
+    ``manage.py revalidate_templates`` next to the outbox workers (the
+    revalidator service in docker-compose.yml).
+
+    Example:
+        with TemplateRevalidator(workers=8) as revalidator:
+            revalidator.run_once()
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        chunk_size: int = 250,
+        revalidator_id: Optional[str] = None,
+        lease_seconds: Optional[int] = None
+    ):
+        self.workers = workers or getattr(settings, 'NOTIFICATION_REVALIDATION_WORKERS', None) or os.cpu_count() or 1
+        self.batch_size = batch_size or getattr(settings, 'NOTIFICATION_REVALIDATION_BATCH_SIZE', 5000)
+        self.chunk_size = chunk_size
+        self.revalidator_id = revalidator_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_seconds = lease_seconds or getattr(settings, 'NOTIFICATION_REVALIDATION_LEASE_SECONDS', 600)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def submit(self, items: List[tuple]) -> Future:
+        if self.workers <= 1:
+            future = Future()
+            future.set_result(check_templates(items))
+            return future
+        if self._executor is None:
+            # django.setup for platforms that spawn instead of fork
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup)
+        return self._executor.submit(check_templates, items)
+
+    def _claimable(self, now):
+        expired = now - timedelta(seconds=self.lease_seconds)
+        return NotificationTemplate.objects.filter(
+            Q(revalidation_claimed_by__isnull=True) | Q(revalidation_claimed_at__lt=expired),
+            needs_revalidation=True,
+        )
+
+    def claim(self) -> Tuple[str, List[tuple]]:
+        """Claim the next batch, return its token and validation items, 5 queries"""
+        now = timezone.now()
+        pks = list(self._claimable(now).order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+        token = f'{self.revalidator_id}:{uuid.uuid4().hex[:12]}'[-64:]
+        if not pks:
+            return token, []
+        # re-checked in the WHERE clause, a row claimed by someone else meanwhile is skipped
+        self._claimable(now).filter(pk__in=pks).update(revalidation_claimed_by=token, revalidation_claimed_at=now)
+        rows = list(
+            NotificationTemplate.objects.filter(revalidation_claimed_by=token).order_by('pk').values_list(
+                'pk', 'content_hash', 'html', 'variables', 'is_custom', 'channel_id', 'notification_type_id'
+            )
+        )
+
+        tags = {
+            pk: tuple(sorted(allowed_tags or []))
+            for pk, allowed_tags in Channel.objects.filter(pk__in={row[5] for row in rows}).values_list('pk', 'allowed_tags')
+        }
+        variables = defaultdict(list)
+        for type_id, title in NotificationType.variables.through.objects.filter(
+            notificationtype_id__in={row[6] for row in rows}, variable__is_active=True
+        ).values_list('notificationtype_id', 'variable__title'):
+            variables[type_id].append(title)
+
+        return token, [
+            (pk, hash_, html, tags[channel_id], variables[type_id], is_custom, used_vars)
+            for pk, hash_, html, used_vars, is_custom, channel_id, type_id in rows
+        ]
+
+    def store(self, token: str, results: List[Tuple[int, str, str]]) -> int:
+        """
+        Save outcomes and clear the flag, return number of invalid templates stored
+
+        Results of templates saved (content hash changed) or flagged again
+        (claim dropped) since the claim are discarded, the rows keep their
+        flag and are validated again.
+        """
+        with transaction.atomic():
+            current = dict(
+                NotificationTemplate.objects.select_for_update().filter(
+                    pk__in=[pk for pk, _, _ in results], revalidation_claimed_by=token
+                ).values_list('pk', 'content_hash')
+            )
+            # templates broken by the same change mostly share the message, cheaper than bulk_update
+            by_error = defaultdict(list)
+            for pk, hash_, error in results:
+                if current.get(pk) == hash_:
+                    by_error[error].append(pk)
+            for error, pks in by_error.items():
+                NotificationTemplate.objects.filter(pk__in=pks).update(
+                    is_valid=not error, validation_error=error, needs_revalidation=False,
+                    revalidation_claimed_by=None, revalidation_claimed_at=None
+                )
+            # edited since the claim, still flagged if the edit didn't validate it
+            NotificationTemplate.objects.filter(revalidation_claimed_by=token).update(
+                revalidation_claimed_by=None, revalidation_claimed_at=None
+            )
+        return sum(len(pks) for error, pks in by_error.items() if error)
+
+    def run_once(self) -> int:
+        """Revalidate every flagged template, return number checked"""
+        checked = invalid = 0
+        pending = None
+        while True:
+            token, items = self.claim()
+            # workers validate this batch while the previous one is stored
+            submitted = [
+                self.submit(items[i:i + self.chunk_size]) for i in range(0, len(items), self.chunk_size)
+            ]
+            if pending:
+                previous_token, futures = pending
+                results = [result for future in futures for result in future.result()]
+                invalid += self.store(previous_token, results)
+                checked += len(results)
+            pending = (token, submitted) if items else None
+            if not items:
+                if invalid:
+                    logger.warning('Revalidated %s templates, %s are invalid', checked, invalid)
+                return checked
+
+    def run(self, poll_interval: float = 5.0, stop=None):
+        """Revalidate flagged templates until stop() returns True"""
+        while not (stop and stop()):
+            if not self.run_once():
+                time.sleep(poll_interval)
@@ -0,0 +1,149 @@
+import heapq
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.notifications.models.delivery_models import ScheduledNotification
+from apps.notifications.services import outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+def schedule(
+    notification_type: str,
+    context: Dict[str, Any],
+    recipient: str,
+    send_at: datetime,
+    template_name: Optional[str] = None,
+    created_by_id: Optional[int] = None
+):
+    """
+    Deliver notification at send_at
+
+    Returns the ScheduledNotification, or the Outbox row right away if
+    send_at is already due. Either way its message_id is the one the
+    outbox row will have.
+    """
+    if send_at <= timezone.now():
+        return outbox.enqueue(notification_type, context, recipient, template_name, created_by_id=created_by_id)
+    return ScheduledNotification.objects.create(
+        notification_type=notification_type,
+        context=context,
+        recipient=recipient,
+        template_name=template_name,
+        send_at=send_at,
+        created_by_id=created_by_id,
+    )
+
+
+class NotificationScheduler:
+    """
+    Moves due scheduled notifications to the outbox
+
+    Instead of polling the whole table, the scheduler loads the ids of rows
+    due within the next ``window`` seconds (at most ``max_loaded``, via the
+    (status, send_at) index) into a heap and sleeps until the earliest one.
+    The window is reloaded every ``refresh`` seconds to pick up rows added
+    since, so the cost is one bounded range query per refresh no matter how
+    many rows are scheduled further ahead.
+
+    Due rows are claimed with a conditional UPDATE, so several schedulers
+    can run against the same table without enqueueing a row twice.
+
+    Example:
+        scheduler = NotificationScheduler()
+        scheduler.run_once()
+    """
+
+    def __init__(
+        self,
+        scheduler_id: Optional[str] = None,
+        window: Optional[int] = None,
+        refresh: Optional[int] = None,
+        batch_size: int = 500,
+        max_loaded: int = 10000
+    ):
+        self.scheduler_id = scheduler_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.window = window or getattr(settings, 'NOTIFICATION_SCHEDULER_WINDOW', 300)
+        self.refresh = refresh or getattr(settings, 'NOTIFICATION_SCHEDULER_REFRESH', 10)
+        self.batch_size = batch_size
+        self.max_loaded = max_loaded
+        self._heap = []
+        self._horizon = None
+        self._reload_at = None
+
+    def load(self, now: datetime):
+        """Rebuild heap from rows due before now + window"""
+        horizon = now + timedelta(seconds=self.window)
+        rows = list(
+            ScheduledNotification.objects.filter(
+                status=ScheduledNotification.STATUS_SCHEDULED,
+                send_at__lt=horizon
+            ).order_by('send_at').values_list('send_at', 'pk')[:self.max_loaded]
+        )
+        self._heap = rows  # already sorted, i.e. a valid heap
+        # more rows than max_loaded: nothing past the last loaded one is known
+        self._horizon = rows[-1][0] if len(rows) == self.max_loaded else horizon
+        self._reload_at = now + timedelta(seconds=self.refresh)
+
+    def due(self, now: datetime) -> List[int]:
+        """Pop ids of rows due at now"""
+        pks = []
+        while self._heap and self._heap[0][0] <= now:
+            pks.append(heapq.heappop(self._heap)[1])
+        return pks
+
+    def release(self, pks: List[int]) -> int:
+        """Claim rows and move them to the outbox, return number moved"""
+        moved = 0
+        for start in range(0, len(pks), self.batch_size):
+            token = f'{self.scheduler_id}:{uuid.uuid4().hex[:12]}'[-64:]
+            with transaction.atomic():
+                ScheduledNotification.objects.filter(
+                    pk__in=pks[start:start + self.batch_size],
+                    status=ScheduledNotification.STATUS_SCHEDULED
+                ).update(status=ScheduledNotification.STATUS_ENQUEUED, claimed_by=token)
+                for item in ScheduledNotification.objects.filter(claimed_by=token):
+                    outbox.enqueue(
+                        notification_type=item.notification_type,
+                        context=item.context,
+                        recipient=item.recipient,
+                        template_name=item.template_name,
+                        message_id=item.message_id,
+                        created_by_id=item.created_by_id,
+                    )
+                    moved += 1
+        return moved
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Reload window if needed and release due rows, return number moved"""
+        now = now or timezone.now()
+        if self._reload_at is None or now >= self._reload_at or (not self._heap and self._horizon <= now):
+            self.load(now)
+        moved = self.release(self.due(now))
+        if moved:
+            logger.info('Moved %s scheduled notifications to the outbox', moved)
+        return moved
+
+    def seconds_until_next(self, now: Optional[datetime] = None) -> float:
+        """Time the scheduler may sleep before anything needs to be done"""
+        now = now or timezone.now()
+        wake_at = self._reload_at
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return max((wake_at - now).total_seconds(), 0.0)
+
+    def run(self, stop=None):
+        """Release due rows until stop() returns True"""
+        while not (stop and stop()):
+            self.run_once()
+            time.sleep(self.seconds_until_next())
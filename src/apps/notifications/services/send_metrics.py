@@ -0,0 +1,74 @@
+import time
+from typing import Optional
+
+from apps.metrics.registry import registry
+
+
+UNKNOWN_TYPE = '(unknown)'
+UNKNOWN_CHANNEL = '(unknown)'
+ALL_CHANNELS = '*'
+
+STAGE_SECONDS = registry.histogram(
+    'notification_send_stage_seconds',
+    'Time spent in each stage of a send (type/channel/membership/template lookup, render, delivery)',
+    ['stage', 'type', 'channel'],
+)
+SEND_SECONDS = registry.histogram(
+    'notification_send_duration_seconds',
+    'Total time of a single send, from lookup to delivery',
+    ['type', 'channel'],
+)
+SENDS = registry.counter(
+    'notification_sends_total',
+    "Finished sends by outcome ('sent' or the exception class name)",
+    ['type', 'channel', 'outcome'],
+)
+
+
+def outcome(error: Optional[Exception] = None) -> str:
+    return 'sent' if error is None else type(error).__name__
+
+
+def count(notification_type: str, channel: str, error: Optional[Exception] = None):
+    SENDS.labels(notification_type, channel, outcome(error)).inc()
+
+
+class StageTimer:
+    """
+    Records consecutive stages of one send
+
+    Every lap() observes the time since the previous lap (or creation)
+    under the given stage. Type and channel names that don't exist are
+    relabelled as unknown so arbitrary input can't create new label
+    combinations.
+
+    Example:
+        timer = StageTimer('new survey', 'email')
+        ...lookup...
+        timer.lap('template_lookup')
+        ...
+        timer.finish()
+    """
+
+    __slots__ = ('type', 'channel', 'started', 'last')
+
+    def __init__(self, notification_type: str, channel: str):
+        self.type = notification_type
+        self.channel = channel
+        self.started = self.last = time.perf_counter()
+
+    def unknown_type(self):
+        self.type = UNKNOWN_TYPE
+
+    def unknown_channel(self):
+        self.channel = UNKNOWN_CHANNEL
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        STAGE_SECONDS.labels(stage, self.type, self.channel).observe(now - self.last)
+        self.last = now
+
+    def finish(self, error: Optional[Exception] = None):
+        """Count the send and observe its total duration"""
+        SEND_SECONDS.labels(self.type, self.channel).observe(time.perf_counter() - self.started)
+        count(self.type, self.channel, error)
@@ -0,0 +1,96 @@
+from typing import Dict, Any, Optional, Tuple
+
+from django.conf import settings
+from django.template import Engine, Context
+
+from apps.notifications.cache import LRUCache
+from apps.notifications.services.fast_renderer import FastTemplate, NeedsEngine
+
+
+class CompiledTemplate:
+    """
+    Compiled title/html pair of a NotificationTemplate
+
+    Simple templates (text and plain ``{{ var }}`` only) are also compiled
+    to FastTemplate segments and rendered without the template engine,
+    unless a context value needs the engine to be resolved. ``is_simple``
+    covers both title and html, None checks them here.
+    """
+
+    def __init__(self, version, html, title=None, fast: bool = True, is_simple: Optional[bool] = None):
+        self.version = version
+        self.html = html
+        self.title = title
+        fast = fast and is_simple is not False
+        self.fast_html = FastTemplate.from_template(html, is_simple) if fast else None
+        self.fast_title = FastTemplate.from_template(title, is_simple) if fast and title else None
+        self.is_fast = self.fast_html is not None and (title is None or self.fast_title is not None)
+
+    def render(self, context: Dict[str, Any]) -> Tuple[str, str]:
+        """Return (rendered_title, rendered_html)"""
+        if self.is_fast:
+            try:
+                rendered_title = self.fast_title.render(context) if self.fast_title else ''
+                return rendered_title, self.fast_html.render(context)
+            except NeedsEngine:
+                pass
+        rendered_html = self.html.render(Context(context))
+        rendered_title = self.title.render(Context(context)) if self.title else ''
+        return rendered_title, rendered_html
+
+
+class TemplateCache:
+    """
+    Process-wide LRU of compiled notification templates
+
+    Entries are keyed by template pk and carry a version (stored
+    ``content_hash``, ``updated_at`` for rows without metadata), so a
+    template edited by another process is recompiled on next use.
+    Local saves and deletes evict the entry right away (see signals.py).
+    """
+
+    def __init__(self, maxsize: int = 512, engine: Optional[Engine] = None, fast: bool = True):
+        self.engine = engine or Engine()
+        self.fast = fast
+        self._cache = LRUCache(maxsize)
+
+    @staticmethod
+    def version_of(template):
+        return template.content_hash or template.updated_at
+
+    def get(self, template) -> CompiledTemplate:
+        version = self.version_of(template)
+        compiled = self._cache.get(template.pk, is_fresh=lambda entry: entry.version == version)
+        if compiled is not None:
+            return compiled
+
+        compiled = self.compile(template, version)
+        if template.pk is not None:
+            self._cache.set(template.pk, compiled)
+        return compiled
+
+    def compile(self, template, version=None) -> CompiledTemplate:
+        return CompiledTemplate(
+            version,
+            self.engine.from_string(template.html),
+            self.engine.from_string(template.title) if template.title else None,
+            fast=self.fast,
+            # stored with the metadata on save(), rows changed by queryset.update() keep stale metadata
+            # until saved again or refreshed by the backfill_template_metadata command
+            is_simple=template.is_simple if template.content_hash else None,
+        )
+
+    def invalidate(self, pk) -> bool:
+        return self._cache.invalidate(pk)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+template_cache = TemplateCache(
+    maxsize=getattr(settings, 'NOTIFICATION_TEMPLATE_CACHE_SIZE', 512),
+    fast=getattr(settings, 'NOTIFICATION_FAST_RENDER', True)
+)
@@ -0,0 +1,156 @@
+from typing import Any, Dict, List
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from apps.notifications.models.gradus_models import Channel, NotificationTemplate, NotificationType
+from apps.notifications.template_metadata import template_metadata
+from apps.notifications.validators import validate_template
+
+
+class TemplateImportError(Exception):
+    """Some items of an import are invalid, nothing was inserted"""
+
+    def __init__(self, errors: List[Dict[str, List[str]]]):
+        super().__init__(f'{sum(1 for e in errors if e)} invalid template(s)')
+        self.errors = errors  # one dict per item, empty for valid items
+
+
+def uniqueness_key(notification_type: NotificationType, channel: Channel, name):
+    """Templates of regular types are unique per channel, custom ones per channel and name"""
+    if notification_type.is_custom:
+        return notification_type.pk, channel.pk, name
+    return notification_type.pk, channel.pk
+
+
+def duplicate_error(notification_type: NotificationType, channel: Channel, name, suffix='already exists'):
+    """Same message as validate_template_uniqueness"""
+    field = 'name' if notification_type.is_custom else 'channel'
+    label = name if notification_type.is_custom else notification_type.title
+    return {field: [f'Template "{label}" for type "{notification_type.title}" and channel "{channel.title}" {suffix}']}
+
+
+def import_templates(items: List[Dict[str, Any]]) -> List[NotificationTemplate]:
+    """
+    Validate and insert many templates at once
+
+    Items are dicts with NotificationTemplateWriteSerializer fields
+    (``notification_type`` and ``channel`` are titles). Types and channels
+    are resolved with one query each, existing templates are checked for
+    duplicates with one query and the rows are inserted with bulk_create,
+    so the query count doesn't depend on the number of items.
+
+    Raises:
+        TemplateImportError: if any item is invalid, with per-item errors
+    """
+    types = {
+        notification_type.title: notification_type
+        for notification_type in NotificationType.objects.filter(
+            title__in={item['notification_type'] for item in items}, is_active=True
+        ).prefetch_related('variables')
+    }
+    channels = {
+        channel.title: channel
+        for channel in Channel.objects.filter(title__in={item['channel'] for item in items}, is_active=True)
+    }
+
+    errors = [{} for _ in items]
+    templates = [None] * len(items)
+    for index, item in enumerate(items):
+        try:
+            templates[index] = build_template(item, types, channels)
+        except ValidationError as e:
+            errors[index] = e.message_dict
+
+    with transaction.atomic():
+        seen = report_repeated(templates, errors)
+        report_existing(seen, templates, errors)
+        if any(errors):
+            raise TemplateImportError(errors)
+        try:
+            with transaction.atomic():
+                return NotificationTemplate.objects.bulk_create(templates)
+        except IntegrityError:
+            # a concurrent writer inserted one of them after the check
+            report_existing(seen, templates, errors)
+            if any(errors):
+                raise TemplateImportError(errors)
+            raise
+
+
+def build_template(
+    item: Dict[str, Any],
+    types: Dict[str, NotificationType],
+    channels: Dict[str, Channel]
+) -> NotificationTemplate:
+    """
+    Validated unsaved template of one import item
+
+    Raises:
+        ValidationError: with the errors of the item
+    """
+    notification_type = types.get(item['notification_type'])
+    channel = channels.get(item['channel'])
+    missing = {}
+    if notification_type is None:
+        missing['notification_type'] = [f"Notification type '{item['notification_type']}' not found"]
+    if channel is None:
+        missing['channel'] = [f"Channel '{item['channel']}' not found"]
+    if missing:
+        raise ValidationError(missing)
+
+    template = NotificationTemplate(
+        notification_type=notification_type,
+        channel=channel,
+        name=item.get('name'),
+        title=item.get('title') or '',
+        html=item['html'],
+        is_active=item.get('is_active', True),
+        is_custom=notification_type.is_custom,
+    )
+    if channel.title.lower() in ['telegram', 'viber'] and template.title:
+        raise ValidationError({'title': 'Title is not allowed for telegram and viber channels'})
+    if notification_type.is_custom and not template.name:
+        raise ValidationError({'name': 'Name is required for custom notification types'})
+    for field, value in template_metadata(template.title, template.html).items():
+        setattr(template, field, value)
+    validate_template(
+        template.html,
+        channel,
+        notification_type.variable_names,
+        is_custom=notification_type.is_custom,
+        used_vars=template.variables
+    )
+    return template
+
+
+def report_repeated(templates: List[NotificationTemplate], errors: List[dict]) -> Dict[tuple, int]:
+    """Mark items repeating an earlier item of the import, return uniqueness keys of the first ones"""
+    seen = {}
+    for index, template in enumerate(templates):
+        if template is None:
+            continue
+        key = uniqueness_key(template.notification_type, template.channel, template.name)
+        if key in seen:
+            errors[index] = duplicate_error(
+                template.notification_type, template.channel, template.name,
+                f'is repeated in this import (item {seen[key]})'
+            )
+        else:
+            seen[key] = index
+    return seen
+
+
+def report_existing(seen: Dict[tuple, int], templates: List[NotificationTemplate], errors: List[dict]):
+    """Mark items that collide with stored templates, one query for the whole batch"""
+    # over-fetches other names of custom types, still one query
+    existing = NotificationTemplate.objects.filter(
+        notification_type_id__in={key[0] for key in seen},
+        channel_id__in={key[1] for key in seen},
+    ).values_list('notification_type_id', 'channel_id', 'is_custom', 'name')
+    taken = {(type_id, channel_id, name) if is_custom else (type_id, channel_id)
+             for type_id, channel_id, is_custom, name in existing}
+    for key, index in seen.items():
+        if key in taken:
+            template = templates[index]
+            errors[index] = duplicate_error(template.notification_type, template.channel, template.name)
@@ -0,0 +1,53 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.notifications.models.gradus_models import Channel, NotificationTemplate, NotificationType, Variable
+from apps.notifications.services import revalidation
+from apps.notifications.services.template_cache import template_cache
+
+
+@receiver(post_save, sender=NotificationTemplate)
+@receiver(post_delete, sender=NotificationTemplate)
+def evict_compiled_template(sender, instance, **kwargs):
+    """Drop compiled template from the process-wide cache"""
+    template_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Channel)
+def revalidate_channel_templates(sender, instance, created, **kwargs):
+    """Flag templates affected by changed allowed tags"""
+    saved = getattr(instance, '_saved_allowed_tags', None)
+    if created:
+        pass
+    elif saved is None:
+        # not loaded from the database, the previous tags are unknown
+        revalidation.mark_stale(instance.templates.all())
+    elif saved != instance.allowed_tags:
+        revalidation.channel_changed(instance, saved)
+    instance._saved_allowed_tags = list(instance.allowed_tags or [])
+
+
+@receiver(post_save, sender=Variable)
+def revalidate_variable_templates(sender, instance, created, **kwargs):
+    """Flag templates of the types using a renamed or (de)activated variable"""
+    state = (instance.title, instance.is_active)
+    if not created and getattr(instance, '_saved_state', None) != state:
+        revalidation.variable_changed(instance)
+    instance._saved_state = state
+
+
+@receiver(post_save, sender=NotificationType)
+def revalidate_type_templates(sender, instance, created, **kwargs):
+    """Custom types don't allow variables, templates are checked differently after a switch"""
+    if not created and getattr(instance, '_saved_is_custom', None) != instance.is_custom:
+        revalidation.mark_stale(instance.templates.all())
+
+
+@receiver(m2m_changed, sender=NotificationType.variables.through)
+def revalidate_on_variables_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Flag templates of types whose variables were added or removed"""
+    if reverse and action == 'pre_clear':
+        # the types lose the variable, they are unknown after the clear
+        revalidation.variable_changed(instance)
+    elif action in ('post_add', 'post_remove', 'post_clear') and not (reverse and action == 'post_clear'):
+        revalidation.types_changed(pk_set if reverse else [instance.pk])
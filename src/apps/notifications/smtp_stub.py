@@ -0,0 +1,197 @@
+import base64
+import socket
+import socketserver
+import threading
+import time
+
+
+class SMTPStubServer:
+    """
+    In-process SMTP stand-in for tests, benchmarks and load tests
+
+    Speaks enough SMTP for smtplib/Django mail backends (EHLO, AUTH PLAIN/LOGIN,
+    MAIL, RCPT, DATA, RSET, NOOP, QUIT), accepts any credentials and keeps
+    received messages in memory. No TLS.
+
+    Example:
+        with SMTPStubServer() as server:
+            with override_settings(EMAIL_HOST=server.host, EMAIL_PORT=server.port, EMAIL_USE_TLS=False):
+                send_mail(...)
+            server.messages  # [{'from': ..., 'to': [...], 'data': b'...'}]
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0, reply=None):
+        """
+        Args:
+            host, port: Address to listen on (port 0 picks a free one)
+            delay: Seconds to sleep before acknowledging each message
+            reply: Optional callable(command, argument) returning an SMTP reply
+                line (e.g. '451 4.7.1 Try again later') to override the default
+        """
+        self.delay = delay
+        self.reply = reply
+        self.messages = []
+        self.connections = 0
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer((host, port), _SMTPHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def drop_connections(self):
+        """Close all open client connections, as a server-side idle timeout would"""
+        with self._lock:
+            sockets, self._sockets = list(self._sockets), set()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _record(self, mail_from, rcpt_to, data):
+        with self._lock:
+            self.messages.append({'from': mail_from, 'to': list(rcpt_to), 'data': data})
+
+    def _connected(self, sock):
+        with self._lock:
+            self.connections += 1
+            self._sockets.add(sock)
+
+    def _disconnected(self, sock):
+        with self._lock:
+            self._sockets.discard(sock)
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def send(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def respond(self, command: str, argument: str, default: str):
+        reply = self.server.stub.reply(command, argument) if self.server.stub.reply else None
+        self.send(reply or default)
+        return reply is None or reply.startswith('2') or reply.startswith('3')
+
+    def readline(self) -> str:
+        return self.rfile.readline().decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def handle(self):
+        try:
+            self.converse()
+        except OSError:
+            # client went away or connection was dropped by drop_connections()
+            pass
+
+    def converse(self):
+        self.server.stub._connected(self.connection)
+        self.mail_from, self.rcpt_to = None, []
+        self.send('220 localhost SMTP stub ready')
+
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            command, _, argument = line.partition(' ')
+            # one smtp_<command> method per supported command, like smtpd
+            handler = getattr(self, f'smtp_{command.lower()}', None)
+            if handler is None:
+                self.send('502 Command not implemented')
+            elif handler(argument):
+                return
+
+    def smtp_ehlo(self, argument: str):
+        self.send('250-localhost')
+        self.send('250-AUTH PLAIN LOGIN')
+        self.send('250 8BITMIME')
+
+    def smtp_helo(self, argument: str):
+        self.send('250 localhost')
+
+    def smtp_mail(self, argument: str):
+        if self.respond('MAIL', argument, '250 OK'):
+            self.mail_from, self.rcpt_to = argument.partition(':')[2].strip('<> '), []
+
+    def smtp_rcpt(self, argument: str):
+        if self.respond('RCPT', argument, '250 OK'):
+            self.rcpt_to.append(argument.partition(':')[2].strip('<> '))
+
+    def smtp_data(self, argument: str):
+        stub = self.server.stub
+        self.send('354 End data with <CR><LF>.<CR><LF>')
+        data = self.read_data()
+        if stub.delay:
+            time.sleep(stub.delay)
+        if self.respond('DATA', argument, '250 OK: queued'):
+            stub._record(self.mail_from, self.rcpt_to, data)
+        self.mail_from, self.rcpt_to = None, []
+
+    def smtp_rset(self, argument: str):
+        self.mail_from, self.rcpt_to = None, []
+        self.send('250 OK')
+
+    def smtp_noop(self, argument: str):
+        self.respond('NOOP', argument, '250 OK')
+
+    def smtp_quit(self, argument: str) -> bool:
+        """True ends the conversation"""
+        self.send('221 Bye')
+        return True
+
+    def finish(self):
+        self.server.stub._disconnected(self.connection)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def smtp_auth(self, argument: str):
+        mechanism, _, initial = argument.partition(' ')
+        if mechanism.upper() == 'LOGIN':
+            for prompt in (b'Username:', b'Password:'):
+                self.send('334 ' + base64.b64encode(prompt).decode())
+                self.readline()
+        elif mechanism.upper() == 'PLAIN' and not initial:
+            self.send('334 ')
+            self.readline()
+        self.send('235 Authentication successful')
+
+    def read_data(self) -> bytes:
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line.rstrip(b'\r\n') == b'.':
+                break
+            if line.startswith(b'..'):
+                line = line[1:]
+            lines.append(line)
+        return b''.join(lines)
@@ -0,0 +1,207 @@
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import bleach
+from bleach.sanitizer import ALLOWED_ATTRIBUTES, ALLOWED_PROTOCOLS
+from html5lib.constants import entities
+
+from apps.notifications.cache import LRUCache
+
+
+# Elements whose tree construction is a plain push/pop as long as they are
+# well nested and the rules below hold; anything else goes to bleach
+FORMATTING_TAGS = frozenset({
+    'a', 'b', 'big', 'code', 'em', 'font', 'i', 'nobr', 's', 'small', 'strike', 'strong', 'tt', 'u',
+})
+PHRASING_TAGS = frozenset({
+    'abbr', 'acronym', 'bdi', 'bdo', 'cite', 'data', 'del', 'dfn', 'ins', 'kbd', 'mark', 'q', 'samp', 'span',
+    'sub', 'sup', 'time', 'var',
+})
+VOID_TAGS = frozenset({'br', 'img', 'wbr', 'hr'})
+HEADING_TAGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+LIST_ITEM_TAGS = frozenset({'li', 'dd', 'dt'})
+# start tags that close an open <p>
+CLOSES_P_TAGS = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'center', 'details', 'dialog', 'dir', 'div', 'dl', 'fieldset',
+    'figcaption', 'figure', 'footer', 'header', 'hgroup', 'main', 'menu', 'nav', 'ol', 'p', 'section',
+    'summary', 'ul', 'hr',
+}) | HEADING_TAGS | LIST_ITEM_TAGS
+SIMPLE_TAGS = FORMATTING_TAGS | PHRASING_TAGS | VOID_TAGS | CLOSES_P_TAGS
+# content of these is not tokenized as markup
+RAW_TEXT_TAGS = frozenset({
+    'script', 'style', 'xmp', 'iframe', 'noembed', 'noframes', 'noscript', 'plaintext', 'textarea', 'title',
+})
+
+# characters the scanner has to look at, everything else is copied as is by bleach
+_SPECIAL = re.compile('[<>&\x00-\x08\x0b-\x1f\x7f-\x9f\ud800-\udfff\ufdd0-\ufdef\ufffe\uffff]')
+_TAG = re.compile(r'<(/?)([a-zA-Z][^\t\n\x0c\r />]*)')
+_ATTRIBUTE = re.compile(r' ([a-z][a-z-]*)="([^"\'&<>`\x00-\x1f\x7f]*)"')
+_ENTITY = re.compile(r'&([a-zA-Z][a-zA-Z0-9]*);')
+
+
+class NeedsBleach(Exception):
+    """Markup the scanner can't prove bleach keeps unchanged"""
+
+
+@dataclass(frozen=True)
+class TagViolation:
+    """First markup of a template that the tag policy does not keep as is"""
+
+    tag: Optional[str]
+    position: int
+    line: int
+    column: int
+
+    @classmethod
+    def at(cls, html: str, position: int, tag: Optional[str] = None) -> 'TagViolation':
+        line = html.count('\n', 0, position) + 1
+        column = position - (html.rfind('\n', 0, position) + 1) + 1
+        return cls(tag, position, line, column)
+
+    def __str__(self):
+        where = f'line {self.line}, column {self.column}'
+        return f'<{self.tag}> at {where}' if self.tag else where
+
+
+class TagPolicy:
+    """
+    Allowed tags of a channel, checked the way validate_template used to
+
+    A template passes when ``bleach.clean(html, tags=allowed_tags,
+    strip=True)`` would return it unchanged. check() streams the html and
+    returns at the first tag that is not allowed, without building a
+    cleaned copy. Documents made of well nested simple tags (see
+    SIMPLE_TAGS), canonical attributes and plain text are accepted by the
+    scanner alone; anything else it can't prove unchanged (comments,
+    tables, unclosed tags, attributes bleach would drop, bare ``&``...)
+    is handed to bleach for the final answer.
+    """
+
+    def __init__(self, allowed_tags):
+        self.allowed_tags = frozenset(t.lower() for t in (allowed_tags or []))
+        self.simple_tags = self.allowed_tags & SIMPLE_TAGS
+        self.raw_text_tags = self.allowed_tags & RAW_TEXT_TAGS
+        self.attributes = {tag: frozenset(names) for tag, names in ALLOWED_ATTRIBUTES.items()}
+        self.url_prefixes = tuple(f'{protocol}:' for protocol in ALLOWED_PROTOCOLS)
+
+    def check(self, html: str) -> Optional[TagViolation]:
+        """None if the template only uses allowed markup, the first violation otherwise"""
+        try:
+            return self.scan(html)
+        except NeedsBleach:
+            return self.fallback(html)
+
+    def scan(self, html: str) -> Optional[TagViolation]:
+        """Scanner pass of check(), raises NeedsBleach when it can't prove html unchanged"""
+        stack = []
+        certain = True  # False once bleach could rewrite something, the stack is no longer tracked
+        position = 0
+        while True:
+            match = _SPECIAL.search(html, position)
+            if match is None:
+                break
+            start = match.start()
+            tag = _TAG.match(html, start) if html[start] == '<' else None
+            if tag is None:
+                position, canonical = self.scan_text(html, start)
+                certain = certain and canonical
+                continue
+            name = tag.group(2).lower()
+            if name not in self.allowed_tags:
+                return TagViolation.at(html, start, name)
+            position, canonical = self.scan_tag(html, tag, name)
+            if certain and canonical:
+                certain = self.pop(stack, name) if tag.group(1) else self.push(stack, name)
+            else:
+                certain = False
+
+        if certain and not stack:
+            return None
+        raise NeedsBleach(html)
+
+    def scan_text(self, html: str, start: int) -> Tuple[int, bool]:
+        """Step over an entity or special character, return next position and whether bleach keeps it"""
+        if html[start] == '&':
+            entity = _ENTITY.match(html, start)
+            if entity and f'{entity.group(1)};' in entities:
+                return entity.end(), True
+        elif html.startswith(('<!', '<?', '</'), start):
+            # comments, doctypes and bogus end tags
+            raise NeedsBleach(html)
+        # a bare '&' or lone '<' is escaped, control characters are replaced
+        return start + 1, False
+
+    def scan_tag(self, html: str, tag, name: str) -> Tuple[int, bool]:
+        """Step over an allowed tag, return next position and whether bleach keeps it as written"""
+        is_end, raw_name = tag.groups()
+        if name in self.raw_text_tags:
+            raise NeedsBleach(html)
+        canonical = raw_name == name
+        position = tag.end()
+        if not is_end:
+            seen = set()
+            attribute = _ATTRIBUTE.match(html, position)
+            while attribute:
+                attr_name, value = attribute.groups()
+                if attr_name in seen or not self.keeps_attribute(name, attr_name, value):
+                    canonical = False  # bleach drops it
+                seen.add(attr_name)
+                position = attribute.end()
+                attribute = _ATTRIBUTE.match(html, position)
+        if not html.startswith('>', position):
+            raise NeedsBleach(html)
+        return position + 1, canonical
+
+    def keeps_attribute(self, tag: str, name: str, value: str) -> bool:
+        if name not in self.attributes.get(tag, ()):
+            return False
+        if name == 'href':
+            return ':' not in value or value.startswith(self.url_prefixes)
+        return True
+
+    def push(self, stack: list, name: str) -> bool:
+        """Track start tag, False if the parser would restructure the tree"""
+        if name not in self.simple_tags:
+            return False
+        if name in CLOSES_P_TAGS and 'p' in stack:
+            return False
+        if name in HEADING_TAGS and HEADING_TAGS.intersection(stack):
+            return False
+        if name == 'li' and 'li' in stack:
+            return False
+        if name in ('dd', 'dt') and ('dd' in stack or 'dt' in stack):
+            return False
+        if name in ('a', 'nobr') and name in stack:
+            return False
+        if name not in VOID_TAGS:
+            stack.append(name)
+        return True
+
+    def pop(self, stack: list, name: str) -> bool:
+        """Track end tag, False unless it closes the current element"""
+        if not stack or stack[-1] != name:
+            return False
+        stack.pop()
+        return True
+
+    def fallback(self, html: str) -> Optional[TagViolation]:
+        cleaned = bleach.clean(html, tags=self.allowed_tags, strip=True)
+        if cleaned == html:
+            return None
+        position = next((i for i, (a, b) in enumerate(zip(html, cleaned)) if a != b), min(len(html), len(cleaned)))
+        tag = _TAG.match(html, position)
+        return TagViolation.at(html, position, tag.group(2).lower() if tag else None)
+
+
+_policies = LRUCache(256)
+
+
+def policy_for(allowed_tags) -> TagPolicy:
+    """TagPolicy of a Channel.allowed_tags value, built once per distinct tag set"""
+    key = frozenset(t.lower() for t in (allowed_tags or []))
+    policy = _policies.get(key)
+    if policy is None:
+        policy = TagPolicy(key)
+        _policies.set(key, policy)
+    return policy
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.template.base import TextNode, VariableNode
+
+from apps.notifications.validators import extract_vars, parse_template
+
+
+def content_hash(title: str, html: str) -> str:
+    """sha256 of template title and html"""
+    return hashlib.sha256(f'{title or ""}\x00{html}'.encode()).hexdigest()
+
+
+def is_simple_node(node) -> bool:
+    """True for text and plain ``{{ var }}`` nodes (no filters, no dotted lookups, no literals)"""
+    if isinstance(node, TextNode):
+        return True
+    if not isinstance(node, VariableNode):
+        return False
+    expression = node.filter_expression
+    variable = expression.var
+    return (
+        not expression.filters
+        and getattr(variable, 'lookups', None) is not None
+        and len(variable.lookups) == 1
+        and not variable.translate
+    )
+
+
+def is_simple_template(template) -> bool:
+    """True if parsed template consists of simple nodes only"""
+    return all(is_simple_node(node) for node in template.nodelist)
+
+
+def template_metadata(title: str, html: str, parsed_html=None) -> dict:
+    """
+    Derived metadata stored on NotificationTemplate
+
+    Raises:
+        ValidationError: if html is not a valid template
+    """
+    parsed_html = parsed_html or parse_template(html)
+    is_simple = is_simple_template(parsed_html)
+    if is_simple and title:
+        try:
+            is_simple = is_simple_template(parse_template(title))
+        except ValidationError:
+            is_simple = False
+    return {
+        'content_hash': content_hash(title, html),
+        'variables': sorted(extract_vars(parsed_html)),
+        'is_simple': is_simple,
+        'size_bytes': len(html.encode()),
+    }
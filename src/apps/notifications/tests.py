@@ -1,16 +1,53 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import importlib
+import smtplib
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import bleach
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.core import mail
+from django.core.exceptions import ValidationError
+from django.apps import apps as django_apps
+from django.db import IntegrityError, connection, transaction
+from django.core.management import call_command
+from django.template import Context, Engine
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.core.mail import send_mail
 from django.contrib.auth.models import User
+from rest_framework.response import Response
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from apps.api_logging.models import APILog
 from apps.notifications.models.gradus_models import (
     Channel,
     Variable,
     NotificationType,
     NotificationTemplate
 )
+from apps.notifications.backends import async_smtp
+from apps.notifications.backends.smtp_pool import SMTPConnectionPool, close_pools
+from apps.notifications.models.delivery_models import DigestWindow, Outbox, IdempotencyKey, ScheduledNotification
+from apps.notifications.services import circuit_breaker, deadline, fast_renderer, idempotency, rate_limit, send_metrics
+from apps.notifications.services.channels import ChannelTransport
+from apps.notifications.services.fast_renderer import FastTemplate, NeedsEngine
 from apps.notifications.services.notification_sender import NotificationSender
+from apps.notifications.services.outbox import OutboxWorker, enqueue, lane_stats
+from apps.notifications.services.revalidation import TemplateRevalidator, check_templates
+from apps.notifications.services.scheduler import NotificationScheduler
+from apps.notifications.services.template_cache import TemplateCache, template_cache
+from apps.notifications.smtp_stub import SMTPStubServer
+from apps.notifications.tag_policy import TagPolicy, policy_for
+from apps.notifications.validators import validate_template, validation_cache
+from core.testing import QueryBudget, QueryBudgetMixin
 
 
 class NotificationSenderTestCase(TestCase):
@@ -45,6 +82,24 @@ class NotificationSenderTestCase(TestCase):
         
         self.sender = NotificationSender()
     
+    def test_send_records_stage_metrics(self):
+        """Test that a send records per-stage timings and its outcome"""
+        def samples(stage):
+            return send_metrics.STAGE_SECONDS.labels(stage, 'new survey', 'email').count
+        
+        stages = ['type_lookup', 'channel_lookup', 'membership_check', 'template_lookup', 'render', 'delivery']
+        before = {stage: samples(stage) for stage in stages}
+        sent = send_metrics.SENDS.labels('new survey', 'email', 'sent').value
+        
+        self.sender.send('new survey', {'title': 'Test Survey'}, 'test@example.com')
+        self.sender.send('no such type', {}, 'test@example.com')
+        
+        for stage in stages:
+            self.assertEqual(samples(stage), before[stage] + 1, stage)
+        self.assertEqual(send_metrics.SENDS.labels('new survey', 'email', 'sent').value, sent + 1)
+        self.assertGreater(send_metrics.SENDS.labels(send_metrics.UNKNOWN_TYPE, 'email', 'ValueError').value, 0)
+        self.assertNotIn(('no such type', 'email', 'ValueError'), dict(send_metrics.SENDS.items()))
+    
     def test_send_notification_success(self):
         """Test successful notification sending"""
         result = self.sender.send(
@@ -129,6 +184,287 @@ class NotificationSenderTestCase(TestCase):
         
         self.assertFalse(result)
         self.assertEqual(len(mail.outbox), 0)
+    
+    async def test_asend_notification_success(self):
+        """Test successful notification sending via coroutine"""
+        result = await self.sender.asend(
+            notification_type='new survey',
+            context={'title': 'Async Survey'},
+            recipient='test@example.com'
+        )
+        
+        self.assertTrue(result)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'New Survey Available')
+        self.assertIn('Async Survey', mail.outbox[0].alternatives[0][0])
+    
+    async def test_asend_notification_invalid_type(self):
+        """Test coroutine sending with invalid notification type"""
+        result = await self.sender.asend(
+            notification_type='invalid_type',
+            context={'title': 'Test'},
+            recipient='test@example.com'
+        )
+        
+        self.assertFalse(result)
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_send_many(self):
+        """Test sending one type to many recipients"""
+        results = self.sender.send_many(
+            notification_type='new survey',
+            items=[
+                ('a@example.com', {'title': 'Survey A'}),
+                ('b@example.com', {'title': 'Survey B'}),
+                ('c@example.com', {'title': 'Survey C'}),
+            ]
+        )
+        
+        self.assertEqual([r['success'] for r in results], [True, True, True])
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[1].to, ['b@example.com'])
+        self.assertEqual(mail.outbox[1].subject, 'New Survey Available')
+        self.assertIn('Survey B', mail.outbox[1].alternatives[0][0])
+    
+    def test_send_many_invalid_type(self):
+        """Test that unresolvable type fails every recipient"""
+        results = self.sender.send_many(
+            notification_type='invalid_type',
+            items=[('a@example.com', {}), ('b@example.com', {})]
+        )
+        
+        self.assertEqual([r['success'] for r in results], [False, False])
+        self.assertTrue(all(r['error'] for r in results))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class SlowRecordingTransport(ChannelTransport):
+    """Test transport that takes a while and remembers deliveries"""
+    delivered = []
+    
+    def deliver(self, recipient, rendered_title, rendered_html):
+        time.sleep(0.2)
+        self.delivered.append((recipient, rendered_html))
+
+
+@override_settings(NOTIFICATION_CHANNEL_TRANSPORTS={
+    'email': 'apps.notifications.services.channels.EmailTransport',
+    'telegram': 'apps.notifications.tests.SlowRecordingTransport',
+    'viber': 'apps.notifications.tests.SlowRecordingTransport',
+})
+class NotificationFanoutTestCase(TestCase):
+    """Tests for multi-channel fan-out"""
+    
+    def setUp(self):
+        """Set up test data"""
+        variable = Variable.objects.create(title='title')
+        self.notification_type = NotificationType.objects.create(
+            title='new survey',
+            is_custom=False
+        )
+        self.notification_type.variables.add(variable)
+        for title, tags in [('email', ['p', 'b']), ('telegram', ['p']), ('viber', ['p']), ('push', [])]:
+            channel = Channel.objects.create(title=title, allowed_tags=tags)
+            self.notification_type.channels.add(channel)
+            NotificationTemplate.objects.create(
+                notification_type=self.notification_type,
+                channel=channel,
+                title='New Survey' if title == 'email' else '',
+                html='{{ title }}' if title == 'push' else f'<p>{title}: {{{{ title }}}}</p>'
+            )
+        SlowRecordingTransport.delivered = []
+        self.sender = NotificationSender()
+    
+    def test_fanout_delivers_all_channels_concurrently(self):
+        """Test that channels are delivered in parallel"""
+        start = time.monotonic()
+        results = self.sender.send_fanout(
+            notification_type='new survey',
+            context={'title': 'Survey'},
+            recipients={'email': 'user@example.com', 'telegram': '1001', 'viber': '+380000000000'}
+        )
+        elapsed = time.monotonic() - start
+        
+        self.assertTrue(all(result['success'] for result in results.values()))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(('1001', '<p>telegram: Survey</p>'), SlowRecordingTransport.delivered)
+        self.assertLess(elapsed, 0.39)
+    
+    def test_fanout_reports_per_channel_errors(self):
+        """Test that a channel without transport doesn't block other channels"""
+        results = self.sender.send_fanout(
+            notification_type='new survey',
+            context={'title': 'Survey'},
+            recipients={'email': 'user@example.com', 'push': 'device-token', 'sms': '+380000000000'}
+        )
+        
+        self.assertTrue(results['email']['success'])
+        self.assertFalse(results['push']['success'])
+        self.assertIn('No transport configured', results['push']['error'])
+        self.assertFalse(results['sms']['success'])
+        self.assertIn('not allowed', results['sms']['error'])
+    
+    @override_settings(NOTIFICATION_SEND_DEADLINE=0.1)
+    def test_fanout_reports_channel_still_delivering_at_deadline_as_unknown(self):
+        """Test that a channel finishing after the deadline isn't reported as failed"""
+        results = self.sender.send_fanout(
+            notification_type='new survey',
+            context={'title': 'Survey'},
+            recipients={'telegram': '1001'}
+        )
+        
+        self.assertIsNone(results['telegram']['success'])
+        self.assertEqual(results['telegram']['error'], 'timed out, delivery may still complete')
+        time.sleep(0.3)
+        self.assertEqual(SlowRecordingTransport.delivered, [('1001', '<p>telegram: Survey</p>')])
+    
+    def test_transport_does_not_start_delivery_after_deadline(self):
+        """Test that transport checks the deadline before the irreversible send"""
+        with deadline.scope(0.01):
+            time.sleep(0.02)
+            with self.assertRaises(deadline.DeadlineExceeded):
+                SlowRecordingTransport().send('1001', '', '<p>late</p>')
+        
+        self.assertEqual(SlowRecordingTransport.delivered, [])
+
+
+class TemplateCacheTestCase(TestCase):
+    """Tests for compiled template cache"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.channel = Channel.objects.create(
+            title='email',
+            allowed_tags=['p', 'b', 'i', 'a', 'br']
+        )
+        self.variable = Variable.objects.create(title='title')
+        self.notification_type = NotificationType.objects.create(
+            title='new survey',
+            is_custom=False
+        )
+        self.notification_type.channels.add(self.channel)
+        self.notification_type.variables.add(self.variable)
+        self.template = NotificationTemplate.objects.create(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            title='New Survey Available',
+            html='<p>Hello! New survey: {{ title }}</p>'
+        )
+        template_cache.clear()
+    
+    def test_repeated_sends_reuse_compiled_template(self):
+        """Test that second send is served from cache"""
+        sender = NotificationSender()
+        sender.send('new survey', {'title': 'First'}, 'a@example.com')
+        sender.send('new survey', {'title': 'Second'}, 'b@example.com')
+        
+        stats = template_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertIn('Second', mail.outbox[1].alternatives[0][0])
+    
+    def test_save_evicts_compiled_template(self):
+        """Test that saving a template drops the stale compiled version"""
+        sender = NotificationSender()
+        sender.send('new survey', {'title': 'Survey'}, 'a@example.com')
+        
+        self.template.html = '<p>Updated: {{ title }}</p>'
+        self.template.save()
+        self.assertEqual(template_cache.stats()['invalidations'], 1)
+        
+        sender.send('new survey', {'title': 'Survey'}, 'a@example.com')
+        self.assertIn('Updated: Survey', mail.outbox[1].alternatives[0][0])
+    
+    def test_stale_is_simple_flag_falls_back_to_engine(self):
+        """Test that html changed by queryset.update() isn't compiled by its stored is_simple flag"""
+        self.assertTrue(self.template.is_simple)
+        for html, expected in [
+            ('<p>{{ title|upper }}</p>', '<p>SURVEY</p>'),
+            ('<p>{% if title %}{{ title }}{% endif %}</p>', '<p>Survey</p>'),
+        ]:
+            NotificationTemplate.objects.filter(pk=self.template.pk).update(html=html)
+            template = NotificationTemplate.objects.get(pk=self.template.pk)
+            
+            compiled = TemplateCache().get(template)
+            self.assertFalse(compiled.is_fast)
+            self.assertEqual(compiled.render({'title': 'Survey'})[1], expected)
+    
+    def test_lru_eviction(self):
+        """Test that cache is bounded by maxsize"""
+        cache = TemplateCache(maxsize=1)
+        other = NotificationTemplate(pk=self.template.pk + 1, html='<p>{{ title }}</p>')
+        cache.get(self.template)
+        cache.get(other)
+        
+        stats = cache.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['evictions'], 1)
+
+
+class FastRendererTestCase(SimpleTestCase):
+    """Tests for fast-path rendering of simple templates"""
+    
+    def setUp(self):
+        self.engine = Engine()
+    
+    def test_output_is_identical_to_engine(self):
+        """Test fast path against the Django engine on a corpus of templates and values"""
+        templates = [
+            '<p>Hello! New survey: {{ title }}</p>',
+            '{{ title }}',
+            '{{title}}{{ title }} text {{  title  }}',
+            '<a href="https://example.com/{{ title }}">Привіт, {{ title }}!</a>',
+            'No variables at all',
+            '',
+        ]
+        values = [
+            'Survey', '<script>alert("x")</script>', "O'Reilly & Sons", mark_safe('<b>safe</b>'),
+            'Опитування', 42, 3.5, Decimal('10.10'), None, True, ['a', '<b>'], {'k': '<v>'},
+            datetime.date(2024, 1, 31), datetime.datetime(2024, 1, 31, 12, 30, tzinfo=datetime.timezone.utc),
+        ]
+        for html in templates:
+            template = self.engine.from_string(html)
+            fast = FastTemplate.from_template(template)
+            self.assertIsNotNone(fast, html)
+            for value in values:
+                context = {'title': value}
+                self.assertEqual(fast.render(context), template.render(Context(context)), (html, value))
+    
+    def test_complex_templates_are_not_compiled(self):
+        """Test that filters, tags, dotted lookups and literals use the engine"""
+        for html in ['{{ title|upper }}', '{% if title %}x{% endif %}', '{{ user.name }}', '{{ "literal" }}', '{{ 1 }}']:
+            self.assertIsNone(FastTemplate.from_template(self.engine.from_string(html)), html)
+    
+    def test_engine_fallback(self):
+        """Test that missing and callable values are left to the engine"""
+        fast = FastTemplate.from_template(self.engine.from_string('<p>{{ title }}</p>'))
+        with self.assertRaises(NeedsEngine):
+            fast.render({})
+        with self.assertRaises(NeedsEngine):
+            fast.render({'title': lambda: 'called'})
+        
+        compiled = TemplateCache().compile(NotificationTemplate(title='{{ True }}', html='<p>{{ title }}</p>'))
+        self.assertTrue(compiled.is_fast)
+        self.assertEqual(compiled.render({'title': lambda: 'called'}), ('True', '<p>called</p>'))
+    
+    def test_stored_simple_flag_is_used(self):
+        """Test that stored is_simple=False skips the node checks and True is still confirmed by them"""
+        html, title = '<p>{{ title }}</p>', 'Survey {{ title }}'
+        with mock.patch(
+            'apps.notifications.services.fast_renderer.is_simple_node', wraps=fast_renderer.is_simple_node
+        ) as is_simple_node:
+            complex_ = TemplateCache().compile(
+                NotificationTemplate(title=title, html=html, content_hash='stored', is_simple=False)
+            )
+            is_simple_node.assert_not_called()
+            simple = TemplateCache().compile(
+                NotificationTemplate(title=title, html=html, content_hash='stored', is_simple=True)
+            )
+        
+        self.assertEqual(is_simple_node.call_count, 5)
+        self.assertTrue(simple.is_fast)
+        self.assertFalse(complex_.is_fast)
+        self.assertEqual(simple.render({'title': 'x'}), complex_.render({'title': 'x'}))
 
 
 class SendNotificationAPITestCase(TestCase):
@@ -183,9 +519,35 @@ class SendNotificationAPITestCase(TestCase):
             format='json'
         )
         
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn('message', response.data)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn('message_id', response.data)
+        self.assertEqual(len(mail.outbox), 0)
+        
+        OutboxWorker().run_once()
         self.assertEqual(len(mail.outbox), 1)
+        
+        response = self.client.get(f"/api/notifications/outbox/{response.data['message_id']}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Outbox.STATUS_SENT)
+    
+    def test_outbox_status_is_private_to_the_sender(self):
+        """Test that other users can't read a queued notification by its message_id"""
+        response = self.client.post(
+            '/api/notifications/send/',
+            {
+                'notification_type': 'new survey',
+                'context': {'title': 'Test Survey'},
+                'recipient': 'user@example.com'
+            },
+            format='json'
+        )
+        url = f"/api/notifications/outbox/{response.data['message_id']}/"
+        
+        self.client.force_authenticate(user=User.objects.create_user(username='other', password='testpass123'))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        
+        self.client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
     
     def test_send_notification_api_unauthorized(self):
         """Test API call without authentication"""
@@ -229,10 +591,304 @@ class SendNotificationAPITestCase(TestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_send_notification_api_unknown_type(self):
+        """Test that unknown types are rejected before anything is queued"""
+        response = self.client.post(
+            '/api/notifications/send/',
+            {
+                'notification_type': 'nope',
+                'context': {'title': 'Test'},
+                'recipient': 'user@example.com'
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('nope', response.data['error'])
+        self.assertFalse(Outbox.objects.exists())
+    
+    def test_send_notification_api_missing_template(self):
+        """Test that a scheduled send without a template is rejected right away"""
+        self.template.delete()
+        
+        response = self.client.post(
+            '/api/notifications/send/',
+            {
+                'notification_type': 'new survey',
+                'context': {'title': 'Test'},
+                'recipient': 'user@example.com',
+                'send_at': (timezone.now() + datetime.timedelta(hours=1)).isoformat()
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Template not found', response.data['error'])
+        self.assertFalse(ScheduledNotification.objects.exists())
+    
+    def test_send_notification_api_idempotency_key(self):
+        """Test repeated request with the same Idempotency-Key is queued once"""
+        payload = {
+            'notification_type': 'new survey',
+            'context': {'title': 'Test Survey'},
+            'recipient': 'user@example.com'
+        }
+        
+        first = self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-1')
+        second = self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-1')
+        
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.data['message_id'], second.data['message_id'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Outbox.objects.count(), 1)
+        
+        # key in the body works the same way
+        third = self.client.post('/api/notifications/send/', {**payload, 'idempotency_key': 'abc-1'}, format='json')
+        self.assertEqual(third.data['message_id'], first.data['message_id'])
+        self.assertEqual(Outbox.objects.count(), 1)
+    
+    def test_send_notification_api_idempotency_key_conflicts(self):
+        """Test key reuse with another payload and while in progress"""
+        payload = {
+            'notification_type': 'new survey',
+            'context': {'title': 'Test Survey'},
+            'recipient': 'user@example.com'
+        }
+        self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-2')
+        
+        response = self.client.post(
+            '/api/notifications/send/',
+            {**payload, 'recipient': 'other@example.com'},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY='abc-2'
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        
+        IdempotencyKey.objects.filter(key='abc-2').update(status=IdempotencyKey.STATUS_IN_PROGRESS)
+        response = self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-2')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Outbox.objects.count(), 1)
+    
+    def test_send_notification_api_idempotency_key_taken_over_after_lease(self):
+        """Test an in-progress key left by a killed process is taken over once its lease expires"""
+        payload = {
+            'notification_type': 'new survey',
+            'context': {'title': 'Test Survey'},
+            'recipient': 'user@example.com'
+        }
+        stale, created = idempotency.begin(self.user, 'abc-3', idempotency.request_hash(payload))
+        self.assertTrue(created)
+        
+        response = self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-3')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        IdempotencyKey.objects.filter(key='abc-3').update(locked_at=timezone.now() - datetime.timedelta(seconds=121))
+        response = self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-3')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Outbox.objects.count(), 1)
+        
+        # the original holder finishing late doesn't overwrite the stored response
+        idempotency.complete(stale, Response({'message_id': 0}, status=status.HTTP_202_ACCEPTED))
+        replay = self.client.post('/api/notifications/send/', payload, format='json', HTTP_IDEMPOTENCY_KEY='abc-3')
+        self.assertEqual(replay.data['message_id'], response.data['message_id'])
+    
+    def test_send_async_api_success(self):
+        """Test async send endpoint"""
+        response = self.client.post(
+            '/api/notifications/send-async/',
+            {
+                'notification_type': 'new survey',
+                'context': {'title': 'Test Survey'},
+                'recipient': 'user@example.com'
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_send_async_api_closes_smtp_connections_under_wsgi(self):
+        """Test that send-async/ doesn't leave pooled connections of its per-request event loop open"""
+        server = SMTPStubServer().start()
+        self.addCleanup(server.stop)
+        payload = {
+            'notification_type': 'new survey',
+            'context': {'title': 'Test Survey'},
+            'recipient': 'user@example.com'
+        }
+        
+        with override_settings(
+            EMAIL_BACKEND='apps.notifications.backends.smtp_pool.PooledEmailBackend',
+            EMAIL_HOST=server.host,
+            EMAIL_PORT=server.port,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_TLS=False,
+        ):
+            for _ in range(2):
+                response = self.client.post('/api/notifications/send-async/', payload, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        deadline_at = time.monotonic() + 5
+        while server._sockets and time.monotonic() < deadline_at:
+            time.sleep(0.01)
+        self.assertEqual(len(server.messages), 2)
+        self.assertEqual(server.connections, 2)
+        self.assertFalse(server._sockets)
+    
+    def test_send_async_api_sends_concurrently_under_asgi(self):
+        """Test that send-async/ requests through the ASGI handler and middleware overlap their SMTP waits"""
+        server = SMTPStubServer(delay=0.5).start()
+        self.addCleanup(server.stop)
+        token = RefreshToken.for_user(self.user).access_token
+        client = AsyncClient()
+        payload = {
+            'notification_type': 'new survey',
+            'context': {'title': 'Test Survey'},
+            'recipient': 'user@example.com'
+        }
+        
+        async def send_all():
+            try:
+                return await asyncio.gather(*[
+                    client.post(
+                        '/api/notifications/send-async/', payload, content_type='application/json',
+                        headers={'Authorization': f'Bearer {token}'}
+                    )
+                    for _ in range(6)
+                ])
+            finally:
+                await async_smtp.close_pools()
+        
+        with override_settings(
+            EMAIL_BACKEND='apps.notifications.backends.smtp_pool.PooledEmailBackend',
+            EMAIL_HOST=server.host,
+            EMAIL_PORT=server.port,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_TLS=False,
+            NOTIFICATION_RATE_LIMITS={},
+        ):
+            started = time.monotonic()
+            responses = async_to_sync(send_all)()
+            elapsed = time.monotonic() - started
+        
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_200_OK] * 6)
+        self.assertEqual(len(server.messages), 6)
+        # one at a time would take 6 x 0.5s
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(APILog.objects.filter(path='/api/notifications/send-async/', user=self.user).count(), 6)
+    
+    def test_send_async_api_rejects_queue_only_fields(self):
+        """Test that send-async/ refuses send_at and idempotency keys instead of ignoring them"""
+        payload = {
+            'notification_type': 'new survey',
+            'context': {'title': 'Test Survey'},
+            'recipient': 'user@example.com'
+        }
+        scheduled = self.client.post(
+            '/api/notifications/send-async/',
+            {**payload, 'send_at': (timezone.now() + datetime.timedelta(hours=1)).isoformat()},
+            format='json'
+        )
+        keyed = self.client.post('/api/notifications/send-async/', {**payload, 'idempotency_key': 'k'}, format='json')
+        header = self.client.post('/api/notifications/send-async/', payload, format='json', HTTP_IDEMPOTENCY_KEY='k')
+        
+        self.assertEqual(scheduled.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('send_at', scheduled.json())
+        self.assertEqual(keyed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('idempotency_key', keyed.json())
+        self.assertEqual(header.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_send_async_api_unauthorized(self):
+        """Test async send endpoint without authentication"""
+        self.client.force_authenticate(user=None)
+        
+        response = self.client.post(
+            '/api/notifications/send-async/',
+            {
+                'notification_type': 'new survey',
+                'context': {'title': 'Test'},
+                'recipient': 'user@example.com'
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_render_api(self):
+        """Test batch rendering without sending"""
+        response = self.client.post(
+            '/api/notifications/render/',
+            {
+                'notification_type': 'new survey',
+                'channel': 'email',
+                'contexts': [{'title': 'A'}, {'title': '<b>B</b>'}]
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'title': 'New Survey Available', 'html': '<p>Hello! New survey: A</p>'},
+            {'title': 'New Survey Available', 'html': '<p>Hello! New survey: &lt;b&gt;B&lt;/b&gt;</p>'},
+        ])
+        self.assertEqual(len(mail.outbox), 0)
+    
+    @override_settings(NOTIFICATION_RENDER_MAX_CONTEXTS=1)
+    def test_render_api_too_many_contexts(self):
+        """Test render API rejects lists over the configured size"""
+        response = self.client.post(
+            '/api/notifications/render/',
+            {'notification_type': 'new survey', 'contexts': [{'title': 'A'}, {'title': 'B'}]},
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_send_bulk_api_success(self):
+        """Test bulk send API call"""
+        response = self.client.post(
+            '/api/notifications/send-bulk/',
+            {
+                'notification_type': 'new survey',
+                'recipients': [
+                    {'recipient': 'a@example.com', 'context': {'title': 'A'}},
+                    {'recipient': 'b@example.com', 'context': {'title': 'B'}},
+                ]
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sent'], 2)
+        self.assertEqual(len(mail.outbox), 2)
+    
+    @override_settings(NOTIFICATION_BULK_MAX_BATCH_SIZE=1)
+    def test_send_bulk_api_batch_too_large(self):
+        """Test bulk send API rejects batches over the configured size"""
+        response = self.client.post(
+            '/api/notifications/send-bulk/',
+            {
+                'notification_type': 'new survey',
+                'recipients': [
+                    {'recipient': 'a@example.com', 'context': {'title': 'A'}},
+                    {'recipient': 'b@example.com', 'context': {'title': 'B'}},
+                ]
+            },
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(mail.outbox), 0)
 
 
-class NotificationTemplateValidationTestCase(TestCase):
-    """Tests for template validation"""
+class OutboxWorkerTestCase(TestCase):
+    """Tests for outbox delivery worker"""
     
     def setUp(self):
         """Set up test data"""
@@ -240,43 +896,541 @@ class NotificationTemplateValidationTestCase(TestCase):
             title='email',
             allowed_tags=['p', 'b', 'i', 'a', 'br']
         )
-        
         self.variable = Variable.objects.create(title='title')
-        
         self.notification_type = NotificationType.objects.create(
             title='new survey',
             is_custom=False
         )
         self.notification_type.channels.add(self.channel)
         self.notification_type.variables.add(self.variable)
-    
-    def test_template_with_allowed_tags(self):
-        """Test template with allowed HTML tags"""
-        template = NotificationTemplate(
+        NotificationTemplate.objects.create(
             notification_type=self.notification_type,
             channel=self.channel,
-            html='<p>Hello <b>{{ title }}</b>!</p>'
+            title='New Survey Available',
+            html='<p>Hello! New survey: {{ title }}</p>'
         )
-        
-        # Should not raise validation error
-        try:
-            template.full_clean()
-            template.save()
-            self.assertTrue(True)
-        except Exception:
-            self.fail("Template with allowed tags should be valid")
     
-    def test_template_with_forbidden_tags(self):
-        """Test template with forbidden HTML tags"""
-        template = NotificationTemplate(
-            notification_type=self.notification_type,
-            channel=self.channel,
-            html='<div>Hello <script>alert("xss")</script></div>'
-        )
+    def test_claimed_rows_are_not_claimed_twice(self):
+        """Test that a second worker doesn't get rows claimed by the first"""
+        for i in range(3):
+            enqueue('new survey', {'title': 'Test'}, f'user{i}@example.com')
         
-        with self.assertRaises(Exception):
-            template.full_clean()
-            template.save()
+        first = OutboxWorker(worker_id='first', batch_size=2).claim()
+        second = OutboxWorker(worker_id='second', batch_size=10).claim()
+        
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({m.pk for m in first} & {m.pk for m in second})
+    
+    def test_failed_delivery_is_retried(self):
+        """Test that transient errors put the row back into the queue"""
+        message = enqueue('new survey', {'title': 'Test'}, 'user@example.com')
+        
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1', EMAIL_PORT=1):
+            OutboxWorker().run_once()
+        
+        message.refresh_from_db()
+        self.assertEqual(message.status, Outbox.STATUS_PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertIsNotNone(message.last_error)
+        self.assertGreater(message.available_at, message.created_at)
+    
+    def test_unknown_type_fails_permanently(self):
+        """Test that unresolvable notifications are not retried"""
+        message = enqueue('invalid_type', {}, 'user@example.com')
+        
+        OutboxWorker().run_once()
+        
+        message.refresh_from_db()
+        self.assertEqual(message.status, Outbox.STATUS_FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_digest_window_coalesces_notifications(self):
+        """Test that notifications within the digest window go out as one message per recipient"""
+        self.notification_type.digest_window_seconds = 60
+        self.notification_type.save()
+        
+        messages = [enqueue('new survey', {'title': f'Survey {i}'}, 'user@example.com') for i in range(3)]
+        enqueue('new survey', {'title': 'Other'}, 'other@example.com')
+        
+        self.assertEqual(OutboxWorker().run_once(), 0)
+        self.assertEqual(len({m.available_at for m in messages}), 1)
+        
+        # window closes
+        Outbox.objects.update(available_at=timezone.now())
+        self.assertEqual(OutboxWorker(batch_size=1).run_once(), 3)
+        OutboxWorker().run_once()
+        
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(m for m in mail.outbox if m.to == ['user@example.com'])
+        self.assertEqual(digest.subject, 'New Survey Available (+2)')
+        for i in range(3):
+            self.assertIn(f'Survey {i}', digest.alternatives[0][0])
+        self.assertEqual(Outbox.objects.filter(status=Outbox.STATUS_SENT).count(), 4)
+    
+    def test_digest_window_is_opened_once_per_recipient(self):
+        """Test that enqueues join the window row of their key and reopen it only once it has closed"""
+        self.notification_type.digest_window_seconds = 60
+        self.notification_type.save()
+        
+        first = enqueue('new survey', {'title': 'Survey 1'}, 'user@example.com')
+        # a retried row of the window, pending past its end, doesn't move the window
+        Outbox.objects.filter(pk=first.pk).update(available_at=first.available_at + datetime.timedelta(minutes=5))
+        second = enqueue('new survey', {'title': 'Survey 2'}, 'user@example.com')
+        self.assertEqual(second.available_at, first.available_at)
+        
+        DigestWindow.objects.update(closes_at=timezone.now() - datetime.timedelta(seconds=1))
+        third = enqueue('new survey', {'title': 'Survey 3'}, 'user@example.com')
+        
+        self.assertGreater(third.available_at, first.available_at)
+        window = DigestWindow.objects.get()
+        self.assertEqual(window.closes_at, third.available_at)
+        self.assertEqual(window.digest_key, third.digest_key)
+    
+    def test_transactional_lane_is_served_first(self):
+        """Test that transactional rows are claimed before older bulk rows and by reserved workers only"""
+        self.notification_type.priority = NotificationType.PRIORITY_BULK
+        self.notification_type.save()
+        confirm_type = NotificationType.objects.create(
+            title='confirm email',
+            is_custom=False,
+            priority=NotificationType.PRIORITY_TRANSACTIONAL
+        )
+        confirm_type.channels.add(self.channel)
+        confirm_type.variables.add(self.variable)
+        NotificationTemplate.objects.create(
+            notification_type=confirm_type,
+            channel=self.channel,
+            title='Confirm',
+            html='<p>Confirm {{ title }}</p>'
+        )
+        
+        for i in range(5):
+            enqueue('new survey', {'title': 'Survey'}, f'user{i}@example.com')
+        confirm = enqueue('confirm email', {'title': 'token'}, 'new@example.com')
+        self.assertEqual(confirm.priority, NotificationType.PRIORITY_TRANSACTIONAL)
+        
+        stats = lane_stats()
+        self.assertEqual(stats['bulk']['pending'], 5)
+        self.assertEqual(stats['transactional']['pending'], 1)
+        
+        claimed = OutboxWorker(batch_size=2).claim()
+        self.assertEqual(claimed[0].pk, confirm.pk)
+        
+        Outbox.objects.update(status=Outbox.STATUS_PENDING, claimed_by=None, claimed_at=None)
+        reserved = OutboxWorker(lanes=['transactional'], batch_size=10)
+        self.assertEqual(reserved.run_once(), 1)
+        self.assertEqual(reserved.run_once(), 0)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        self.assertEqual(lane_stats()['transactional']['sent_recent'], 1)
+
+
+class NotificationSchedulerTestCase(TestCase):
+    """Tests for scheduled sends"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.now = timezone.now()
+        channel = Channel.objects.create(title='email', allowed_tags=['p'])
+        notification_type = NotificationType.objects.create(title='new survey', is_custom=False)
+        notification_type.channels.add(channel)
+        notification_type.variables.add(Variable.objects.create(title='title'))
+        NotificationTemplate.objects.create(notification_type=notification_type, channel=channel, html='<p>{{ title }}</p>')
+    
+    def schedule(self, recipient, delay):
+        return ScheduledNotification.objects.create(
+            notification_type='new survey',
+            context={'title': 'Reminder'},
+            recipient=recipient,
+            send_at=self.now + datetime.timedelta(seconds=delay)
+        )
+    
+    def test_send_at_is_scheduled_and_released_when_due(self):
+        """Test that send_at creates a scheduled row that reaches the outbox under the same message_id"""
+        send_at = self.now + datetime.timedelta(hours=24)
+        response = self.client.post(
+            '/api/notifications/send/',
+            {
+                'notification_type': 'new survey',
+                'context': {'title': 'Reminder'},
+                'recipient': 'user@example.com',
+                'send_at': send_at.isoformat()
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        message_id = response.data['message_id']
+        self.assertEqual(Outbox.objects.count(), 0)
+        
+        response = self.client.get(f'/api/notifications/outbox/{message_id}/')
+        self.assertEqual(response.data['status'], ScheduledNotification.STATUS_SCHEDULED)
+        
+        scheduler = NotificationScheduler(window=60, refresh=10)
+        self.assertEqual(scheduler.run_once(self.now), 0)
+        self.assertEqual(scheduler.run_once(send_at), 1)
+        self.assertEqual(str(Outbox.objects.get().message_id), message_id)
+    
+    def test_only_next_window_is_loaded(self):
+        """Test that rows beyond the window are not loaded and due rows are released in order"""
+        self.schedule('late@example.com', 3600)
+        for delay in (30, 10, 20):
+            self.schedule(f'user{delay}@example.com', delay)
+        
+        scheduler = NotificationScheduler(window=60, refresh=600)
+        scheduler.load(self.now)
+        self.assertEqual(len(scheduler._heap), 3)
+        self.assertEqual(scheduler.seconds_until_next(self.now), 10)
+        
+        self.assertEqual(scheduler.run_once(self.now + datetime.timedelta(seconds=25)), 2)
+        self.assertEqual(
+            sorted(Outbox.objects.values_list('recipient', flat=True)),
+            ['user10@example.com', 'user20@example.com']
+        )
+    
+    def test_row_is_released_once_by_concurrent_schedulers(self):
+        """Test that two schedulers holding the same due row enqueue it once"""
+        self.schedule('user@example.com', 5)
+        first = NotificationScheduler(scheduler_id='first', window=60)
+        second = NotificationScheduler(scheduler_id='second', window=60)
+        first.load(self.now)
+        second.load(self.now)
+        
+        due_at = self.now + datetime.timedelta(seconds=5)
+        self.assertEqual(first.run_once(due_at) + second.run_once(due_at), 1)
+        self.assertEqual(Outbox.objects.count(), 1)
+
+
+class PooledEmailBackendTestCase(SimpleTestCase):
+    """Tests for pooled SMTP email backend against a local SMTP stub"""
+    
+    def setUp(self):
+        self.server = SMTPStubServer().start()
+        self.addCleanup(self.server.stop)
+        self.addCleanup(close_pools)
+        self.backend_kwargs = {
+            'host': self.server.host, 'port': self.server.port, 'username': '', 'password': '',
+            'use_tls': False, 'use_ssl': False, 'timeout': 5, 'ssl_keyfile': None, 'ssl_certfile': None,
+        }
+    
+    def test_connection_is_reused_across_sends(self):
+        """Test that consecutive send_mail calls share one SMTP connection"""
+        with override_settings(
+            EMAIL_BACKEND='apps.notifications.backends.smtp_pool.PooledEmailBackend',
+            EMAIL_HOST=self.server.host,
+            EMAIL_PORT=self.server.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        ):
+            for i in range(3):
+                send_mail('Subject', 'Body', 'from@example.com', [f'user{i}@example.com'])
+        
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+    
+    def test_stale_connection_is_recycled(self):
+        """Test that a connection closed by the server fails health check and is replaced"""
+        pool = SMTPConnectionPool(size=1, health_check_after=0, **self.backend_kwargs)
+        conn = pool.acquire()
+        pool.release(conn)
+        self.server.drop_connections()
+        
+        conn = pool.acquire()
+        conn.backend.send_messages([mail.EmailMessage('Subject', 'Body', 'from@example.com', ['to@example.com'])])
+        pool.release(conn)
+        pool.close_all()
+        
+        self.assertEqual(pool.stats()['created'], 2)
+        self.assertEqual(len(self.server.messages), 1)
+    
+    def test_idle_lifetime_is_capped(self):
+        """Test that connections idle longer than max_idle are not reused"""
+        pool = SMTPConnectionPool(size=1, max_idle=0, **self.backend_kwargs)
+        pool.release(pool.acquire())
+        pool.release(pool.acquire())
+        pool.close_all()
+        
+        self.assertEqual(pool.stats()['created'], 2)
+        self.assertEqual(pool.stats()['reused'], 0)
+    
+    def test_async_send_reuses_connection(self):
+        """Test that async SMTP path delivers over one pooled connection"""
+        async def send_all():
+            for i in range(3):
+                await async_smtp.send_message(
+                    mail.EmailMessage('Subject', 'Body', 'from@example.com', [f'user{i}@example.com'])
+                )
+            await async_smtp.close_pools()
+        
+        with override_settings(
+            EMAIL_BACKEND='apps.notifications.backends.smtp_pool.PooledEmailBackend',
+            EMAIL_HOST=self.server.host,
+            EMAIL_PORT=self.server.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+        ):
+            asyncio.run(send_all())
+        
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 1)
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+class RateLimitTestCase(SimpleTestCase):
+    """Tests for per-channel token buckets and adaptive rate control"""
+    
+    def setUp(self):
+        rate_limit.reset()
+        self.addCleanup(rate_limit.reset)
+    
+    def test_token_bucket_burst_and_refill(self):
+        """Test that bucket allows a burst, then one token per 1/rate seconds"""
+        clock = FakeClock()
+        bucket = rate_limit.TokenBucket(rate=10, burst=2, clock=clock)
+        
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1)
+        
+        clock.now += 0.1
+        self.assertEqual(bucket.reserve(), 0)
+    
+    def test_adaptive_bucket_backs_off_and_ramps_up(self):
+        """Test multiplicative decrease on throttling and additive increase on success"""
+        clock = FakeClock()
+        bucket = rate_limit.AdaptiveTokenBucket(rate=10, min_rate=2, max_rate=12, cooldown=1, clock=clock)
+        
+        bucket.throttled()
+        bucket.throttled()  # same burst of refusals, within cooldown
+        self.assertEqual(bucket.rate, 5)
+        self.assertEqual(bucket.snapshot()['throttle_events'], 2)
+        
+        for _ in range(3):
+            clock.now += 1
+            bucket.throttled()
+        self.assertEqual(bucket.rate, 2)
+        
+        for _ in range(200):
+            bucket.succeeded()
+        self.assertEqual(bucket.rate, 12)
+    
+    def test_is_throttle_error(self):
+        """Test that only 4xx replies count as throttling"""
+        self.assertTrue(rate_limit.is_throttle_error(smtplib.SMTPDataError(451, b'Try again later')))
+        self.assertTrue(rate_limit.is_throttle_error(
+            smtplib.SMTPRecipientsRefused({'a@example.com': (450, b'Mailbox busy')})
+        ))
+        self.assertFalse(rate_limit.is_throttle_error(
+            smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')})
+        ))
+        self.assertFalse(rate_limit.is_throttle_error(ValueError('Template not found')))
+    
+    def test_smtp_throttle_lowers_channel_rate(self):
+        """Test that a 451 reply from the SMTP server lowers the email channel rate"""
+        replies = iter(['451 4.7.1 Slow down'])
+        
+        with SMTPStubServer(reply=lambda command, argument: next(replies, None) if command == 'DATA' else None) as server:
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST=server.host,
+                EMAIL_PORT=server.port,
+                EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER='',
+                EMAIL_HOST_PASSWORD='',
+                NOTIFICATION_RATE_LIMITS={'email': {'adaptive': True, 'rate': 40, 'max_rate': 40}},
+            ):
+                with self.assertRaises(smtplib.SMTPDataError):
+                    rate_limit.call('email', send_mail, 'Subject', 'Body', 'from@example.com', ['to@example.com'])
+                rate_limit.call('email', send_mail, 'Subject', 'Body', 'from@example.com', ['to@example.com'])
+                
+                stats = rate_limit.snapshot()['email']
+        
+        self.assertEqual(stats['throttle_events'], 1)
+        self.assertLess(stats['rate'], 40)
+        self.assertGreater(stats['rate'], 20)
+        self.assertEqual(len(server.messages), 1)
+    
+    def test_unconfigured_channel_is_not_limited(self):
+        """Test that channels missing from NOTIFICATION_RATE_LIMITS are passed through"""
+        with override_settings(NOTIFICATION_RATE_LIMITS={}):
+            self.assertIsNone(rate_limit.get_limiter('email'))
+            self.assertEqual(rate_limit.call('email', lambda: 'sent'), 'sent')
+
+
+class CircuitBreakerTestCase(SimpleTestCase):
+    """Tests for per-channel circuit breakers and send deadlines"""
+    
+    def setUp(self):
+        circuit_breaker.reset()
+        rate_limit.reset()
+        self.addCleanup(circuit_breaker.reset)
+        self.addCleanup(rate_limit.reset)
+    
+    def test_breaker_opens_and_recovers(self):
+        """Test closed -> open -> half-open -> closed transitions"""
+        clock = FakeClock()
+        breaker = circuit_breaker.CircuitBreaker('email', failure_threshold=2, recovery_timeout=10, clock=clock)
+        
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record(ConnectionRefusedError())
+        self.assertEqual(breaker.state, breaker.OPEN)
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            breaker.before_call()
+        
+        clock.now += 10
+        breaker.before_call()
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        with self.assertRaises(circuit_breaker.CircuitOpenError):
+            breaker.before_call()  # only one probe at a time
+        breaker.record()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+    
+    def test_failed_probe_reopens(self):
+        """Test that a failing half-open probe opens the circuit for another recovery timeout"""
+        clock = FakeClock()
+        breaker = circuit_breaker.CircuitBreaker('email', failure_threshold=1, recovery_timeout=10, clock=clock)
+        breaker.before_call()
+        breaker.record(smtplib.SMTPServerDisconnected())
+        
+        clock.now += 10
+        breaker.before_call()
+        breaker.record(TimeoutError())
+        
+        self.assertEqual(breaker.state, breaker.OPEN)
+        with self.assertRaises(circuit_breaker.CircuitOpenError) as raised:
+            breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 10)
+    
+    def test_message_errors_do_not_trip_breaker(self):
+        """Test that throttling, rejected recipients and template errors are not backend failures"""
+        breaker = circuit_breaker.CircuitBreaker('email', failure_threshold=1)
+        for error in (
+            smtplib.SMTPDataError(451, b'Try again later'),
+            smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')}),
+            ValueError('Template not found'),
+        ):
+            breaker.before_call()
+            breaker.record(error)
+        
+        self.assertEqual(breaker.state, breaker.CLOSED)
+    
+    def test_unreachable_backend_fails_fast(self):
+        """Test that sends to a refused SMTP port open the breaker and later calls skip the backend"""
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=1,
+            NOTIFICATION_RATE_LIMITS={},
+            NOTIFICATION_BREAKER_FAILURE_THRESHOLD=2,
+        ):
+            sender = NotificationSender()
+            for _ in range(2):
+                with self.assertRaises(OSError):
+                    sender.dispatch('email', 'to@example.com', 'Subject', '<p>Body</p>')
+            with self.assertRaises(circuit_breaker.CircuitOpenError):
+                sender.dispatch('email', 'to@example.com', 'Subject', '<p>Body</p>')
+            
+            stats = circuit_breaker.snapshot()['email']
+        
+        self.assertEqual(stats['state'], 'open')
+        self.assertEqual(stats['rejected_calls'], 1)
+    
+    def test_deadline_is_enforced(self):
+        """Test that check() raises once the scope's time budget is used up"""
+        with deadline.scope(0.01) as current:
+            deadline.check('lookup')
+            time.sleep(0.02)
+            with self.assertRaises(deadline.DeadlineExceeded):
+                deadline.check('render')
+            with deadline.scope(60):
+                # nested scope can't extend the outer budget
+                self.assertLessEqual(deadline.remaining(), 0)
+        
+        self.assertIsNotNone(current)
+        self.assertIsNone(deadline.current())
+    
+    def test_deadline_expiry_does_not_trip_breaker(self):
+        """Test that sends cut short by the deadline leave the circuit closed"""
+        with override_settings(
+            EMAIL_BACKEND='apps.notifications.backends.smtp_pool.PooledEmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=1,
+            NOTIFICATION_RATE_LIMITS={},
+            NOTIFICATION_BREAKER_FAILURE_THRESHOLD=1,
+        ):
+            sender = NotificationSender()
+            for _ in range(2):
+                with deadline.scope(0.01):
+                    time.sleep(0.02)
+                    with self.assertRaises(deadline.DeadlineExceeded):
+                        sender.dispatch('email', 'to@example.com', 'Subject', '<p>Body</p>')
+            
+            stats = circuit_breaker.snapshot()['email']
+        
+        self.assertEqual(stats['state'], 'closed')
+        self.assertEqual(stats['rejected_calls'], 0)
+
+
+class NotificationTemplateValidationTestCase(TestCase):
+    """Tests for template validation"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.channel = Channel.objects.create(
+            title='email',
+            allowed_tags=['p', 'b', 'i', 'a', 'br']
+        )
+        
+        self.variable = Variable.objects.create(title='title')
+        
+        self.notification_type = NotificationType.objects.create(
+            title='new survey',
+            is_custom=False
+        )
+        self.notification_type.channels.add(self.channel)
+        self.notification_type.variables.add(self.variable)
+    
+    def test_template_with_allowed_tags(self):
+        """Test template with allowed HTML tags"""
+        template = NotificationTemplate(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            html='<p>Hello <b>{{ title }}</b>!</p>'
+        )
+        
+        # Should not raise validation error
+        try:
+            template.full_clean()
+            template.save()
+            self.assertTrue(True)
+        except Exception:
+            self.fail("Template with allowed tags should be valid")
+    
+    def test_template_with_forbidden_tags(self):
+        """Test template with forbidden HTML tags"""
+        template = NotificationTemplate(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            html='<div>Hello <script>alert("xss")</script></div>'
+        )
+        
+        with self.assertRaises(Exception):
+            template.full_clean()
+            template.save()
     
     def test_template_missing_required_variable(self):
         """Test template missing required variable"""
@@ -301,3 +1455,791 @@ class NotificationTemplateValidationTestCase(TestCase):
         with self.assertRaises(Exception):
             template.full_clean()
             template.save()
+    
+    def test_template_metadata_is_stored_on_save(self):
+        """Test that content hash, variables, simple flag and size are saved with the template"""
+        simple = NotificationTemplate.objects.create(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            title='New survey',
+            html='<p>Hello! New survey: {{ title }}</p>'
+        )
+        simple.refresh_from_db()
+        
+        self.assertEqual(simple.variables, ['title'])
+        self.assertTrue(simple.is_simple)
+        self.assertEqual(simple.size_bytes, len(simple.html.encode()))
+        self.assertEqual(len(simple.content_hash), 64)
+        
+        simple.html = '<p>{{ title|upper }}</p>'
+        simple.save()
+        self.assertFalse(simple.is_simple)
+        self.assertEqual(simple.variables, ['title'])
+    
+    def test_unchanged_template_is_not_parsed_again(self):
+        """Test that saving without touching title/html reuses stored metadata"""
+        template = NotificationTemplate.objects.create(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            html='<p>{{ title }}</p>'
+        )
+        
+        template.is_active = False
+        self.assertFalse(template.refresh_metadata())
+        template.save()
+        
+        template.html = '<p><b>{{ title }}</b></p>'
+        self.assertTrue(template.refresh_metadata())
+    
+    def test_backfill_template_metadata_command(self):
+        """Test that backfill command fills metadata of rows saved before it existed"""
+        template = NotificationTemplate.objects.create(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            html='<p>{{ title }}</p>'
+        )
+        NotificationTemplate.objects.filter(pk=template.pk).update(
+            content_hash='', variables=None, is_simple=False, size_bytes=0
+        )
+        
+        call_command('backfill_template_metadata', stdout=StringIO())
+        
+        template.refresh_from_db()
+        self.assertEqual(template.variables, ['title'])
+        self.assertTrue(template.is_simple)
+        self.assertEqual(template.size_bytes, len('<p>{{ title }}</p>'))
+    
+    def test_repeated_validation_is_cached(self):
+        """Test that re-saving an unchanged template reuses the cached validation result"""
+        validation_cache.clear()
+        template = NotificationTemplate.objects.create(
+            notification_type=self.notification_type,
+            channel=self.channel,
+            html='<p>{{ title }}</p>'
+        )
+        
+        template.is_active = False
+        template.save()
+        
+        stats = validation_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+    
+    def test_cached_validation_error_is_raised_again(self):
+        """Test that a cached failure raises the same error"""
+        validation_cache.clear()
+        
+        for _ in range(2):
+            with self.assertRaises(ValidationError) as cm:
+                validate_template('<div>{{ title }}</div>', self.channel, ['title'])
+            self.assertEqual(
+                cm.exception.message_dict, {'html': ['Template contains forbidden HTML tags: <div> at line 1, column 1']}
+            )
+        
+        self.assertEqual(validation_cache.stats()['hits'], 1)
+    
+    def test_changed_inputs_are_validated_again(self):
+        """Test that channel tags and type variables are part of the cache key"""
+        html = '<p><b>{{ title }}</b></p>'
+        validate_template(html, self.channel, ['title'])
+        
+        self.channel.allowed_tags = ['p']
+        with self.assertRaises(ValidationError):
+            validate_template(html, self.channel, ['title'])
+        
+        self.channel.allowed_tags = ['p', 'b']
+        with self.assertRaises(ValidationError):
+            validate_template(html, self.channel, ['title', 'username'])
+
+
+class NotificationTemplateImportTestCase(TestCase):
+    """Tests for bulk template import endpoint"""
+    
+    url = '/api/notifications/notification-templates/bulk/'
+    
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.email = Channel.objects.create(title='email', allowed_tags=['p', 'b'])
+        self.telegram = Channel.objects.create(title='telegram', allowed_tags=[])
+        self.variable = Variable.objects.create(title='title')
+        self.notification_type = NotificationType.objects.create(title='new survey', is_custom=False)
+        self.notification_type.channels.add(self.email, self.telegram)
+        self.notification_type.variables.add(self.variable)
+        self.custom_type = NotificationType.objects.create(title='custom', is_custom=True)
+        self.custom_type.channels.add(self.email)
+    
+    def test_import_creates_templates(self):
+        """Test that valid templates are created with their metadata"""
+        response = self.client.post(self.url, {'templates': [
+            {'notification_type': 'new survey', 'channel': 'email', 'title': 'Hi', 'html': '<p>{{ title }}</p>'},
+            {'notification_type': 'new survey', 'channel': 'telegram', 'html': '{{ title }}'},
+            {'notification_type': 'custom', 'channel': 'email', 'name': 'promo', 'html': '<p><b>Sale</b></p>'},
+        ]}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        template = NotificationTemplate.objects.get(pk=response.data['ids'][0])
+        self.assertEqual(template.variables, ['title'])
+        self.assertTrue(template.is_simple)
+        self.assertEqual(NotificationTemplate.objects.count(), 3)
+    
+    def test_invalid_items_are_reported_and_nothing_is_created(self):
+        """Test that errors are returned per item and the batch is rejected as a whole"""
+        NotificationTemplate.objects.create(notification_type=self.notification_type, channel=self.email, html='<p>{{ title }}</p>')
+        
+        response = self.client.post(self.url, {'templates': [
+            {'notification_type': 'custom', 'channel': 'email', 'name': 'ok', 'html': '<p>Fine</p>'},
+            {'notification_type': 'unknown', 'channel': 'email', 'html': '<p>x</p>'},
+            {'notification_type': 'new survey', 'channel': 'email', 'html': '<p>{{ title }}</p>'},
+            {'notification_type': 'new survey', 'channel': 'telegram', 'html': '<div>{{ title }}</div>'},
+            {'notification_type': 'custom', 'channel': 'email', 'name': 'ok', 'html': '<p>Again</p>'},
+            {'notification_type': 'custom', 'channel': 'email', 'html': '<p>No name</p>'},
+        ]}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['templates']
+        self.assertEqual(errors[0], {})
+        self.assertEqual(errors[1], {'notification_type': ["Notification type 'unknown' not found"]})
+        self.assertEqual(errors[2], {
+            'channel': ['Template "new survey" for type "new survey" and channel "email" already exists']
+        })
+        self.assertIn('forbidden HTML tags', errors[3]['html'][0])
+        self.assertIn('repeated in this import (item 0)', errors[4]['name'][0])
+        self.assertIn('name', errors[5])
+        self.assertEqual(NotificationTemplate.objects.count(), 1)
+    
+    def test_import_requires_superuser(self):
+        """Test that regular users can't import templates"""
+        self.client.force_authenticate(user=User.objects.create_user('user', 'user@example.com', 'password'))
+        
+        response = self.client.post(self.url, {'templates': [
+            {'notification_type': 'custom', 'channel': 'email', 'name': 'promo', 'html': '<p>x</p>'},
+        ]}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TemplateUniquenessConstraintTestCase(TestCase):
+    """Tests for database constraints on template uniqueness"""
+    
+    def setUp(self):
+        self.email = Channel.objects.create(title='email', allowed_tags=['p'])
+        self.notification_type = NotificationType.objects.create(title='new survey', is_custom=False)
+        self.notification_type.channels.add(self.email)
+        self.custom_type = NotificationType.objects.create(title='custom', is_custom=True)
+        self.custom_type.channels.add(self.email)
+        self.template = NotificationTemplate.objects.create(
+            notification_type=self.notification_type, channel=self.email, html='<p>Hi</p>'
+        )
+    
+    def test_duplicate_save_raises_validation_error(self):
+        """Test that a duplicate caught by the constraint keeps the validation message"""
+        duplicate = NotificationTemplate(notification_type=self.notification_type, channel=self.email, html='<p>Again</p>')
+        
+        with self.assertRaises(ValidationError) as raised:
+            duplicate.save()
+        
+        self.assertEqual(raised.exception.message_dict, {
+            'channel': ['Template "new survey" for type "new survey" and channel "email" already exists']
+        })
+        self.assertIsNone(duplicate.pk)
+    
+    def test_save_does_not_query_for_duplicates(self):
+        """Test that saving a unique template leaves the check to the database"""
+        template = NotificationTemplate(notification_type=self.custom_type, channel=self.email, name='promo', html='<p>x</p>')
+        
+        with CaptureQueriesContext(connection) as captured:
+            template.save()
+        
+        lookups = [q['sql'] for q in captured.captured_queries if q['sql'].startswith('SELECT 1 AS "a" FROM "notifications_notificationtemplate"')]
+        self.assertEqual(lookups, [])
+        self.assertTrue(template.is_custom)
+    
+    def test_bulk_create_cannot_bypass_uniqueness(self):
+        """Test that rows inserted without save() are still unique"""
+        duplicate = NotificationTemplate(notification_type=self.notification_type, channel=self.email, html='<p>Again</p>')
+        
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            NotificationTemplate.objects.bulk_create([duplicate])
+    
+    def test_custom_templates_are_unique_per_name(self):
+        """Test that custom types can have several templates per channel with distinct names"""
+        NotificationTemplate.objects.create(notification_type=self.custom_type, channel=self.email, name='a', html='<p>a</p>')
+        NotificationTemplate.objects.create(notification_type=self.custom_type, channel=self.email, name='b', html='<p>b</p>')
+        
+        with self.assertRaises(ValidationError) as raised:
+            NotificationTemplate.objects.create(notification_type=self.custom_type, channel=self.email, name='a', html='<p>c</p>')
+        
+        self.assertIn('name', raised.exception.message_dict)
+    
+    def test_type_is_custom_is_copied_to_templates(self):
+        """Test that changing NotificationType.is_custom updates its templates"""
+        self.notification_type.is_custom = True
+        self.notification_type.save()
+        
+        self.template.refresh_from_db()
+        self.assertTrue(self.template.is_custom)
+        
+        self.notification_type.is_custom = False
+        self.notification_type.save()
+        
+        self.template.refresh_from_db()
+        self.assertFalse(self.template.is_custom)
+    
+    def test_type_with_several_templates_per_channel_stays_custom(self):
+        """Test that a custom type with several templates for a channel can't become regular"""
+        for name in ('a', 'b'):
+            NotificationTemplate.objects.create(notification_type=self.custom_type, channel=self.email, name=name, html='<p>x</p>')
+        self.custom_type.is_custom = False
+        
+        with self.assertRaises(ValidationError) as raised:
+            self.custom_type.save()
+        
+        self.assertIn('is_custom', raised.exception.message_dict)
+        self.assertTrue(NotificationType.objects.get(pk=self.custom_type.pk).is_custom)
+    
+    def test_api_duplicate_returns_400(self):
+        """Test that the API reports a duplicate as a validation error"""
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        
+        response = client.post('/api/notifications/notification-templates/', {
+            'notification_type': 'new survey', 'channel': 'email', 'html': '<p>Again</p>'
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('already exists', response.data['channel'][0])
+    
+    def test_api_is_custom_switch_with_several_templates_returns_400(self):
+        """Test that the API rejects making a type with several templates per channel regular"""
+        for name in ('a', 'b'):
+            NotificationTemplate.objects.create(notification_type=self.custom_type, channel=self.email, name=name, html='<p>x</p>')
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        
+        response = client.patch(
+            f'/api/notifications/notification-types/{self.custom_type.pk}/', {'is_custom': False}, format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('is_custom', response.data)
+        self.assertTrue(NotificationType.objects.get(pk=self.custom_type.pk).is_custom)
+    
+    def test_migration_refuses_existing_duplicates(self):
+        """Test that the constraint migration lists duplicates instead of failing on the constraint"""
+        migration = importlib.import_module('apps.notifications.migrations.0009_template_uniqueness_constraints')
+        with mock.patch.object(NotificationTemplate.objects, 'filter') as filter_:
+            filter_.return_value.values.return_value.annotate.return_value.filter.return_value.order_by.return_value = [
+                {'notification_type__title': 'new survey', 'channel__title': 'email', 'count': 2},
+            ]
+            with self.assertRaises(RuntimeError) as raised:
+                migration.find_duplicates(django_apps, None)
+        
+        self.assertIn('new survey', str(raised.exception))
+    
+    def test_migration_passes_without_duplicates(self):
+        """Test that the constraint migration check passes on unique templates"""
+        migration = importlib.import_module('apps.notifications.migrations.0009_template_uniqueness_constraints')
+        
+        migration.find_duplicates(django_apps, None)
+
+
+class TemplateRevalidationTestCase(TestCase):
+    """Tests for revalidation of templates after channel and type changes"""
+    
+    def setUp(self):
+        self.email = Channel.objects.create(title='email', allowed_tags=['p', 'b'])
+        self.title = Variable.objects.create(title='title')
+        self.notification_type = NotificationType.objects.create(title='new survey', is_custom=False)
+        self.notification_type.channels.add(self.email)
+        self.notification_type.variables.add(self.title)
+        self.custom_type = NotificationType.objects.create(title='custom', is_custom=True)
+        self.custom_type.channels.add(self.email)
+        self.bold = NotificationTemplate.objects.create(
+            notification_type=self.notification_type, channel=self.email, html='<p><b>{{ title }}</b></p>'
+        )
+        self.plain = NotificationTemplate.objects.create(
+            notification_type=self.custom_type, channel=self.email, name='plain', html='<p>Hi</p>'
+        )
+    
+    def flagged(self):
+        return set(NotificationTemplate.objects.filter(needs_revalidation=True).values_list('pk', flat=True))
+    
+    def test_removed_tag_flags_templates_using_it(self):
+        """Test that only templates mentioning a removed tag are revalidated and flagged invalid"""
+        channel = Channel.objects.get(pk=self.email.pk)
+        channel.allowed_tags = ['p']
+        channel.save()
+        
+        self.assertEqual(self.flagged(), {self.bold.pk})
+        self.assertEqual(TemplateRevalidator(workers=1).run_once(), 1)
+        
+        self.bold.refresh_from_db()
+        self.assertFalse(self.bold.is_valid)
+        self.assertIn('forbidden HTML tags: <b>', self.bold.validation_error)
+        self.assertEqual(self.flagged(), set())
+    
+    def test_added_tag_flags_invalid_templates(self):
+        """Test that allowing a tag only rechecks templates that are invalid"""
+        NotificationTemplate.objects.filter(pk=self.plain.pk).update(is_valid=False, validation_error='old error')
+        channel = Channel.objects.get(pk=self.email.pk)
+        channel.allowed_tags = ['p', 'b', 'i']
+        channel.save()
+        
+        self.assertEqual(self.flagged(), {self.plain.pk})
+        TemplateRevalidator(workers=1).run_once()
+        
+        self.plain.refresh_from_db()
+        self.assertTrue(self.plain.is_valid)
+        self.assertEqual(self.plain.validation_error, '')
+    
+    def test_type_variables_change_flags_regular_templates(self):
+        """Test that adding a required variable invalidates templates of the type"""
+        self.notification_type.variables.add(Variable.objects.create(title='username'))
+        
+        self.assertEqual(self.flagged(), {self.bold.pk})
+        TemplateRevalidator(workers=1).run_once()
+        
+        self.bold.refresh_from_db()
+        self.assertFalse(self.bold.is_valid)
+        self.assertIn('Missing required variables: username', self.bold.validation_error)
+    
+    def test_deactivated_variable_flags_templates(self):
+        """Test that deactivating a variable rechecks the types using it"""
+        variable = Variable.objects.get(pk=self.title.pk)
+        variable.is_active = False
+        variable.save()
+        
+        self.assertEqual(self.flagged(), {self.bold.pk})
+        TemplateRevalidator(workers=1).run_once()
+        
+        self.bold.refresh_from_db()
+        self.assertIn('Unknown variables: title', self.bold.validation_error)
+    
+    def test_unrelated_changes_flag_nothing(self):
+        """Test that saves which can't change the outcome don't flag templates"""
+        channel = Channel.objects.get(pk=self.email.pk)
+        channel.allowed_tags = ['b', 'p']
+        channel.save()
+        self.custom_type.variables.add(self.title)
+        
+        self.assertEqual(self.flagged(), set())
+    
+    def test_saving_template_clears_flag(self):
+        """Test that a template validated on save is no longer flagged"""
+        NotificationTemplate.objects.filter(pk=self.bold.pk).update(
+            needs_revalidation=True, is_valid=False, validation_error='old error'
+        )
+        template = NotificationTemplate.objects.get(pk=self.bold.pk)
+        template.save()
+        
+        template.refresh_from_db()
+        self.assertTrue(template.is_valid)
+        self.assertFalse(template.needs_revalidation)
+    
+    def test_process_pool_matches_inline_results(self):
+        """Test that templates validated in worker processes get the same outcome"""
+        for i in range(30):
+            NotificationTemplate.objects.create(
+                notification_type=self.custom_type, channel=self.email, name=f'promo {i}',
+                html='<p><b>Sale</b></p>' if i % 2 else '<p>Sale</p>'
+            )
+        channel = Channel.objects.get(pk=self.email.pk)
+        channel.allowed_tags = ['p']
+        channel.save()
+        
+        with TemplateRevalidator(workers=2, batch_size=8, chunk_size=3) as revalidator:
+            self.assertEqual(revalidator.run_once(), 16)
+        
+        invalid = NotificationTemplate.objects.filter(is_valid=False)
+        self.assertEqual(invalid.count(), 16)
+        self.assertEqual(self.flagged(), set())
+    
+    def remove_bold(self):
+        channel = Channel.objects.get(pk=self.email.pk)
+        channel.allowed_tags = ['p']
+        channel.save()
+    
+    def test_template_edited_between_claim_and_store_keeps_its_status(self):
+        """Test that a stale result doesn't overwrite a template saved while it was validated"""
+        self.remove_bold()
+        revalidator = TemplateRevalidator(workers=1)
+        token, items = revalidator.claim()
+        template = NotificationTemplate.objects.get(pk=self.bold.pk)
+        template.html = '<p>{{ title }}</p>'
+        template.save()
+        
+        self.assertEqual(revalidator.store(token, check_templates(items)), 0)
+        
+        template.refresh_from_db()
+        self.assertTrue(template.is_valid)
+        self.assertEqual(template.validation_error, '')
+        self.assertIsNone(template.revalidation_claimed_by)
+    
+    def test_template_flagged_again_during_validation_stays_flagged(self):
+        """Test that a change made while a template is validated gets its own revalidation"""
+        self.remove_bold()
+        revalidator = TemplateRevalidator(workers=1)
+        token, items = revalidator.claim()
+        self.notification_type.variables.add(Variable.objects.create(title='username'))
+        
+        revalidator.store(token, check_templates(items))
+        
+        self.assertEqual(self.flagged(), {self.bold.pk})
+        revalidator.run_once()
+        self.bold.refresh_from_db()
+        self.assertIn('Missing required variables: username', self.bold.validation_error)
+    
+    def test_claims_are_exclusive_and_expire(self):
+        """Test that claimed rows aren't handed out twice until the claim's lease expires"""
+        self.remove_bold()
+        token, items = TemplateRevalidator(workers=1, revalidator_id='crashed').claim()
+        
+        self.assertEqual([item[0] for item in items], [self.bold.pk])
+        self.assertEqual(TemplateRevalidator(workers=1).claim()[1], [])
+        self.assertEqual(self.flagged(), {self.bold.pk})
+        
+        NotificationTemplate.objects.filter(pk=self.bold.pk).update(
+            revalidation_claimed_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        self.assertEqual(TemplateRevalidator(workers=1, lease_seconds=60).run_once(), 1)
+        self.bold.refresh_from_db()
+        self.assertFalse(self.bold.is_valid)
+        self.assertFalse(self.bold.needs_revalidation)
+    
+    def test_api_filters_by_validity(self):
+        """Test that invalid templates can be listed with ?is_valid=false"""
+        NotificationTemplate.objects.filter(pk=self.bold.pk).update(is_valid=False, validation_error='broken')
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        
+        response = client.get('/api/notifications/notification-templates/', {'is_valid': 'false'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.bold.pk])
+        self.assertEqual(response.data['results'][0]['validation_error'], 'broken')
+    
+    def test_command_revalidates_all(self):
+        """Test that revalidate_templates --all checks every template"""
+        NotificationTemplate.objects.filter(pk=self.plain.pk).update(html='<div>Hi</div>')
+        out = StringIO()
+        
+        call_command('revalidate_templates', '--all', '--workers', '1', stdout=out)
+        
+        self.assertIn('Revalidated 2 templates, 1 invalid', out.getvalue())
+        self.assertFalse(NotificationTemplate.objects.get(pk=self.plain.pk).is_valid)
+
+
+class TagPolicyTestCase(SimpleTestCase):
+    """Tests for the streaming allowed tags checker"""
+    
+    # (allowed tags, html) pairs, the verdict has to match bleach.clean
+    corpus = [
+        (['p', 'b', 'i', 'a', 'br'], '<p>Hello <b>{{ title }}</b>!</p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>Line<br>{{ username }}</p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p><a href="https://example.com/{{ path }}" title="Go">link</a></p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p><a href="{{ url }}">link</a></p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p><a href="javascript:alert(1)">x</a></p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p class="lead">Hi</p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<div>Hello <script>alert("xss")</script></div>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>Hi</p><!-- note -->'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>Tom &amp; Jerry&nbsp;&copy;</p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>Tom & Jerry</p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>{% if a > b %}x{% endif %}</p>'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>unclosed'),
+        (['p', 'b', 'i', 'a', 'br'], '<p><b>misnested</p></b>'),
+        (['p', 'b', 'i', 'a', 'br'], '<P>upper</P>'),
+        (['p', 'b', 'i', 'a', 'br'], 'one<br/>two'),
+        (['p', 'b', 'i', 'a', 'br'], '<p>a\r\nb</p>'),
+        (['p', 'br'], '<p>{{ title }}</p><p>{{ body }}</p>'),
+        (['p', 'br'], '<p><b>bold</b></p>'),
+        (['p', 'div'], '<p><div>implicitly closes p</div></p>'),
+        (['ul', 'li'], '<ul><li>one</li><li>two</li></ul>'),
+        (['ul', 'li'], '<ul><li>one<li>two</ul>'),
+        (['table', 'tr', 'td'], '<table><tr><td>x</td></tr></table>'),
+        (['table', 'tbody', 'tr', 'td'], '<table><tbody><tr><td>x</td></tr></tbody></table>'),
+        (['style', 'p'], '<style>p > a {}</style><p>x</p>'),
+        ([], 'plain text {{ title }}'),
+        ([], ''),
+    ]
+    
+    def test_verdicts_match_bleach(self):
+        """Test that check() accepts exactly the templates bleach leaves unchanged"""
+        for allowed_tags, html in self.corpus:
+            with self.subTest(allowed_tags=allowed_tags, html=html):
+                expected = bleach.clean(html, tags=allowed_tags, strip=True) == html
+                self.assertEqual(TagPolicy(allowed_tags).check(html) is None, expected)
+    
+    def test_first_forbidden_tag_is_reported(self):
+        """Test that the scan stops at the first forbidden tag with its position"""
+        violation = TagPolicy(['p', 'br']).check('<p>Hi</p>\n<p>see <b>this</b> <script>x</script></p>')
+        
+        self.assertEqual((violation.tag, violation.line, violation.column), ('b', 2, 8))
+        self.assertEqual(str(violation), '<b> at line 2, column 8')
+    
+    def test_simple_templates_skip_bleach(self):
+        """Test that well formed templates are decided without bleach"""
+        with mock.patch('apps.notifications.tag_policy.bleach.clean') as clean:
+            self.assertIsNone(TagPolicy(['p', 'b', 'a']).check('<p><b>{{ title }}</b> <a href="{{ url }}">x</a></p>'))
+            self.assertIsNotNone(TagPolicy(['p']).check('<p>' * 1000 + '<script>'))
+        
+        clean.assert_not_called()
+    
+    def test_policy_rebuilt_when_tags_change(self):
+        """Test that policies are shared per tag set"""
+        self.assertIs(policy_for(['p', 'B']), policy_for(['b', 'p']))
+        self.assertIsNot(policy_for(['p']), policy_for(['p', 'b']))
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """Tests that every notifications endpoint runs a constant, declared number of queries"""
+    
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.email = Channel.objects.create(title='email', allowed_tags=['p', 'b', 'i', 'a', 'br'])
+        self.telegram = Channel.objects.create(title='telegram', allowed_tags=['p', 'br'])
+        self.variables = [Variable.objects.create(title=title) for title in ('title', 'username')]
+        self.custom_type = NotificationType.objects.create(title='custom', is_custom=True)
+        self.custom_type.channels.add(self.email)
+        self.size = 0
+        self.created = 0
+        self.addCleanup(rate_limit.reset)
+        self.addCleanup(circuit_breaker.reset)
+        self.addCleanup(template_cache.clear)
+    
+    def next_name(self, prefix):
+        self.created += 1
+        return f'{prefix} {self.created}'
+    
+    def grow_size(self, n):
+        self.size = n
+    
+    def grow_types(self, n):
+        """n non-custom types with two channels, two variables and an email template"""
+        self.size = n
+        for i in range(NotificationType.objects.filter(is_custom=False).count(), n):
+            notification_type = NotificationType.objects.create(title=f'type {i}', is_custom=False)
+            notification_type.channels.add(self.email, self.telegram)
+            notification_type.variables.add(*self.variables)
+            NotificationTemplate.objects.create(
+                notification_type=notification_type,
+                channel=self.email,
+                title='Hello {{ username }}',
+                html='<p>{{ title }}, {{ username }}</p>'
+            )
+    
+    def grow_variables(self, n):
+        """n variables, all attached to the custom type"""
+        self.size = n
+        for i in range(Variable.objects.count(), n):
+            Variable.objects.create(title=f'var_{i}')
+        self.custom_type.variables.set(Variable.objects.all()[:n])
+    
+    def grow_custom_templates(self, n):
+        """n templates of the custom type"""
+        self.size = n
+        for i in range(self.custom_type.templates.count(), n):
+            NotificationTemplate.objects.create(
+                notification_type=self.custom_type, channel=self.email, name=f'template {i}', html='<p>Hi</p>'
+            )
+    
+    def grow_outbox(self, n):
+        self.size = n
+        self.grow_types(1)
+        for _ in range(Outbox.objects.count(), n):
+            enqueue('type 0', {'title': 'T', 'username': 'U'}, 'user@example.com')
+        self.message = Outbox.objects.last()
+    
+    def doomed_type(self, n):
+        """Custom type with n templates, deleted by the request"""
+        self.doomed = NotificationType.objects.create(title=self.next_name('doomed'), is_custom=True)
+        self.doomed.channels.add(self.email)
+        for i in range(n):
+            NotificationTemplate.objects.create(
+                notification_type=self.doomed, channel=self.email, name=f'template {i}', html='<p>Hi</p>'
+            )
+    
+    def doomed_template(self, n):
+        self.grow_custom_templates(n)
+        self.doomed = NotificationTemplate.objects.create(
+            notification_type=self.custom_type, channel=self.email, name=self.next_name('doomed'), html='<p>Hi</p>'
+        )
+    
+    def budgets(self):
+        api = '/api/notifications'
+        context = {'title': 'T', 'username': 'U'}
+        return {
+            'live_check': [QueryBudget('GET live-check/', 3, lambda: self.client.get(f'{api}/live-check/'))],
+            'api-root': [QueryBudget('GET api root', 3, lambda: self.client.get(f'{api}/'))],
+            'notificationtype-list': [
+                QueryBudget(
+                    'GET notification-types/', 7, lambda: self.client.get(f'{api}/notification-types/'),
+                    grow=self.grow_types
+                ),
+                QueryBudget(
+                    'POST notification-types/', 21,
+                    lambda: self.client.post(f'{api}/notification-types/', {
+                        'title': self.next_name('new type'), 'is_custom': True, 'channels': ['email'],
+                        'variables': list(Variable.objects.values_list('title', flat=True)[:self.size]),
+                    }, format='json'),
+                    grow=self.grow_variables, expected_status=(201,)
+                ),
+            ],
+            'notificationtype-detail': [
+                QueryBudget(
+                    'GET notification-types/<pk>/', 6,
+                    lambda: self.client.get(f'{api}/notification-types/{self.custom_type.pk}/'),
+                    grow=self.grow_variables
+                ),
+                QueryBudget(
+                    'PATCH notification-types/<pk>/', 11,
+                    lambda: self.client.patch(f'{api}/notification-types/{self.custom_type.pk}/', {
+                        'variables': list(Variable.objects.values_list('title', flat=True)[:self.size]),
+                    }, format='json'),
+                    grow=self.grow_variables
+                ),
+                QueryBudget(
+                    'DELETE notification-types/<pk>/', 11,
+                    lambda: self.client.delete(f'{api}/notification-types/{self.doomed.pk}/'),
+                    grow=self.doomed_type, expected_status=(204,)
+                ),
+            ],
+            'notificationtemplate-list': [
+                QueryBudget(
+                    'GET notification-templates/', 5, lambda: self.client.get(f'{api}/notification-templates/'),
+                    grow=self.grow_types
+                ),
+                QueryBudget(
+                    'POST notification-templates/', 8,
+                    lambda: self.client.post(f'{api}/notification-templates/', {
+                        'notification_type': 'custom', 'channel': 'email',
+                        'name': self.next_name('new template'), 'html': '<p>Hi</p>',
+                    }, format='json'),
+                    grow=self.grow_custom_templates, expected_status=(201,)
+                ),
+            ],
+            'notificationtemplate-bulk': [QueryBudget(
+                'POST notification-templates/bulk/', 9,
+                lambda: self.client.post(f'{api}/notification-templates/bulk/', {'templates': [
+                    {'notification_type': 'custom', 'channel': 'email', 'name': self.next_name('imported'),
+                     'html': '<p>Hi</p>'}
+                    for _ in range(self.size)
+                ]}, format='json'),
+                # bulk_create splits inserts into batches of ~70 rows on SQLite
+                grow=self.grow_size, expected_status=(201,), sizes=(1, 10, 50)
+            )],
+            'notificationtemplate-detail': [
+                QueryBudget(
+                    'GET notification-templates/<pk>/', 4,
+                    lambda: self.client.get(f'{api}/notification-templates/{self.doomed.pk}/'),
+                    grow=self.doomed_template
+                ),
+                QueryBudget(
+                    'PATCH notification-templates/<pk>/', 7,
+                    lambda: self.client.patch(
+                        f'{api}/notification-templates/{self.doomed.pk}/', {'is_active': True}, format='json'
+                    ),
+                    grow=self.doomed_template
+                ),
+                QueryBudget(
+                    'DELETE notification-templates/<pk>/', 5,
+                    lambda: self.client.delete(f'{api}/notification-templates/{self.doomed.pk}/'),
+                    grow=self.doomed_template, expected_status=(204,)
+                ),
+            ],
+            'send_notification': [QueryBudget(
+                'POST send/', 3,
+                lambda: self.client.post(f'{api}/send/', {
+                    'notification_type': 'type 0', 'context': context, 'recipient': 'user@example.com',
+                }, format='json'),
+                grow=self.grow_types, expected_status=(202,)
+            )],
+            'send_bulk_notification': [QueryBudget(
+                'POST send-bulk/', 4,
+                lambda: self.client.post(f'{api}/send-bulk/', {
+                    'notification_type': 'type 0',
+                    'recipients': [
+                        {'recipient': f'user{i}@example.com', 'context': context} for i in range(self.size)
+                    ],
+                }, format='json'),
+                grow=self.grow_types
+            )],
+            'send_notification_async': [QueryBudget(
+                'POST send-async/', 7,
+                lambda: self.client.post(f'{api}/send-async/', {
+                    'notification_type': 'type 0', 'context': context, 'recipient': 'user@example.com',
+                }, format='json'),
+                grow=self.grow_types
+            )],
+            'send_fanout_notification': [QueryBudget(
+                'POST send-fanout/', 3,
+                lambda: self.client.post(f'{api}/send-fanout/', {
+                    'notification_type': 'type 0', 'context': context,
+                    'recipients': {'email': 'user@example.com', 'telegram': '12345'},
+                }, format='json'),
+                grow=self.grow_types
+            )],
+            'render_notification': [QueryBudget(
+                'POST render/', 4,
+                lambda: self.client.post(f'{api}/render/', {
+                    'notification_type': 'type 0', 'contexts': [context] * self.size,
+                }, format='json'),
+                grow=self.grow_types
+            )],
+            'outbox_status': [QueryBudget(
+                'GET outbox/<message_id>/', 4,
+                lambda: self.client.get(f'{api}/outbox/{self.message.message_id}/'),
+                grow=self.grow_outbox
+            )],
+            'outbox_lane_stats': [QueryBudget(
+                'GET outbox/lanes/', 6, lambda: self.client.get(f'{api}/outbox/lanes/'), grow=self.grow_outbox
+            )],
+            'template_cache_stats': [
+                QueryBudget('GET cache-stats/', 3, lambda: self.client.get(f'{api}/cache-stats/'))
+            ],
+            'rate_limit_stats': [QueryBudget('GET rate-limits/', 3, lambda: self.client.get(f'{api}/rate-limits/'))],
+            'circuit_breaker_stats': [
+                QueryBudget('GET circuit-breakers/', 3, lambda: self.client.get(f'{api}/circuit-breakers/'))
+            ],
+            'validation_cache_stats': [
+                QueryBudget('GET validation-cache-stats/', 3, lambda: self.client.get(f'{api}/validation-cache-stats/'))
+            ],
+        }
+    
+    def test_every_route_has_a_budget(self):
+        """Test that a budget is declared for every named route of the app"""
+        from apps.notifications import urls
+        
+        routes = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+        
+        self.assertEqual(sorted(routes - set(self.budgets())), [])
+    
+    def test_query_budgets(self):
+        """Test that query counts stay within budget and don't grow with the data"""
+        for route, specs in self.budgets().items():
+            for spec in specs:
+                with self.subTest(route=route, request=spec.name), transaction.atomic():
+                    self.size = 0
+                    template_cache.clear()
+                    try:
+                        self.assertQueryBudget(spec)
+                    finally:
+                        # every endpoint starts from the setUp data
+                        transaction.set_rollback(True)
+
+
+class LoadTestPrepareTestCase(TestCase):
+    """Tests for load_test_api --prepare seeding"""
+    
+    def test_prepare_can_run_twice(self):
+        """Test that rerunning --prepare reuses seeded types and templates instead of failing"""
+        for _ in range(2):
+            call_command('load_test_api', '--prepare', '--types', '3', stdout=StringIO())
+        
+        self.assertEqual(NotificationType.objects.filter(title__startswith='bench type').count(), 3)
+        self.assertEqual(NotificationTemplate.objects.filter(notification_type__title__startswith='bench type').count(), 3)
+        self.assertTrue(User.objects.get(username='loadtest').is_superuser)
@@ -5,7 +5,17 @@ from apps.notifications.views import (
     LiveCheckView,
     NotificationTypeViewSet,
     NotificationTemplateViewSet,
-    SendNotificationView
+    SendNotificationView,
+    SendBulkNotificationView,
+    AsyncSendNotificationView,
+    SendFanoutNotificationView,
+    RenderNotificationView,
+    OutboxStatusView,
+    TemplateCacheStatsView,
+    ValidationCacheStatsView,
+    RateLimitStatsView,
+    OutboxLaneStatsView,
+    CircuitBreakerStatsView
 )
 
 
@@ -17,4 +27,14 @@ router.register(r'notification-templates', NotificationTemplateViewSet, basename
 urlpatterns = [
     path('live-check/', LiveCheckView.as_view(), name='live_check'),
     path('send/', SendNotificationView.as_view(), name='send_notification'),
+    path('send-bulk/', SendBulkNotificationView.as_view(), name='send_bulk_notification'),
+    path('send-async/', AsyncSendNotificationView.as_view(), name='send_notification_async'),
+    path('send-fanout/', SendFanoutNotificationView.as_view(), name='send_fanout_notification'),
+    path('render/', RenderNotificationView.as_view(), name='render_notification'),
+    path('outbox/<uuid:message_id>/', OutboxStatusView.as_view(), name='outbox_status'),
+    path('outbox/lanes/', OutboxLaneStatsView.as_view(), name='outbox_lane_stats'),
+    path('cache-stats/', TemplateCacheStatsView.as_view(), name='template_cache_stats'),
+    path('validation-cache-stats/', ValidationCacheStatsView.as_view(), name='validation_cache_stats'),
+    path('rate-limits/', RateLimitStatsView.as_view(), name='rate_limit_stats'),
+    path('circuit-breakers/', CircuitBreakerStatsView.as_view(), name='circuit_breaker_stats'),
 ] + router.urls
\ No newline at end of file
@@ -1,14 +1,25 @@
+import hashlib
 import re
 
-import bleach
-
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.template import Engine, TemplateSyntaxError
 from django.template.base import VariableNode
 
+from apps.notifications.cache import LRUCache
+from apps.notifications.tag_policy import policy_for
+
 
 INVALID = "__INVALID__%s__"
 
+# parsing doesn't change engine state, one instance serves all threads
+engine = Engine(debug=True, string_if_invalid=INVALID)
+
+# validation outcome (None or the error dict) by validation_key(), see validate_template
+validation_cache = LRUCache(getattr(settings, 'NOTIFICATION_VALIDATION_CACHE_SIZE', 1024))
+
+_NOT_CACHED = object()
+
 
 def extract_vars(template):
     """Extract all variable names from Django template AST."""
@@ -34,21 +45,57 @@ def extract_vars(template):
     return {v for v in used if v and not v.isdigit() and v[0] not in "\"'"}
 
 
-def validate_template(html: str, channel, allowed_vars: list[str], is_custom=False):
+def parse_template(html: str):
+    """Parse template HTML, raise ValidationError on syntax error"""
+    try:
+        return engine.from_string(html)
+    except TemplateSyntaxError as e:
+        raise ValidationError({"html": f"Template syntax error: {e}"})
+
+
+def validation_key(html: str, channel, allowed_vars, is_custom) -> tuple:
+    """Everything the outcome of validate_template depends on"""
+    return (
+        hashlib.sha256(html.encode()).digest(),
+        frozenset(t.lower() for t in (channel.allowed_tags or [])),
+        frozenset(allowed_vars or []),
+        bool(is_custom),
+    )
+
+
+def validate_template(html: str, channel, allowed_vars: list[str], is_custom=False, used_vars=None):
     """
     Validate notification template
+
+    The outcome only depends on validation_key(), so it is cached and
+    repeated validations of unchanged templates (re-saves, PATCHes of
+    other fields) skip parsing and tag cleaning. Changed html, channel
+    tags or type variables make a new key, nothing has to be invalidated.
+
+    used_vars: variables already extracted from this html (e.g. stored
+    template metadata), skips parsing the template again
     """
+    key = validation_key(html, channel, allowed_vars, is_custom)
+    errors = validation_cache.get(key, _NOT_CACHED)
+    if errors is _NOT_CACHED:
+        try:
+            _validate_template(html, channel, allowed_vars, is_custom, used_vars)
+            errors = None
+        except ValidationError as e:
+            errors = e.message_dict
+        validation_cache.set(key, errors)
+    if errors:
+        raise ValidationError(errors)
+
+
+def _validate_template(html: str, channel, allowed_vars: list[str], is_custom=False, used_vars=None):
     allowed_vars = allowed_vars or []
     
-    # template syntax check
-    try:
-        engine = Engine(debug=True, string_if_invalid=INVALID)
-        tpl = engine.from_string(html)
-    except TemplateSyntaxError as e:
-        raise ValidationError({"html": f"Template syntax error: {e}"})
-
-    # variables extraction
-    used = extract_vars(tpl)
+    # template syntax check and variables extraction
+    if used_vars is None:
+        used = extract_vars(parse_template(html))
+    else:
+        used = set(used_vars)
     
     # variables validation
     if is_custom:
@@ -72,11 +119,9 @@ def validate_template(html: str, channel, allowed_vars: list[str], is_custom=Fal
             })
 
     # allowed tags validation
-    allowed = [t.lower() for t in (channel.allowed_tags or [])]
-    cleaned = bleach.clean(html, tags=allowed, strip=True)
-
-    if cleaned != html:
-        raise ValidationError({"html": "Template contains forbidden HTML tags"})
+    violation = policy_for(channel.allowed_tags).check(html)
+    if violation:
+        raise ValidationError({"html": f"Template contains forbidden HTML tags: {violation}"})
 
 
 def validate_template_uniqueness(template_instance):
@@ -1,22 +1,46 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 
-from rest_framework import viewsets
+from rest_framework import exceptions, viewsets
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
 
+from apps.notifications.backends import async_smtp
 from apps.notifications.models.gradus_models import NotificationType, NotificationTemplate
+from apps.notifications.models.delivery_models import Outbox, ScheduledNotification
 from apps.notifications.serializers import (
     NotificationTypeReadSerializer,
     NotificationTypeWriteSerializer,
     NotificationTemplateReadSerializer,
     NotificationTemplateWriteSerializer,
-    SendNotificationSerializer
+    NotificationTemplateImportSerializer,
+    AsyncSendNotificationSerializer,
+    SendNotificationSerializer,
+    SendBulkNotificationSerializer,
+    SendFanoutNotificationSerializer,
+    RenderNotificationSerializer,
+    OutboxSerializer,
+    ScheduledNotificationSerializer
 )
 from apps.notifications.permissions import IsSuperUser
+from apps.notifications.services import circuit_breaker, idempotency, outbox, rate_limit, scheduler
 from apps.notifications.services.notification_sender import NotificationSender
+from apps.notifications.services.template_cache import template_cache
+from apps.notifications.services.template_import import TemplateImportError, import_templates
+from apps.notifications.validators import validation_cache
 
 
 @extend_schema(
@@ -74,7 +98,8 @@ class NotificationTypeViewSet(viewsets.ModelViewSet):
         return NotificationTypeWriteSerializer
     
     def get_queryset(self):
-        queryset = NotificationType.objects.all()
+        # variable_names reads the prefetched variables, see NotificationType.variable_names
+        queryset = NotificationType.objects.prefetch_related('variables', 'channels')
         is_active = self.request.query_params.get('is_active', None)
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
@@ -146,6 +171,17 @@ class NotificationTypeViewSet(viewsets.ModelViewSet):
         summary='Delete notification template',
         description='Delete a notification template (only templates for custom types can be deleted)'
     ),
+    bulk=extend_schema(
+        tags=['Notification Templates'],
+        summary='Import notification templates',
+        description='Validate and create many templates in one transaction (superuser only). '
+                    'Nothing is created if any item is invalid, errors are returned per item.',
+        request=NotificationTemplateImportSerializer,
+        responses={
+            201: {'description': 'Number and ids of created templates'},
+            400: {'description': 'Per-item errors, in the order of the request'},
+        }
+    ),
 )
 class NotificationTemplateViewSet(viewsets.ModelViewSet):
     """
@@ -160,7 +196,7 @@ class NotificationTemplateViewSet(viewsets.ModelViewSet):
         return NotificationTemplateWriteSerializer
     
     def get_queryset(self):
-        queryset = NotificationTemplate.objects.all()
+        queryset = NotificationTemplate.objects.select_related('notification_type', 'channel')
         
         notification_type = self.request.query_params.get('notification_type', None)
         if notification_type:
@@ -174,6 +210,10 @@ class NotificationTemplateViewSet(viewsets.ModelViewSet):
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
         
+        is_valid = self.request.query_params.get('is_valid', None)
+        if is_valid is not None:
+            queryset = queryset.filter(is_valid=is_valid.lower() == 'true')
+        
         return queryset
     
     def create(self, request, *args, **kwargs):
@@ -209,16 +249,40 @@ class NotificationTemplateViewSet(viewsets.ModelViewSet):
             )
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        serializer = NotificationTemplateImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            templates = import_templates(serializer.validated_data['templates'])
+        except TemplateImportError as e:
+            return Response({'templates': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {'created': len(templates), 'ids': [template.pk for template in templates]},
+            status=status.HTTP_201_CREATED
+        )
 
 
 @extend_schema(
     tags=['Notifications'],
     summary='Send notification',
-    description='Send notification via email',
+    description='Queue notification for delivery via email. '
+                'Send an Idempotency-Key header to make retries safe.',
     request=SendNotificationSerializer,
+    parameters=[
+        OpenApiParameter(
+            name='Idempotency-Key',
+            location=OpenApiParameter.HEADER,
+            required=False,
+            description='Requests repeated with the same key return the original response'
+        ),
+    ],
     responses={
-        200: {'description': 'Notification sent successfully'},
-        400: {'description': 'Failed to send notification'},
+        202: {'description': 'Notification queued, delivery status is available by message_id'},
+        400: {'description': 'Invalid request'},
+        409: {'description': 'Request with the same idempotency key is still in progress'},
+        422: {'description': 'Idempotency key reused with a different request'},
     }
 )
 class SendNotificationView(APIView):
@@ -231,21 +295,328 @@ class SendNotificationView(APIView):
         serializer = SendNotificationSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
+        data = dict(serializer.validated_data)
+        body_key = data.pop('idempotency_key', None)
+        key = request.headers.get(idempotency.IDEMPOTENCY_HEADER) or body_key
+        if key:
+            return idempotency.idempotent_response(request, key, data, lambda: self.enqueue(data, request.user))
+        return self.enqueue(data, request.user)
+    
+    def enqueue(self, data, user):
+        # reject what the worker could never deliver, queueing only changes when it happens
+        try:
+            NotificationSender().check_template(data['notification_type'], data.get('template_name'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if data.get('send_at'):
+            message = scheduler.schedule(
+                notification_type=data['notification_type'],
+                context=data['context'],
+                recipient=data['recipient'],
+                send_at=data['send_at'],
+                template_name=data.get('template_name'),
+                created_by_id=user.pk
+            )
+        else:
+            message = outbox.enqueue(
+                notification_type=data['notification_type'],
+                context=data['context'],
+                recipient=data['recipient'],
+                template_name=data.get('template_name'),
+                created_by_id=user.pk
+            )
+        
+        if isinstance(message, ScheduledNotification):
+            return Response(
+                {
+                    'message': 'Notification scheduled',
+                    'message_id': str(message.message_id),
+                    'send_at': message.send_at.isoformat()
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
+        return Response(
+            {'message': 'Notification queued', 'message_id': str(message.message_id)},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSendNotificationView(View):
+    """
+    Async API endpoint for sending notifications right away
+
+    Plain Django async view (DRF views are sync only): authentication reuses
+    DRF authentication classes, validation uses AsyncSendNotificationSerializer
+    and delivery is awaited through NotificationSender.asend, so the worker
+    is free to serve other requests while the mail server responds.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    async def post(self, request):
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse(
+                {'detail': 'Authentication credentials were not provided.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except (ValueError, UnicodeDecodeError):
+            return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.headers.get(idempotency.IDEMPOTENCY_HEADER):
+            return JsonResponse(
+                {'error': 'Idempotency-Key is not supported by send-async/, use send/ instead'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = AsyncSendNotificationSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        sender = NotificationSender()
+        try:
+            success = await sender.asend(
+                notification_type=serializer.validated_data['notification_type'],
+                context=serializer.validated_data['context'],
+                recipient=serializer.validated_data['recipient'],
+                template_name=serializer.validated_data.get('template_name')
+            )
+        finally:
+            if not isinstance(request, ASGIRequest):
+                # under WSGI this request's event loop ends with it, pooled connections can't be reused
+                await async_smtp.close_pools()
+
+        if success:
+            return JsonResponse(
+                {'message': 'Notification sent successfully'},
+                status=status.HTTP_200_OK
+            )
+        return JsonResponse(
+            {'error': 'Failed to send notification'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    def authenticate(self, request):
+        """Return authenticated user or None"""
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            user = drf_request.user
+        except exceptions.APIException:
+            return None
+        if not user or not user.is_authenticated:
+            return None
+        request.user = user
+        return user
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Notification delivery status',
+    description='Get delivery status of a queued notification. '
+                'Notifications still waiting for their send_at have status "scheduled". '
+                'Users only see notifications they sent, superusers see all of them.',
+    responses={200: OutboxSerializer}
+)
+class OutboxStatusView(APIView):
+    """
+    API endpoint for checking delivery status of a queued notification
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, message_id):
+        owned = {} if request.user.is_superuser else {'created_by': request.user}
+        message = Outbox.objects.filter(message_id=message_id, **owned).first()
+        if message is None:
+            scheduled = get_object_or_404(ScheduledNotification, message_id=message_id, **owned)
+            return Response(ScheduledNotificationSerializer(scheduled).data, status=status.HTTP_200_OK)
+        return Response(OutboxSerializer(message).data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Send notification to many recipients',
+    description='Send one notification type to a list of recipients over a single mail connection',
+    request=SendBulkNotificationSerializer,
+    responses={
+        200: {'description': 'Per-recipient delivery results'},
+        400: {'description': 'Invalid request or notification could not be resolved'},
+    }
+)
+class SendBulkNotificationView(APIView):
+    """
+    API endpoint for sending notifications in bulk
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = SendBulkNotificationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
         sender = NotificationSender()
-        success = sender.send(
+        results = sender.send_many(
             notification_type=serializer.validated_data['notification_type'],
-            context=serializer.validated_data['context'],
-            recipient=serializer.validated_data['recipient'],
+            items=[
+                (item['recipient'], item['context'])
+                for item in serializer.validated_data['recipients']
+            ],
             template_name=serializer.validated_data.get('template_name')
         )
-        
-        if success:
+
+        sent = sum(1 for result in results if result['success'])
+        if not sent:
             return Response(
-                {'message': 'Notification sent successfully'},
-                status=status.HTTP_200_OK
+                {'error': 'Failed to send notifications', 'results': results},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        else:
+        return Response(
+            {'sent': sent, 'failed': len(results) - sent, 'results': results},
+            status=status.HTTP_200_OK
+        )
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Send notification to several channels',
+    description='Render and deliver notification on every requested channel concurrently',
+    request=SendFanoutNotificationSerializer,
+    responses={
+        200: {'description': 'Per-channel delivery results, success null if the channel timed out mid-delivery'},
+        400: {'description': 'Invalid request or delivery failed on every channel'},
+    }
+)
+class SendFanoutNotificationView(APIView):
+    """
+    API endpoint for multi-channel fan-out
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = SendFanoutNotificationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        sender = NotificationSender()
+        results = sender.send_fanout(
+            notification_type=serializer.validated_data['notification_type'],
+            context=serializer.validated_data['context'],
+            recipients=serializer.validated_data['recipients'],
+            template_name=serializer.validated_data.get('template_name')
+        )
+
+        if all(result['success'] is False for result in results.values()):
             return Response(
-                {'error': 'Failed to send notification'},
+                {'error': 'Failed to send notification', 'results': results},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Render notification',
+    description='Render title and HTML of a template for a list of contexts without sending',
+    request=RenderNotificationSerializer,
+    responses={
+        200: {'description': 'Rendered title/html per context, in request order'},
+        400: {'description': 'Invalid request or template could not be resolved'},
+    }
+)
+class RenderNotificationView(APIView):
+    """
+    API endpoint for batch rendering
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = RenderNotificationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        sender = NotificationSender()
+        try:
+            results = sender.render_many(
+                notification_type=serializer.validated_data['notification_type'],
+                contexts=serializer.validated_data['contexts'],
+                channel=serializer.validated_data['channel'],
+                template_name=serializer.validated_data.get('template_name')
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Template cache statistics',
+    description='Hit/miss/eviction counters of the compiled template cache of this process (superuser only)'
+)
+class TemplateCacheStatsView(APIView):
+    """
+    API endpoint exposing compiled template cache counters
+    """
+    permission_classes = [IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        return Response(template_cache.stats(), status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Template validation cache statistics',
+    description='Hit/miss/eviction counters of the template validation result cache of this process (superuser only)'
+)
+class ValidationCacheStatsView(APIView):
+    """
+    API endpoint exposing template validation cache counters
+    """
+    permission_classes = [IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        return Response(validation_cache.stats(), status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Delivery rate limits',
+    description='Current rate, available tokens and throttle counters per channel in this process (superuser only)'
+)
+class RateLimitStatsView(APIView):
+    """
+    API endpoint exposing per-channel rate limiter state
+    """
+    permission_classes = [IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        return Response(rate_limit.snapshot(), status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Outbox lane statistics',
+    description='Queue depth and wait times per priority lane (superuser only)'
+)
+class OutboxLaneStatsView(APIView):
+    """
+    API endpoint exposing per-lane outbox depth and wait times
+    """
+    permission_classes = [IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        return Response(outbox.lane_stats(), status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=['Notifications'],
+    summary='Delivery circuit breakers',
+    description='State (closed/open/half_open), failure counters and rejected calls per channel in this process (superuser only)'
+)
+class CircuitBreakerStatsView(APIView):
+    """
+    API endpoint exposing per-channel circuit breaker state
+    """
+    permission_classes = [IsAuthenticated, IsSuperUser]
+
+    def get(self, request):
+        return Response(circuit_breaker.snapshot(), status=status.HTTP_200_OK)
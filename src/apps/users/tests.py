@@ -1,3 +1,51 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from core.testing import QueryBudget, QueryBudgetMixin
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """Tests that the auth endpoints run a constant, declared number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('user', 'user@example.com', 'password')
+
+    def grow_users(self, n):
+        for i in range(User.objects.count(), n):
+            User.objects.create(username=f'user{i}', email=f'user{i}@example.com')
+
+    def budgets(self):
+        return {
+            'login': [QueryBudget(
+                'POST login/', 1,
+                lambda: self.client.post(
+                    '/api/users/login/', {'username': 'user', 'password': 'password'}, format='json'
+                ),
+                grow=self.grow_users
+            )],
+            'refresh': [QueryBudget(
+                'POST refresh/', 0,
+                lambda: self.client.post(
+                    '/api/users/refresh/', {'refresh': str(RefreshToken.for_user(self.user))}, format='json'
+                ),
+                grow=self.grow_users
+            )],
+        }
+
+    def test_every_route_has_a_budget(self):
+        """Test that a budget is declared for every named route of the app"""
+        from apps.users import urls
+
+        routes = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+
+        self.assertEqual(sorted(routes - set(self.budgets())), [])
+
+    def test_query_budgets(self):
+        """Test that query counts stay within budget and don't grow with the data"""
+        for route, specs in self.budgets().items():
+            for spec in specs:
+                with self.subTest(route=route, request=spec.name):
+                    self.assertQueryBudget(spec)
@@ -52,10 +52,12 @@ INSTALLED_APPS = [
     'apps.notifications',
     'apps.users',
     'apps.api_logging',
+    'apps.metrics',
 
 ]
 
 MIDDLEWARE = [
+    'apps.metrics.middleware.RequestMetricsMiddleware',  # request count/latency per route, keep first
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +66,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'apps.api_logging.middleware.APILoggingMiddleware',  # API logging middleware
+    'apps.api_logging.middleware.ProfilingMiddleware',  # on-demand cProfile for superusers, after API logging
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -93,7 +96,7 @@ WSGI_APPLICATION = 'core.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -185,16 +188,24 @@ SIMPLE_JWT = {
 
 
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_USE_TLS = True
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', "apps.notifications.backends.smtp_pool.PooledEmailBackend")
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_USE_SSL = False
-EMAIL_PORT = 587
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_HOST = os.environ.get('EMAIL_HOST')
 SERVER_EMAIL = os.environ.get('SERVER_EMAIL')
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# SMTP connection pool (apps.notifications.backends.smtp_pool.PooledEmailBackend)
+EMAIL_POOL_SIZE = int(os.environ.get('EMAIL_POOL_SIZE', 4))  # connections per worker process
+EMAIL_POOL_MAX_IDLE = int(os.environ.get('EMAIL_POOL_MAX_IDLE', 60))  # seconds
+EMAIL_POOL_MAX_LIFETIME = int(os.environ.get('EMAIL_POOL_MAX_LIFETIME', 600))  # seconds
+EMAIL_POOL_HEALTH_CHECK_AFTER = int(os.environ.get('EMAIL_POOL_HEALTH_CHECK_AFTER', 5))  # idle seconds before NOOP check
+EMAIL_POOL_ACQUIRE_TIMEOUT = int(os.environ.get('EMAIL_POOL_ACQUIRE_TIMEOUT', 10))  # seconds
+EMAIL_ASYNC_POOL_SIZE = int(os.environ.get('EMAIL_ASYNC_POOL_SIZE', 20))  # connections per event loop (async send path)
+
 # CSRF settings
 CSRF_TRUSTED_ORIGINS = [
     'http://localhost:3000',
@@ -203,4 +214,48 @@ CSRF_TRUSTED_ORIGINS = [
     'http://127.0.0.1:8000',
     'https://*',
     'http://*',
-]
\ No newline at end of file
+]
+
+# On-demand request profiling (apps.api_logging.middleware.ProfilingMiddleware)
+API_PROFILE_TOP_N = int(os.environ.get('API_PROFILE_TOP_N', 30))  # functions kept, by cumulative time
+API_PROFILE_MAX_QUERIES = int(os.environ.get('API_PROFILE_MAX_QUERIES', 500))
+
+# Metrics
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')  # who may scrape /metrics
+
+# Notifications
+NOTIFICATION_TEMPLATE_CACHE_SIZE = int(os.environ.get('NOTIFICATION_TEMPLATE_CACHE_SIZE', 512))
+NOTIFICATION_VALIDATION_CACHE_SIZE = int(os.environ.get('NOTIFICATION_VALIDATION_CACHE_SIZE', 1024))  # validate_template outcomes
+NOTIFICATION_FAST_RENDER = os.environ.get('NOTIFICATION_FAST_RENDER', 'True') == 'True'  # render plain {{ var }} templates without the engine
+NOTIFICATION_BULK_MAX_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BULK_MAX_BATCH_SIZE', 1000))
+NOTIFICATION_RENDER_MAX_CONTEXTS = int(os.environ.get('NOTIFICATION_RENDER_MAX_CONTEXTS', 1000))
+NOTIFICATION_TEMPLATE_IMPORT_MAX_SIZE = int(os.environ.get('NOTIFICATION_TEMPLATE_IMPORT_MAX_SIZE', 5000))  # templates per bulk import
+NOTIFICATION_REVALIDATION_WORKERS = int(os.environ.get('NOTIFICATION_REVALIDATION_WORKERS', 0))  # processes, 0 - one per CPU
+NOTIFICATION_REVALIDATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_REVALIDATION_BATCH_SIZE', 5000))  # templates claimed per batch
+NOTIFICATION_REVALIDATION_LEASE_SECONDS = int(os.environ.get('NOTIFICATION_REVALIDATION_LEASE_SECONDS', 600))  # claimed rows are reclaimed after
+NOTIFICATION_BULK_CHUNK_SIZE = int(os.environ.get('NOTIFICATION_BULK_CHUNK_SIZE', 100))
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_OUTBOX_MAX_ATTEMPTS', 5))
+NOTIFICATION_OUTBOX_RETRY_BACKOFF = int(os.environ.get('NOTIFICATION_OUTBOX_RETRY_BACKOFF', 30))  # seconds, doubled per attempt
+NOTIFICATION_OUTBOX_LEASE_SECONDS = int(os.environ.get('NOTIFICATION_OUTBOX_LEASE_SECONDS', 300))
+NOTIFICATION_SCHEDULER_WINDOW = int(os.environ.get('NOTIFICATION_SCHEDULER_WINDOW', 300))  # seconds of scheduled sends kept in memory
+NOTIFICATION_SCHEDULER_REFRESH = int(os.environ.get('NOTIFICATION_SCHEDULER_REFRESH', 10))  # seconds between window reloads
+NOTIFICATION_IDEMPOTENCY_TTL = int(os.environ.get('NOTIFICATION_IDEMPOTENCY_TTL', 86400))  # seconds
+NOTIFICATION_IDEMPOTENCY_LEASE = int(os.environ.get('NOTIFICATION_IDEMPOTENCY_LEASE', 120))  # seconds an in-progress key survives its holder
+NOTIFICATION_CHANNEL_TRANSPORTS = {
+    # Channel.title -> ChannelTransport subclass; channels without a transport report an error on fan-out
+    'email': 'apps.notifications.services.channels.EmailTransport',
+}
+NOTIFICATION_FANOUT_WORKERS = int(os.environ.get('NOTIFICATION_FANOUT_WORKERS', 8))
+NOTIFICATION_RATE_LIMITS = {
+    # Channel.title -> token bucket per process; adaptive buckets slow down on 4xx/throttle replies and ramp back up
+    'email': {
+        'adaptive': True,
+        'rate': float(os.environ.get('EMAIL_RATE_LIMIT', 20)),  # messages per second to start with
+        'min_rate': float(os.environ.get('EMAIL_RATE_LIMIT_MIN', 1)),
+        'max_rate': float(os.environ.get('EMAIL_RATE_LIMIT_MAX', 100)),
+    },
+}
+NOTIFICATION_SEND_DEADLINE = int(os.environ.get('NOTIFICATION_SEND_DEADLINE', 30))  # seconds for lookup + render + delivery of one send
+NOTIFICATION_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('NOTIFICATION_BREAKER_FAILURE_THRESHOLD', 5))  # consecutive backend failures
+NOTIFICATION_BREAKER_RECOVERY_TIMEOUT = int(os.environ.get('NOTIFICATION_BREAKER_RECOVERY_TIMEOUT', 30))  # seconds open before probing
+NOTIFICATION_RATE_LIMIT_MAX_WAIT = int(os.environ.get('NOTIFICATION_RATE_LIMIT_MAX_WAIT', 30))  # seconds
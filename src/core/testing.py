@@ -0,0 +1,99 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'IN \((?:\?, )*\?\)')
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL with literals replaced by '?' so repeated lookups compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def query_diff(baseline: Sequence[str], queries: Sequence[str]) -> List[str]:
+    """
+    Query shapes executed more often in queries than in baseline
+
+    Returns lines like '+9 x SELECT ... WHERE "id" = ?', most repeated first.
+    """
+    before = Counter(normalize_sql(sql) for sql in baseline)
+    after = Counter(normalize_sql(sql) for sql in queries)
+    grown = [(after[sql] - before[sql], sql) for sql in after if after[sql] > before[sql]]
+    return [f'+{count} x {sql}' for count, sql in sorted(grown, key=lambda item: -item[0])]
+
+
+@dataclass
+class QueryBudget:
+    """
+    Declared query budget of one endpoint
+
+    grow(n) brings the data the endpoint depends on to n rows (it is
+    called with increasing n on the same database), request() calls the
+    endpoint and returns the response. sizes overrides the mixin's
+    query_budget_sizes, e.g. to stay within one bulk_create batch.
+    """
+
+    name: str
+    budget: int
+    request: Callable[[], Any]
+    grow: Optional[Callable[[int], None]] = None
+    expected_status: Sequence[int] = (200,)
+    sizes: Optional[Sequence[int]] = None
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin asserting that an endpoint runs a constant number of queries
+
+    Example:
+        self.assertQueryBudget(QueryBudget(
+            name='notification types list',
+            budget=6,
+            grow=lambda n: create_types(n),
+            request=lambda: self.client.get('/api/notifications/notification-types/'),
+        ))
+    """
+
+    query_budget_sizes = (1, 10, 100)
+
+    def capture_queries(self, request: Callable[[], Any]):
+        with CaptureQueriesContext(connection) as captured:
+            response = request()
+        return response, [query['sql'] for query in captured.captured_queries]
+
+    def assertQueryBudget(self, spec: QueryBudget):
+        runs = []
+        for size in spec.sizes or self.query_budget_sizes:
+            if spec.grow is not None:
+                spec.grow(size)
+            response, queries = self.capture_queries(spec.request)
+            status_code = getattr(response, 'status_code', None)
+            if status_code not in spec.expected_status:
+                self.fail(
+                    f"{spec.name}: expected status {'/'.join(map(str, spec.expected_status))} at {size} rows, "
+                    f"got {status_code}: {getattr(response, 'content', b'')[:300]!r}"
+                )
+            runs.append((size, queries))
+
+        base_size, base_queries = runs[0]
+        for size, queries in runs:
+            if len(queries) <= spec.budget and len(queries) == len(base_queries):
+                continue
+            counts = ', '.join(f'{n} rows: {len(q)}' for n, q in runs)
+            lines = [f'{spec.name}: query budget is {spec.budget}, executed {counts}']
+            diff = query_diff(base_queries, queries)
+            if diff:
+                lines.append(f'Queries added between {base_size} and {size} rows:')
+                lines.extend(f'  {line}' for line in diff)
+            lines.append(f'All queries at {size} rows:')
+            lines.extend(f'  {index}. {sql}' for index, sql in enumerate(queries, 1))
+            self.fail('\n'.join(lines))
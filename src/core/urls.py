@@ -20,11 +20,15 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, Sp
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.metrics.views import metrics_view
+
 urlpatterns = [
     path('api/notifications/', include('apps.notifications.urls')),
     path('api/users/', include('apps.users.urls')),
 
     path('admin/', admin.site.urls),
+
+    path('metrics', metrics_view, name='metrics'),
     
     # Swagger URLs
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),